@@ -0,0 +1,218 @@
+"""Tests for the asyncio flashing API."""
+
+import asyncio
+import socket
+import threading
+import time
+
+from tron_shell import aio, batch, bootloader, session
+from tron_shell.bootloader import EntryLatencies
+from tron_shell.flasher import GenericFlasher, TopologyScheduler
+from tron_shell.session import SerialSessionPool
+
+from .test_batch import make_device
+from .test_session import FakeHandle
+
+
+class SocketBoot:
+    """Non-blocking serial handle whose bootloader syncs from the Nth probe on."""
+
+    def __init__(self, answers_from, reply=b"\x14\x10"):
+        self.host, self.device = socket.socketpair()
+        self.host.setblocking(False)
+        self.answers_from = answers_from
+        self.reply = reply
+        self.probes = 0
+
+    def fileno(self):
+        return self.host.fileno()
+
+    def reset_input_buffer(self):
+        while self.read(4096):
+            pass
+
+    def write(self, data):
+        self.probes += 1
+        if self.probes >= self.answers_from:
+            # Answer a little later, as a real board would
+            threading.Timer(0.01, self.device.send, (self.reply,)).start()
+        return len(data)
+
+    def read(self, size=1):
+        try:
+            return self.host.recv(size)
+        except BlockingIOError:
+            return b""
+
+
+def test_wait_for_bootloader(tmp_path, monkeypatch):
+    latencies = EntryLatencies(tmp_path / "latency.json")
+    monkeypatch.setattr(bootloader, "_latencies", latencies)
+    device = SocketBoot(answers_from=3)
+
+    elapsed = asyncio.run(aio.wait_for_bootloader(device, "stk500", "2341:0043"))
+
+    assert elapsed is not None
+    assert device.probes == 3
+    assert latencies.get("2341:0043") == elapsed
+
+
+def test_wait_for_bootloader_gives_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(bootloader, "_latencies", EntryLatencies(tmp_path / "latency.json"))
+    device = SocketBoot(answers_from=10**9)
+    assert asyncio.run(aio.wait_for_bootloader(device, "stm32", timeout=0.2)) is None
+
+
+def test_probes_share_one_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(bootloader, "_latencies", EntryLatencies(tmp_path / "latency.json"))
+    devices = [SocketBoot(answers_from=4, reply=b"\x79") for _ in range(20)]
+    threads = threading.active_count()
+
+    async def main():
+        return await asyncio.gather(*(aio.wait_for_bootloader(d, "stm32") for d in devices))
+
+    assert all(elapsed is not None for elapsed in asyncio.run(main()))
+    # Only the reply timers ran outside the event loop
+    assert threading.active_count() <= threads + len(devices)
+
+
+def test_reset_missing_port():
+    assert asyncio.run(aio.reset("/dev/ttyNONEXISTENT", "dtr", vid_pid="2341:0043")) is False
+
+
+def test_leased_waits_off_loop(monkeypatch):
+    monkeypatch.setattr(session, "_pool", SerialSessionPool(factory=FakeHandle))
+    held, release = threading.Event(), threading.Event()
+
+    def worker():
+        with session.get_pool().lease("/dev/ttyUSB0"):
+            held.set()
+            release.wait(5)
+
+    threading.Thread(target=worker).start()
+    held.wait(5)
+    order = []
+
+    async def use(name):
+        async with aio.leased("/dev/ttyUSB0", baudrate=1200) as ser:
+            assert ser.baudrate == 1200
+            order.append(f"{name} in")
+            await asyncio.sleep(0.02)
+            order.append(f"{name} out")
+
+    async def main():
+        tasks = [asyncio.ensure_future(use(name)) for name in ("a", "b")]
+        # The loop keeps running while a worker thread holds the port
+        await asyncio.sleep(0.05)
+        assert order == []
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    # Leases on one port take turns instead of interleaving
+    assert order == ["a in", "a out", "b in", "b out"]
+
+
+def test_flash_board_keeps_one_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(session, "_pool", SerialSessionPool(factory=FakeHandle))
+    firmware = tmp_path / "firmware.bin"
+    firmware.write_text("fake firmware content")
+    handles = []
+
+    def step(self, firmware_path, **kwargs):
+        # Runs on an engine worker, nested in the session held for the board
+        with session.get_pool().lease(self.port) as ser:
+            handles.append(ser)
+        return True
+
+    monkeypatch.setattr(GenericFlasher, "flash", step)
+    monkeypatch.setattr(GenericFlasher, "verify", step)
+    result = batch.PortResult(port="/dev/ttyUSB0", platform="generic")
+
+    asyncio.run(
+        aio.flash_board(result, str(firmware), reset=False, flash_options={"method": "serial"})
+    )
+
+    assert result.status == batch.DONE
+    assert len(handles) == 2 and handles[0] is handles[1]
+    assert handles[0].opens == 1
+    assert not session.get_pool().held("/dev/ttyUSB0")
+
+
+def test_flash_many(tmp_path):
+    firmware = tmp_path / "firmware.bin"
+    firmware.write_text("fake firmware content")
+    devices = [make_device(f"/dev/ttyUSB{i}") for i in range(30)]
+    updates = []
+
+    report = asyncio.run(
+        aio.flash_many(
+            devices, str(firmware), platform="generic", reset=False, on_update=updates.append
+        )
+    )
+
+    assert len(report.succeeded) == 30
+    assert all(r.status == batch.DONE for r in report.results)
+    assert {u.port for u in updates} == {d.port for d in devices}
+
+
+def test_flash_many_bootloader_not_responding(tmp_path, monkeypatch):
+    firmware = tmp_path / "firmware.bin"
+    firmware.write_text("fake firmware content")
+
+    async def no_answer(port, method="dtr", probe=None, baud=115200, vid_pid=None, log=print):
+        log(f"No answer from the bootloader on {port}")
+        return False
+
+    monkeypatch.setattr(aio, "reset", no_answer)
+    report = asyncio.run(
+        aio.flash_many([make_device("/dev/ttyUSB0")], str(firmware), platform="generic")
+    )
+
+    result = report.results[0]
+    assert result.status == batch.FAILED
+    assert result.error == "Bootloader not responding"
+    assert result.messages == ["No answer from the bootloader on /dev/ttyUSB0"]
+
+
+def test_flash_many_limits(tmp_path, monkeypatch):
+    firmware = tmp_path / "firmware.bin"
+    firmware.write_text("fake firmware content")
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0, "hub": 0, "hub_peak": 0}
+
+    def slow_flash(self, firmware_path, **kwargs):
+        on_hub = self.port.startswith("/dev/ttyACM")
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            state["hub"] += on_hub
+            state["hub_peak"] = max(state["hub_peak"], state["hub"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+            state["hub"] -= on_hub
+        return True
+
+    monkeypatch.setattr(GenericFlasher, "flash", slow_flash)
+    devices = [make_device(f"/dev/ttyUSB{i}") for i in range(8)]
+    for i in range(4):
+        device = make_device(f"/dev/ttyACM{i}")
+        device.location = f"1-1.{i + 1}:1.0"
+        devices.append(device)
+
+    report = asyncio.run(
+        aio.flash_many(
+            devices,
+            str(firmware),
+            platform="generic",
+            reset=False,
+            verify=False,
+            concurrency=5,
+            scheduler=TopologyScheduler(per_hub=2),
+        )
+    )
+
+    assert len(report.succeeded) == 12
+    assert state["peak"] <= 5
+    assert state["hub_peak"] <= 2
@@ -0,0 +1,159 @@
+"""Tests for parallel flashing module."""
+
+import threading
+import time
+
+from tron_shell import batch
+from tron_shell.flasher import GenericFlasher, TopologyScheduler
+from tron_shell.usb_detector import USBDevice
+
+
+def make_device(port, vid=None, pid=None, description="Test Device"):
+    """Create a USBDevice for testing."""
+    return USBDevice(
+        port=port,
+        vid=vid,
+        pid=pid,
+        serial_number=None,
+        manufacturer=None,
+        product=None,
+        description=description,
+    )
+
+
+class TestFlashAll:
+    """Test parallel flashing."""
+
+    def test_flash_all_success(self, tmp_path):
+        """Test flashing several devices without reset."""
+        firmware = tmp_path / "firmware.bin"
+        firmware.write_text("fake firmware content")
+
+        devices = [make_device(f"/dev/ttyUSB{i}") for i in range(5)]
+        report = batch.flash_all(devices, str(firmware), platform="generic", reset=False)
+
+        assert len(report.results) == 5
+        assert len(report.succeeded) == 5
+        assert not report.failed
+        assert all(r.status == batch.DONE for r in report.results)
+
+    def test_flash_all_identifies_platform(self, tmp_path):
+        """Test per-device platform identification."""
+        firmware = tmp_path / "firmware.bin"
+        firmware.write_text("fake firmware content")
+
+        devices = [
+            make_device("/dev/ttyACM0", vid=0x2341, pid=0x0043),
+            make_device("/dev/ttyUSB0", vid=0x303A, pid=0x1001),
+        ]
+        report = batch.flash_all(devices, str(firmware), reset=False)
+
+        platforms = {r.port: r.platform for r in report.results}
+        assert platforms == {"/dev/ttyACM0": "Arduino", "/dev/ttyUSB0": "ESP32-S2/S3"}
+
+    def test_flash_all_bootloader_not_responding(self, tmp_path, monkeypatch):
+        """Test that a board whose bootloader never answers is not flashed."""
+        firmware = tmp_path / "firmware.bin"
+        firmware.write_text("fake firmware content")
+        flashed = []
+
+        def no_answer(port, platform="auto", log=print):
+            log(f"No answer from the stk500 bootloader on {port}")
+            return False
+
+        monkeypatch.setattr(batch.BootloaderManager, "enter_bootloader", no_answer)
+        monkeypatch.setattr(GenericFlasher, "flash", lambda self, *a, **k: flashed.append(1))
+        report = batch.flash_all([make_device("/dev/ttyUSB0")], str(firmware), platform="generic")
+
+        result = report.results[0]
+        assert result.status == batch.FAILED
+        assert result.error == "Bootloader not responding"
+        assert result.messages == ["No answer from the stk500 bootloader on /dev/ttyUSB0"]
+        assert not flashed
+
+    def test_flash_all_reports_failures(self, tmp_path):
+        """Test that a missing firmware file fails every port."""
+        devices = [make_device("/dev/ttyUSB0"), make_device("/dev/ttyUSB1")]
+        report = batch.flash_all(
+            devices, str(tmp_path / "missing.bin"), platform="generic", reset=False
+        )
+
+        assert len(report.failed) == 2
+        assert all("not found" in r.error for r in report.failed)
+
+    def test_flash_all_respects_worker_limit(self, tmp_path, monkeypatch):
+        """Test that no more than `workers` devices are flashed at once."""
+        firmware = tmp_path / "firmware.bin"
+        firmware.write_text("fake firmware content")
+
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def slow_flash(self, firmware_path, **kwargs):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.05)
+            with lock:
+                state["active"] -= 1
+            return True
+
+        monkeypatch.setattr(GenericFlasher, "flash", slow_flash)
+
+        devices = [make_device(f"/dev/ttyUSB{i}") for i in range(8)]
+        report = batch.flash_all(devices, str(firmware), platform="generic", workers=3, reset=False)
+
+        assert len(report.succeeded) == 8
+        assert 1 < state["peak"] <= 3
+
+    def test_flash_all_updates(self, tmp_path):
+        """Test that status updates are reported for every port."""
+        firmware = tmp_path / "firmware.bin"
+        firmware.write_text("fake firmware content")
+
+        seen = []
+        devices = [make_device("/dev/ttyUSB0")]
+        batch.flash_all(
+            devices,
+            str(firmware),
+            platform="generic",
+            reset=False,
+            on_update=lambda r: seen.append(r.status),
+        )
+
+        assert seen == [batch.QUEUED, batch.FLASHING, batch.VERIFYING, batch.DONE]
+
+    def test_flash_all_limits_per_hub(self, tmp_path, monkeypatch):
+        """Test that devices behind one hub respect the per-hub limit."""
+        firmware = tmp_path / "firmware.bin"
+        firmware.write_text("fake firmware content")
+
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def slow_flash(self, firmware_path, **kwargs):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.05)
+            with lock:
+                state["active"] -= 1
+            return True
+
+        monkeypatch.setattr(GenericFlasher, "flash", slow_flash)
+
+        devices = [make_device(f"/dev/ttyUSB{i}") for i in range(6)]
+        for i, device in enumerate(devices):
+            device.location = f"1-1.{i + 1}:1.0"
+
+        report = batch.flash_all(
+            devices,
+            str(firmware),
+            platform="generic",
+            workers=6,
+            reset=False,
+            scheduler=TopologyScheduler(per_hub=2),
+        )
+
+        assert len(report.succeeded) == 6
+        assert state["peak"] == 2
@@ -1,6 +1,10 @@
 """Tests for bootloader management module."""
 
-from tron_shell.bootloader import BootloaderManager
+import pytest
+from tron_shell import bootloader
+from tron_shell.bootloader import BootloaderManager, EntryLatencies, wait_for_bootloader
+
+from .test_stk500 import FakeOptiboot, SilentPort
 
 
 class TestBootloaderManager:
@@ -28,3 +32,83 @@ class TestBootloaderManager:
 
         result = BootloaderManager.enter_bootloader("/dev/ttyUSB1", "stm32")
         assert result is True
+
+
+class SlowBoot:
+    """Serial handle whose bootloader answers sync from the Nth probe on."""
+
+    def __init__(self, answers_from):
+        self.answers_from = answers_from
+        self.probes = 0
+        self.timeout = 1
+
+    def probe(self, ser):
+        assert ser.timeout == bootloader.PROBE_READ_TIMEOUT
+        self.probes += 1
+        return self.probes >= self.answers_from
+
+
+@pytest.fixture
+def latencies(tmp_path, monkeypatch):
+    store = EntryLatencies(tmp_path / "latency.json")
+    monkeypatch.setattr(bootloader, "_latencies", store)
+    return store
+
+
+class TestWaitForBootloader:
+    """Test sync probing after a reset."""
+
+    def test_backoff_until_answer(self, latencies, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr(bootloader.time, "sleep", sleeps.append)
+        device = SlowBoot(answers_from=8)
+
+        elapsed = wait_for_bootloader(device, device.probe, "2341:0043")
+
+        assert elapsed is not None
+        assert device.probes == 8
+        assert device.timeout == 1
+        assert sleeps[0] == bootloader.PROBE_BACKOFF
+        assert all(later >= earlier for earlier, later in zip(sleeps, sleeps[1:]))
+        assert max(sleeps) <= bootloader.PROBE_BACKOFF_MAX
+        assert latencies.get("2341:0043") == elapsed
+
+    def test_gives_up(self, latencies):
+        device = SlowBoot(answers_from=10**9)
+        assert wait_for_bootloader(device, device.probe, "2341:0043", timeout=0.05) is None
+        assert latencies.get("2341:0043") is None
+
+    def test_learned_latency_delays_first_probe(self, latencies, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr(bootloader.time, "sleep", sleeps.append)
+        latencies.record("2341:0043", 0.4)
+        device = SlowBoot(answers_from=1)
+
+        wait_for_bootloader(device, device.probe, "2341:0043")
+
+        assert sleeps == [0.2]
+
+    def test_stk500_probe(self):
+        assert bootloader.stk500_probe(FakeOptiboot()) is True
+        assert bootloader.stk500_probe(SilentPort()) is False
+
+
+class TestEntryLatencies:
+    """Test the learned per-VID:PID entry latency."""
+
+    def test_moving_average_persisted(self, tmp_path):
+        path = tmp_path / "latency.json"
+        store = EntryLatencies(path)
+        store.record("1A86:7523", 0.2)
+        store.record("1A86:7523", 0.3)
+        expected = 0.2 + bootloader.LATENCY_ALPHA * 0.1
+
+        assert store.get("1A86:7523") == pytest.approx(expected)
+        assert EntryLatencies(path).get("1A86:7523") == pytest.approx(expected)
+        assert store.get("0403:6001") is None
+        assert store.get(None) is None
+
+    def test_corrupt_file_ignored(self, tmp_path):
+        path = tmp_path / "latency.json"
+        path.write_text("[not json")
+        assert EntryLatencies(path).get("1A86:7523") is None
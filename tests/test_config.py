@@ -0,0 +1,151 @@
+"""Tests for configuration loading module."""
+
+import datetime
+import os
+
+import pytest
+
+from tron_shell import config
+from tron_shell.config import ConfigError, load_config, validate_config
+
+RULES_YAML = """
+default_baud: 57600
+usb_rules:
+  - vendor_id: "10C4"
+    product_id: "EA60"
+    platform: "esp32"
+    description_keywords: ["cp210"]
+"""
+
+
+@pytest.fixture
+def cache_home(tmp_path, monkeypatch):
+    """Point the cache directory at a temporary location."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(config, "_loaded", {})
+    return tmp_path / "cache" / "tron-shell"
+
+
+@pytest.fixture
+def count_parses(monkeypatch):
+    """Count how often the YAML file is actually parsed."""
+    calls = []
+    original = config._parse_yaml
+    monkeypatch.setattr(config, "_parse_yaml", lambda path: calls.append(path) or original(path))
+    return calls
+
+
+class TestLoadConfig:
+    """Test cached configuration loading."""
+
+    def test_load_and_validate(self, tmp_path, cache_home):
+        """Test loading a file fills defaults and normalizes IDs."""
+        path = tmp_path / "rules.yaml"
+        path.write_text(RULES_YAML)
+
+        loaded = load_config(path)
+        assert loaded["default_baud"] == 57600
+        assert loaded["timeout"] == 5.0
+        assert loaded["debug"]["verbose_errors"] is True
+        assert loaded["usb_rules"][0]["vendor_id"] == "10c4"
+        assert loaded["usb_rules"][0]["product_id"] == "ea60"
+
+    def test_snapshot_reused(self, tmp_path, cache_home, count_parses):
+        """Test that a fresh process reuses the snapshot instead of parsing."""
+        path = tmp_path / "rules.yaml"
+        path.write_text(RULES_YAML)
+
+        first = load_config(path)
+        assert len(count_parses) == 1
+        assert list(cache_home.glob("config-*.marshal"))
+
+        # Simulate a new process
+        config._loaded.clear()
+        assert load_config(path) == first
+        assert len(count_parses) == 1
+
+    def test_callers_get_copies(self, tmp_path, cache_home):
+        """Test that changing a loaded configuration does not affect later loads."""
+        path = tmp_path / "rules.yaml"
+        path.write_text(RULES_YAML)
+
+        first = load_config(path)
+        first["default_baud"] = 9600
+        first["usb_rules"].clear()
+        first["debug"]["verbose_errors"] = False
+
+        second = load_config(path)
+        assert second["default_baud"] == 57600
+        assert second["usb_rules"]
+        assert second["debug"]["verbose_errors"] is True
+
+    def test_dates_load(self, tmp_path, cache_home):
+        """Test that values marshal cannot hold still load, without a snapshot."""
+        path = tmp_path / "rules.yaml"
+        path.write_text(RULES_YAML + "updated: 2024-05-01\n")
+
+        first = load_config(path)
+        assert first["updated"] == datetime.date(2024, 5, 1)
+        assert load_config(path) == first
+        assert not list(cache_home.glob("config-*.marshal"))
+
+    def test_snapshot_invalidated_on_change(self, tmp_path, cache_home, count_parses):
+        """Test that editing the YAML file rebuilds the snapshot."""
+        path = tmp_path / "rules.yaml"
+        path.write_text(RULES_YAML)
+        load_config(path)
+
+        path.write_text(RULES_YAML.replace("57600", "9600"))
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        config._loaded.clear()
+
+        assert load_config(path)["default_baud"] == 9600
+        assert len(count_parses) == 2
+
+    def test_corrupt_snapshot(self, tmp_path, cache_home, count_parses):
+        """Test that an unreadable snapshot falls back to parsing."""
+        path = tmp_path / "rules.yaml"
+        path.write_text(RULES_YAML)
+        load_config(path)
+
+        for snapshot in cache_home.glob("config-*.marshal"):
+            snapshot.write_bytes(b"garbage")
+        config._loaded.clear()
+
+        assert load_config(path)["default_baud"] == 57600
+        assert len(count_parses) == 2
+
+    def test_missing_file(self, tmp_path, cache_home):
+        """Test that a missing file gives the default configuration."""
+        assert load_config(tmp_path / "missing.yaml") == config.DEFAULT_CONFIG
+
+
+class TestValidateConfig:
+    """Test configuration validation."""
+
+    def test_empty(self):
+        """Test that an empty document gives the defaults."""
+        assert validate_config(None) == config.DEFAULT_CONFIG
+
+    def test_invalid(self):
+        """Test malformed configurations."""
+        with pytest.raises(ConfigError):
+            validate_config(["not", "a", "mapping"])
+        with pytest.raises(ConfigError):
+            validate_config({"usb_rules": {"platform": "esp32"}})
+        with pytest.raises(ConfigError):
+            validate_config({"usb_rules": [{"vendor_id": "2341"}]})
+        with pytest.raises(ConfigError):
+            validate_config({"usb_rules": [{"platform": "x", "description_keywords": "uno"}]})
+        with pytest.raises(ConfigError):
+            validate_config({"debug": True})
+        with pytest.raises(ConfigError):
+            validate_config({"default_baud": "fast"})
+        with pytest.raises(ConfigError):
+            validate_config({"timeout": None})
+
+    def test_bundled_rules(self):
+        """Test that the bundled default rules are valid."""
+        loaded = validate_config(config._parse_yaml(str(config.BUNDLED_CONFIG_PATH)))
+        assert {rule["platform"] for rule in loaded["usb_rules"]} >= {"atmega328p", "esp32"}
@@ -0,0 +1,46 @@
+"""Tests for delta flashing plans."""
+
+from tron_shell.delta import covered_sectors, fixed_sectors, plan_delta, sector_image
+
+
+class TestSectors:
+    """Test sector lookup and expected sector contents."""
+
+    def test_covered_sectors(self):
+        sector_of = fixed_sectors(0x1000)
+        segments = [(0x0FFE, b"\x00" * 4), (0x3000, b"\x00")]
+        assert covered_sectors(segments, sector_of) == [
+            (0x0000, 0x1000),
+            (0x1000, 0x2000),
+            (0x3000, 0x4000),
+        ]
+
+    def test_sector_image_pads_uncovered_bytes(self):
+        segments = [(0x0FFE, b"\x01\x02\x03\x04")]
+        assert sector_image(segments, 0x1000, 0x1008) == b"\x03\x04" + b"\xff" * 6
+        assert sector_image(segments, 0x0FF8, 0x1000, fill=0x00) == b"\x00" * 6 + b"\x01\x02"
+
+
+class TestPlanDelta:
+    """Test comparison against device contents."""
+
+    def test_only_differing_sectors_are_rewritten(self):
+        device = bytearray(b"\x11" * 64)
+        device[40] = 0x22
+        image = [(0, b"\x11" * 64)]
+        checked = []
+
+        def unchanged(address, data):
+            checked.append(address)
+            return device[address : address + len(data)] == data
+
+        plan = plan_delta(image, fixed_sectors(16), unchanged)
+
+        assert checked == [0, 16, 32, 48]
+        assert plan.unchanged == 3
+        assert plan.segments() == [(32, b"\x11" * 16)]
+
+    def test_adjacent_sectors_coalesce(self):
+        plan = plan_delta([(0, b"\x00" * 40)], fixed_sectors(16), lambda address, data: False)
+        assert plan.segments() == [(0, b"\x00" * 40 + b"\xff" * 8)]
+        assert plan.unchanged == 0
@@ -0,0 +1,194 @@
+"""Tests for the USB DFU backend."""
+
+import pytest
+from tron_shell.flasher import FlashError
+from tron_shell.protocols import dfu
+from tron_shell.protocols.dfu import (
+    DFUDevice,
+    FunctionalDescriptor,
+    parse_functional_descriptor,
+    parse_layout,
+)
+
+F4_LAYOUT = "@Internal Flash  /0x08000000/04*016Kg,01*064Kg,07*128Kg"
+
+
+class FakeDfuSe:
+    """pyusb device emulating the STM32 DfuSe bootloader."""
+
+    def __init__(self, poll_timeout=5, fail_erase=False):
+        self.memory = {}
+        self.state = dfu.STATE_IDLE
+        self.status = dfu.STATUS_OK
+        self.poll_timeout = poll_timeout
+        self.fail_erase = fail_erase
+        self.address = 0
+        self.erased = []
+        self.left = False
+        self.transfers = []
+
+    def ctrl_transfer(self, request_type, request, value, index, data, timeout):
+        self.transfers.append(
+            (request, value, len(data) if request_type == dfu.REQUEST_OUT else data)
+        )
+        if request == dfu.DFU_GETSTATUS:
+            if self.state == dfu.STATE_DNLOAD_SYNC:
+                self.state = dfu.STATE_DNBUSY
+            elif self.state == dfu.STATE_DNBUSY:
+                self.state = dfu.STATE_DNLOAD_IDLE
+            elif self.state == dfu.STATE_MANIFEST_SYNC:
+                self.left = True
+            return (
+                bytes([self.status])
+                + self.poll_timeout.to_bytes(3, "little")
+                + bytes([self.state, 0])
+            )
+        if request == dfu.DFU_CLRSTATUS:
+            self.state, self.status = dfu.STATE_IDLE, dfu.STATUS_OK
+            return 0
+        if request == dfu.DFU_ABORT:
+            self.state = dfu.STATE_IDLE
+            return 0
+        if request == dfu.DFU_DNLOAD:
+            data = bytes(data)
+            if not data:
+                self.state = dfu.STATE_MANIFEST_SYNC
+            elif value == 0 and data[0] == dfu.DFUSE_SET_ADDRESS:
+                self.address = int.from_bytes(data[1:5], "little")
+                self.state = dfu.STATE_DNLOAD_SYNC
+            elif value == 0 and data[0] == dfu.DFUSE_ERASE:
+                if self.fail_erase:
+                    self.state, self.status = dfu.STATE_ERROR, 0x0A
+                    return len(data)
+                self.erased.append(int.from_bytes(data[1:5], "little"))
+                self.state = dfu.STATE_DNLOAD_SYNC
+            else:
+                start = self.address + (value - 2) * 2048
+                for offset, byte in enumerate(data):
+                    self.memory[start + offset] = byte
+                self.state = dfu.STATE_DNLOAD_SYNC
+            return len(data)
+        if request == dfu.DFU_UPLOAD:
+            start = self.address + (value - 2) * 2048
+            self.state = dfu.STATE_UPLOAD_IDLE
+            return bytes(self.memory.get(start + i, 0xFF) for i in range(data))
+        raise AssertionError(f"unexpected request {request}")
+
+
+def make_device(fake):
+    return DFUDevice(
+        fake,
+        descriptor=FunctionalDescriptor(0x0B, 255, 2048, dfu.DFUSE_VERSION),
+        layout=parse_layout(F4_LAYOUT),
+    )
+
+
+class TestDescriptors:
+    """Test descriptor and layout parsing."""
+
+    def test_functional_descriptor(self):
+        interface = bytes([9, 0x04, 0, 0, 0, 0xFE, 1, 2, 4])
+        functional = bytes([9, 0x21, 0x0B, 0xFF, 0x00, 0x00, 0x08, 0x1A, 0x01])
+        descriptor = parse_functional_descriptor(interface + functional)
+        assert descriptor.transfer_size == 2048
+        assert descriptor.version == dfu.DFUSE_VERSION
+        assert parse_functional_descriptor(interface) is None
+
+    def test_layout(self):
+        layout = parse_layout(F4_LAYOUT)
+        assert layout.name == "Internal Flash"
+        assert layout.start == 0x08000000
+        assert [r.page_size for r in layout.regions] == [16384, 65536, 131072]
+        assert layout.regions[-1].end == 0x08100000
+        assert parse_layout("Internal Flash") is None
+
+    def test_pages_for_range(self):
+        layout = parse_layout(F4_LAYOUT)
+        assert layout.pages_for_range(0x08000000, 0x08004001) == [0x08000000, 0x08004000]
+        assert layout.pages_for_range(0x08010000, 0x08010004) == [0x08010000]
+        # Read-only regions are never erased
+        assert (
+            parse_layout("@OTP /0x1FFF7800/01*512 e").pages_for_range(0x1FFF7800, 0x1FFF7900) == []
+        )
+
+
+class TestDFUDevice:
+    """Test downloads against an emulated DfuSe bootloader."""
+
+    def test_program_erases_image_range(self, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr(dfu.time, "sleep", sleeps.append)
+        fake = FakeDfuSe()
+        image = bytes(range(256)) * 80
+
+        result = make_device(fake).program([(0x08000000, image)])
+
+        assert fake.erased == [0x08000000, 0x08004000]
+        assert bytes(fake.memory[0x08000000 + i] for i in range(len(image))) == image
+        assert result.pages_written == 10
+        assert result.verified is True
+        assert fake.left
+        # Every busy state waited exactly the advertised poll timeout
+        assert sleeps and set(sleeps) == {0.005}
+
+    def test_transfer_size_blocks(self, monkeypatch):
+        monkeypatch.setattr(dfu.time, "sleep", lambda seconds: None)
+        fake = FakeDfuSe(poll_timeout=0)
+        make_device(fake).write(0x08000000, b"\x00" * 5000)
+        sizes = [
+            size
+            for request, value, size in fake.transfers
+            if request == dfu.DFU_DNLOAD and value >= 2
+        ]
+        assert sizes == [2048, 2048, 904]
+
+    def test_erase_error(self, monkeypatch):
+        monkeypatch.setattr(dfu.time, "sleep", lambda seconds: None)
+        fake = FakeDfuSe(fail_erase=True)
+        with pytest.raises(FlashError):
+            make_device(fake).program([(0x08000000, b"\x00" * 16)])
+        assert fake.state == dfu.STATE_IDLE
+
+    def test_blank_blocks_not_sent(self, monkeypatch):
+        monkeypatch.setattr(dfu.time, "sleep", lambda seconds: None)
+        fake = FakeDfuSe(poll_timeout=0)
+        image = b"\x01" * 2048 + b"\xff" * 4096 + b"\x02" * 10
+
+        result = make_device(fake).program([(0x08000000, image)])
+
+        assert result.pages_written == 2
+        assert result.pages_skipped == 2
+        assert result.verified is True
+
+    def test_delta_rewrites_changed_pages_only(self, monkeypatch):
+        monkeypatch.setattr(dfu.time, "sleep", lambda seconds: None)
+        fake = FakeDfuSe(poll_timeout=0)
+        device = make_device(fake)
+        image = bytearray(b"\x44" * 0x8000)
+        device.program([(0x08000000, bytes(image))])
+
+        image[0x10] = 0
+        fake.erased.clear()
+        result = device.program([(0x08000000, bytes(image))], delta=True)
+
+        assert fake.erased == [0x08000000]
+        assert fake.memory[0x08000010] == 0
+        assert result.sectors_unchanged == 1
+        assert result.verified is True
+
+    def test_plain_dfu_has_no_addresses(self, monkeypatch):
+        monkeypatch.setattr(dfu.time, "sleep", lambda seconds: None)
+        fake = FakeDfuSe(poll_timeout=0)
+        device = DFUDevice(fake, descriptor=FunctionalDescriptor(0x0B, 255, 2048, 0x0110))
+        image = bytes(range(256)) * 40
+
+        result = device.program([(0, image)], run=False)
+        assert result.verified is True
+        assert not fake.erased
+        # Too big to read whole, but plain DFU cannot sample at an offset
+        assert device.verify([(0, image)], max_read=4096).method == "read-back"
+
+        with pytest.raises(FlashError):
+            device.read(0x08000000, 16)
+        with pytest.raises(FlashError):
+            device.write(0x800, image)
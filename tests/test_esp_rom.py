@@ -0,0 +1,273 @@
+"""Tests for the Espressif ROM loader engine."""
+
+import struct
+import hashlib
+import zlib
+
+import pytest
+from tron_shell.flasher import FlashError
+from tron_shell.protocols import esp_rom
+from tron_shell.protocols.esp_rom import (
+    ESPLoader,
+    checksum,
+    esp8266_erase_size,
+    pad_to_sectors,
+    slip_decode,
+    slip_encode,
+    split_aligned,
+)
+
+ESP32_MAGIC = 0x00F01D83
+ESP8266_MAGIC = 0xFFF0C101
+
+
+class FakeROM:
+    """Serial handle emulating the ESP32 or ESP8266 ROM loader."""
+
+    def __init__(self, magic=ESP32_MAGIC, flash_size=4 * 1024 * 1024, corrupt=None):
+        self.magic = magic
+        self.status_length = 4 if magic == ESP32_MAGIC else 2
+        self.flash = bytearray(b"\xff" * flash_size)
+        self.corrupt = corrupt
+        self.baudrate = esp_rom.ROM_BAUD
+        self.pending = bytearray()
+        self.output = bytearray()
+        self.commands = []
+        self.write_address = 0
+        self.decompressor = None
+        self.rebooted = False
+
+    @property
+    def in_waiting(self):
+        return len(self.output)
+
+    def reset_input_buffer(self):
+        self.output.clear()
+
+    def read(self, size=1):
+        data = bytes(self.output[:size])
+        del self.output[:size]
+        return data
+
+    def write(self, data):
+        self.pending += data
+        while True:
+            start = self.pending.find(esp_rom.SLIP_END)
+            end = self.pending.find(esp_rom.SLIP_END, start + 1)
+            if start < 0 or end < 0:
+                break
+            packet = slip_decode(bytes(self.pending[start + 1 : end]))
+            del self.pending[: end + 1]
+            self._handle(packet)
+        return len(data)
+
+    def _reply(self, op, value=0, body=b"", error=0):
+        status = bytes([1 if error else 0, error]) + b"\x00" * (self.status_length - 2)
+        frame = struct.pack("<BBHI", 0x01, op, len(body) + len(status), value) + body + status
+        self.output += slip_encode(frame)
+
+    def _store(self, data):
+        self.flash[self.write_address : self.write_address + len(data)] = data
+        if self.corrupt is not None:
+            if self.write_address <= self.corrupt < self.write_address + len(data):
+                self.flash[self.corrupt] ^= 0xFF
+        self.write_address += len(data)
+
+    def _handle(self, packet):
+        _, op, size, check = struct.unpack("<BBHI", packet[:8])
+        data = packet[8:]
+        assert len(data) == size
+        self.commands.append(op)
+
+        compressed_ops = (esp_rom.FLASH_DEFL_BEGIN, esp_rom.CHANGE_BAUDRATE, esp_rom.SPI_FLASH_MD5)
+        if self.magic == ESP8266_MAGIC and op in compressed_ops:
+            self._reply(op, error=0x05)
+            return
+
+        if op == esp_rom.SYNC:
+            for _ in range(4):
+                self._reply(op)
+            return
+        if op == esp_rom.READ_REG:
+            self._reply(op, value=self.magic)
+            return
+        if op in (esp_rom.FLASH_DEFL_BEGIN, esp_rom.FLASH_BEGIN):
+            erase_size, _, _, offset = struct.unpack("<IIII", data)
+            # The ROM erases whole sectors
+            sector = esp_rom.FLASH_SECTOR_SIZE
+            start = offset // sector * sector
+            end = -(-(offset + erase_size) // sector) * sector
+            self.flash[start:end] = b"\xff" * (end - start)
+            self.write_address = offset
+            self.decompressor = zlib.decompressobj()
+        elif op in (esp_rom.FLASH_DEFL_DATA, esp_rom.FLASH_DATA):
+            block = data[16:]
+            if checksum(block) != check:
+                self._reply(op, error=0x07)
+                return
+            if op == esp_rom.FLASH_DEFL_DATA:
+                block = self.decompressor.decompress(block)
+            self._store(block)
+        elif op == esp_rom.CHANGE_BAUDRATE:
+            self._reply(op)
+            return
+        elif op == esp_rom.SPI_FLASH_MD5:
+            address, length, _, _ = struct.unpack("<IIII", data)
+            digest = hashlib.md5(self.flash[address : address + length]).hexdigest()
+            self._reply(op, body=digest.encode("ascii"))
+            return
+        elif op in (esp_rom.FLASH_DEFL_END, esp_rom.FLASH_END):
+            self.rebooted = struct.unpack("<I", data)[0] == 0
+        self._reply(op)
+
+
+class TestSLIP:
+    """Test SLIP framing and checksums."""
+
+    def test_round_trip(self):
+        packet = bytes([0x01, 0xC0, 0xDB, 0x02, 0xDB, 0xDC])
+        frame = slip_encode(packet)
+        assert frame[0] == frame[-1] == 0xC0
+        assert 0xC0 not in frame[1:-1]
+        assert slip_decode(frame[1:-1]) == packet
+
+    def test_checksum(self):
+        assert checksum(b"") == 0xEF
+        assert checksum(b"\x01\x02") == 0xEF ^ 0x03
+
+    def test_split_aligned(self):
+        pieces = split_aligned([(0x1F000, b"\x00" * 0x12000)], 0x10000)
+        assert [(address, len(data)) for address, data in pieces] == [
+            (0x1F000, 0x1000),
+            (0x20000, 0x10000),
+            (0x30000, 0x1000),
+        ]
+
+    def test_pad_to_sectors(self):
+        pieces = pad_to_sectors(
+            [(0x5000, b"\x03" * 4), (0x1100, b"\x01" * 0x10), (0x1800, b"\x02" * 0x900)]
+        )
+        assert [(address, len(data)) for address, data in pieces] == [
+            (0x1000, 0x2000),
+            (0x5000, 0x1000),
+        ]
+        data = pieces[0][1]
+        assert data[0x100:0x110] == b"\x01" * 0x10
+        assert data[0x800:0x1100] == b"\x02" * 0x900
+        assert set(data[:0x100] + data[0x110:0x800] + data[0x1100:]) == {0xFF}
+
+    def test_esp8266_erase_size(self):
+        # Small regions are halved to compensate for the ROM erasing them twice
+        assert esp8266_erase_size(0, 0x1000) == 0x1000
+        assert esp8266_erase_size(0, 0x4000) == 0x2000
+        assert esp8266_erase_size(0, 0x20000) == 0x10000
+
+
+class TestESPLoader:
+    """Test the ROM loader engine against an emulated chip."""
+
+    def connect(self, device):
+        loader = ESPLoader(device)
+        loader.sync()
+        loader.detect_chip()
+        return loader
+
+    def test_sync_and_detect_esp32(self):
+        loader = self.connect(FakeROM())
+        assert loader.chip.name == "esp32"
+        assert loader.chip.app_offset == 0x10000
+
+    def test_sync_timeout(self):
+        device = FakeROM()
+        device.write = lambda data: len(data)
+        with pytest.raises(FlashError):
+            ESPLoader(device).sync(attempts=2)
+
+    def test_change_baud(self):
+        device = FakeROM()
+        loader = self.connect(device)
+        loader.change_baud(921600)
+        assert device.baudrate == 921600
+
+    def test_compressed_upload_with_md5(self):
+        device = FakeROM()
+        loader = self.connect(device)
+        image = bytes(range(256)) * 64 + b"\x00" * 10000
+
+        result = loader.program([(0x10000, image)])
+
+        padded = image.ljust((len(image) + 3) & ~3, b"\xff")
+        assert device.flash[0x10000 : 0x10000 + len(padded)] == padded
+        assert esp_rom.FLASH_DEFL_DATA in device.commands
+        assert esp_rom.FLASH_DATA not in device.commands
+        # Compressed blocks are far fewer than the raw size would need
+        assert result.pages_written < len(image) // esp_rom.FLASH_WRITE_SIZE
+        assert result.verified is True
+        assert result.image_digest == result.device_digest
+        assert device.rebooted
+
+    def test_large_image_sent_in_pipelined_chunks(self):
+        device = FakeROM()
+        loader = self.connect(device)
+        image = bytes(range(256)) * 1000
+
+        result = loader.program([(0x10000, image)])
+
+        assert device.flash[0x10000 : 0x10000 + len(image)] == image
+        assert device.commands.count(esp_rom.FLASH_DEFL_BEGIN) == 4
+        assert result.verified is True
+        assert result.verify_method == "device-hash"
+
+    def test_segments_sharing_a_sector(self):
+        device = FakeROM()
+        loader = self.connect(device)
+        first, second = b"\x11" * 0x100, b"\x22" * 0x100
+
+        result = loader.program([(0x10000, first), (0x10800, second)])
+
+        # One erase covers both, so the second does not wipe the first
+        assert device.commands.count(esp_rom.FLASH_DEFL_BEGIN) == 1
+        assert device.flash[0x10000:0x10100] == first
+        assert device.flash[0x10800:0x10900] == second
+        assert result.verified is True
+
+    def test_md5_mismatch(self):
+        device = FakeROM(corrupt=0x10010)
+        loader = self.connect(device)
+        result = loader.program([(0x10000, b"\x42" * 4096)])
+        assert result.verified is False
+
+    def test_delta_rewrites_changed_sectors_only(self):
+        device = FakeROM()
+        loader = self.connect(device)
+        image = bytearray(bytes(range(256)) * 64)
+        loader.program([(0x10000, bytes(image))])
+
+        image[0x2010] ^= 0xFF
+        device.commands.clear()
+        result = loader.program([(0x10000, bytes(image))], delta=True)
+
+        assert device.flash[0x10000 : 0x10000 + len(image)] == image
+        assert device.commands.count(esp_rom.FLASH_DEFL_BEGIN) == 1
+        assert result.bytes_written == esp_rom.FLASH_SECTOR_SIZE
+        assert result.sectors_unchanged == 3
+        assert result.verified is True
+
+    def test_esp8266_plain_upload(self):
+        device = FakeROM(magic=ESP8266_MAGIC)
+        loader = self.connect(device)
+        loader.change_baud(921600)
+        assert device.baudrate == esp_rom.ROM_BAUD
+
+        image = b"\x5a" * 3000
+        result = loader.program([(0, image)])
+
+        assert device.flash[:3000] == image
+        assert esp_rom.FLASH_DEFL_BEGIN not in device.commands
+        assert result.verified is None
+
+    def test_error_status(self):
+        device = FakeROM(magic=ESP8266_MAGIC)
+        loader = self.connect(device)
+        with pytest.raises(FlashError):
+            loader.flash_md5(0, 4096)
@@ -0,0 +1,188 @@
+"""Tests for firmware image loading."""
+
+import struct
+
+import pytest
+from tron_shell.firmware import FirmwareImage, iter_pages, plan_writes
+from tron_shell.flasher import FlashError
+
+
+def hex_record(kind, address, data):
+    record = bytes([len(data), address >> 8 & 0xFF, address & 0xFF, kind]) + data
+    return ":" + (record + bytes([-sum(record) & 0xFF])).hex().upper()
+
+
+def write_hex(path, image, base=0):
+    """Write an image as 16-byte Intel HEX data records."""
+    lines = []
+    upper = None
+    for offset in range(0, len(image), 16):
+        address = base + offset
+        if address >> 16 != upper:
+            upper = address >> 16
+            lines.append(hex_record(0x04, 0, upper.to_bytes(2, "big")))
+        lines.append(hex_record(0x00, address & 0xFFFF, image[offset : offset + 16]))
+    lines.append(":00000001FF")
+    path.write_text("\n".join(lines) + "\n")
+
+
+def write_elf32(path, segments, entry=0x08000101):
+    """Write a minimal little-endian ELF32 file with one PT_LOAD per segment."""
+    phoff = 52
+    data_offset = phoff + 32 * len(segments)
+    header = struct.pack(
+        "<16sHHIIIIIHHHHHH",
+        b"\x7fELF\x01\x01\x01" + b"\x00" * 9,
+        2,
+        40,
+        1,
+        entry,
+        phoff,
+        0,
+        0,
+        52,
+        32,
+        len(segments),
+        40,
+        0,
+        0,
+    )
+    program_headers = b""
+    body = b""
+    for address, data in segments:
+        offset = data_offset + len(body)
+        program_headers += struct.pack(
+            "<IIIIIIII", 1, offset, address + 0x1000, address, len(data), len(data), 5, 4
+        )
+        body += data
+    path.write_bytes(header + program_headers + body)
+
+
+class TestHex:
+    """Test Intel HEX loading."""
+
+    def test_merges_records_into_one_segment(self, tmp_path):
+        image = bytes(range(256)) * 2
+        firmware = tmp_path / "sketch.hex"
+        write_hex(firmware, image)
+
+        loaded = FirmwareImage.load(firmware)
+
+        assert [(address, bytes(data)) for address, data in loaded.segments] == [(0, image)]
+        assert isinstance(loaded.segments[0][1], memoryview)
+
+    def test_sparse_and_extended_address(self, tmp_path):
+        firmware = tmp_path / "app.hex"
+        lines = [
+            hex_record(0x04, 0, b"\x08\x00"),
+            hex_record(0x00, 0x0010, b"\x01\x02\x03\x04"),
+            hex_record(0x00, 0x0000, b"\xaa\xbb"),
+            hex_record(0x00, 0x0002, b"\xcc"),
+            hex_record(0x05, 0, b"\x08\x00\x01\x01"),
+            ":00000001FF",
+        ]
+        firmware.write_text("\r\n".join(lines))
+
+        loaded = FirmwareImage.load(firmware)
+
+        assert [(address, bytes(data)) for address, data in loaded.segments] == [
+            (0x08000000, b"\xaa\xbb\xcc"),
+            (0x08000010, b"\x01\x02\x03\x04"),
+        ]
+        assert loaded.entry == 0x08000101
+        assert loaded.size == 7
+        assert loaded.end == 0x08000014
+
+    def test_bad_checksum(self, tmp_path):
+        firmware = tmp_path / "bad.hex"
+        firmware.write_text(":0100000000FE\n")
+        with pytest.raises(FlashError):
+            FirmwareImage.load(firmware)
+
+    def test_bad_record_length(self, tmp_path):
+        firmware = tmp_path / "bad.hex"
+        firmware.write_text(":02000000AA\n:00000001FF\n")
+        with pytest.raises(FlashError):
+            FirmwareImage.load(firmware)
+
+    def test_not_hex(self, tmp_path):
+        firmware = tmp_path / "bad.hex"
+        firmware.write_text("fake firmware content")
+        with pytest.raises(FlashError):
+            FirmwareImage.load(firmware)
+
+
+class TestBinaryAndElf:
+    """Test memory-mapped binary and ELF loading."""
+
+    def test_binary_is_mapped(self, tmp_path):
+        firmware = tmp_path / "app.bin"
+        firmware.write_bytes(b"\x01\x02\x03")
+
+        with FirmwareImage.load(firmware, base_address=0x100) as loaded:
+            assert loaded.start == 0x100
+            assert bytes(loaded.segments[0][1]) == b"\x01\x02\x03"
+
+    def test_empty_binary(self, tmp_path):
+        firmware = tmp_path / "empty.bin"
+        firmware.write_bytes(b"")
+        assert FirmwareImage.load(firmware).segments == []
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(FlashError):
+            FirmwareImage.load(tmp_path / "missing.bin")
+
+    def test_elf_load_segments(self, tmp_path):
+        firmware = tmp_path / "app.elf"
+        write_elf32(firmware, [(0x08004000, b"\x05" * 8), (0x08000000, b"\x11\x22\x33\x44")])
+
+        loaded = FirmwareImage.load(firmware)
+
+        assert [(address, bytes(data)) for address, data in loaded.segments] == [
+            (0x08000000, b"\x11\x22\x33\x44"),
+            (0x08004000, b"\x05" * 8),
+        ]
+        assert loaded.entry == 0x08000101
+
+    def test_overlapping_segments(self):
+        with pytest.raises(FlashError):
+            FirmwareImage([(0, b"\x00" * 8), (4, b"\x00" * 8)])
+
+
+class TestPages:
+    """Test page-aligned iteration."""
+
+    def test_full_pages_are_views(self):
+        data = memoryview(bytes(range(256)))
+        pages = list(iter_pages([(0, data)], 128))
+        assert [address for address, _ in pages] == [0, 128]
+        assert all(isinstance(page, memoryview) for _, page in pages)
+
+    def test_partial_pages_are_padded_and_merged(self):
+        pages = dict(iter_pages([(0x7E, b"\x01\x02\x03\x04"), (0x90, b"\x05")], 128))
+        assert sorted(pages) == [0, 128]
+        assert pages[0][-2:] == b"\x01\x02"
+        assert pages[128][:2] == b"\x03\x04"
+        assert pages[128][0x10] == 0x05
+        assert pages[128][0x11:] == b"\xff" * 111
+
+    def test_chunks(self):
+        image = FirmwareImage([(0x100, b"\x00" * 300)])
+        assert [address for address, _ in image.chunks(256)] == [0x100, 0x200]
+        assert [len(page) for _, page in image.chunks(256)] == [256, 256]
+
+
+class TestWritePlan:
+    """Test blank-page elision."""
+
+    def test_blank_pages_skipped(self):
+        data = b"\x01" * 256 + b"\xff" * 512 + b"\x02" * 100
+        plan = plan_writes([(0x1000, data)], 256)
+        assert [address for address, _ in plan.pages] == [0x1000, 0x1300]
+        assert plan.skipped == [0x1100, 0x1200]
+        assert bytes(plan.pages[1][1]) == b"\x02" * 100 + b"\xff" * 156
+
+    def test_runs_coalesce_adjacent_pages(self):
+        data = b"\x01" * 512 + b"\xff" * 256 + b"\x02" * 256
+        plan = plan_writes([(0, data)], 256)
+        assert [(address, len(run)) for address, run in plan.runs()] == [(0, 512), (768, 256)]
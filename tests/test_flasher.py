@@ -1,6 +1,8 @@
 """Tests for firmware flasher module."""
 
 import pytest
+from tron_shell import bootloader, session
+from tron_shell.bootloader import BootloaderManager, EntryLatencies
 from tron_shell.flasher import (
     ArduinoFlasher,
     ESP32Flasher,
@@ -8,7 +10,40 @@ from tron_shell.flasher import (
     GenericFlasher,
     get_flasher,
     FlashError,
+    TopologyScheduler,
 )
+from tron_shell.session import SerialSessionPool
+
+from .test_stk500 import FakeOptiboot
+
+
+class OptibootPort(FakeOptiboot):
+    """Pooled serial handle with an Optiboot board behind it, counting resets."""
+
+    def __init__(self):
+        super().__init__()
+        self.port = None
+        self.baudrate = 9600
+        self.timeout = None
+        self.is_open = False
+        self.resets = 0
+        self._dtr = True
+
+    @property
+    def dtr(self):
+        return self._dtr
+
+    @dtr.setter
+    def dtr(self, value):
+        if self._dtr and not value:
+            self.resets += 1
+        self._dtr = value
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
 
 
 class TestFlashers:
@@ -83,3 +118,99 @@ class TestFlashers:
         """Test getting flasher for unknown platform."""
         flasher = get_flasher("Unknown", "COM5")
         assert isinstance(flasher, GenericFlasher)
+
+
+class TestArduinoSession:
+    """Test STK500 flashing on a pooled handle."""
+
+    @pytest.fixture
+    def pool(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(bootloader, "_latencies", EntryLatencies(tmp_path / "latency.json"))
+        monkeypatch.setattr(bootloader, "port_vid_pid", lambda port: "2341:0043")
+        pool = SerialSessionPool(factory=OptibootPort)
+        monkeypatch.setattr(session, "_pool", pool)
+        return pool
+
+    def test_reset_in_session_not_repeated(self, pool, tmp_path):
+        firmware = tmp_path / "firmware.bin"
+        firmware.write_bytes(bytes(range(256)) * 4)
+        flasher = ArduinoFlasher("/dev/ttyACM0")
+
+        with flasher.session(method="stk500"):
+            assert BootloaderManager.reset_device("/dev/ttyACM0", "dtr", probe="stk500")
+            with pool.lease("/dev/ttyACM0") as board:
+                pass
+            assert flasher.flash(str(firmware), method="stk500", resume=False)
+            assert flasher.verify(str(firmware), method="stk500")
+
+        assert board.flash[:1024] == firmware.read_bytes()
+        # The flash used the bootloader the reset found; only the reset pulsed DTR
+        assert board.resets == 1
+
+    def test_standalone_flash_resets(self, pool, tmp_path):
+        firmware = tmp_path / "firmware.bin"
+        firmware.write_bytes(b"\x42" * 256)
+        flasher = ArduinoFlasher("/dev/ttyACM0")
+
+        with flasher.session(method="stk500"):
+            with pool.lease("/dev/ttyACM0") as board:
+                pass
+            assert flasher.flash(str(firmware), method="stk500", resume=False)
+
+        assert board.resets == 1
+
+
+class TestTopologyScheduler:
+    """Test USB topology aware scheduling."""
+
+    def test_topology(self):
+        """Test splitting USB locations into root port and hub."""
+        assert TopologyScheduler.topology("1-1.2.3:1.0") == ("1-1", "1-1.2")
+        assert TopologyScheduler.topology("1-1.4") == ("1-1", "1-1")
+        assert TopologyScheduler.topology("2-3") == ("2-3", "usb2")
+        assert TopologyScheduler.topology(None) == (None, None)
+        assert TopologyScheduler.topology("n/a") == (None, None)
+
+    def test_per_hub_limit(self):
+        """Test that a full hub refuses further slots."""
+        scheduler = TopologyScheduler(per_hub=2, per_root_port=None)
+
+        assert scheduler.try_acquire("1-1.1")
+        assert scheduler.try_acquire("1-1.2")
+        assert not scheduler.try_acquire("1-1.3")
+        assert scheduler.try_acquire("1-2.1")
+
+        scheduler.release("1-1.1")
+        assert scheduler.try_acquire("1-1.3")
+
+    def test_per_root_port_limit(self):
+        """Test that hubs behind the same root port share its limit."""
+        scheduler = TopologyScheduler(per_hub=None, per_root_port=2)
+
+        assert scheduler.try_acquire("1-1.1.1")
+        assert scheduler.try_acquire("1-1.2.1")
+        assert not scheduler.try_acquire("1-1.3.1")
+        assert scheduler.try_acquire("1-2.1")
+
+    def test_unknown_location_unlimited(self):
+        """Test that ports without a location are never limited."""
+        scheduler = TopologyScheduler(per_hub=1, per_root_port=1)
+
+        for _ in range(5):
+            assert scheduler.try_acquire(None)
+
+    def test_take_skips_busy_hub(self):
+        """Test that take() picks work from an idle hub."""
+        scheduler = TopologyScheduler(per_hub=1, per_root_port=None)
+        pending = ["1-1.1", "1-1.2", "1-2.1"]
+
+        assert scheduler.take(pending, str) == "1-1.1"
+        assert scheduler.take(pending, str) == "1-2.1"
+        assert pending == ["1-1.2"]
+
+    def test_order_interleaves_hubs(self):
+        """Test round-robin ordering across root ports."""
+        scheduler = TopologyScheduler()
+        ordered = scheduler.order(["1-1.1", "1-1.2", "1-1.3", "1-2.1", "1-2.2"], str)
+
+        assert ordered == ["1-1.1", "1-2.1", "1-1.2", "1-2.2", "1-1.3"]
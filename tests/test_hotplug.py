@@ -0,0 +1,77 @@
+"""Tests for hotplug notification module."""
+
+import threading
+
+from tron_shell import hotplug
+from tron_shell.hotplug import HotplugWatcher, PortEvent
+
+
+class TestHotplugWatcher:
+    """Test hotplug watcher functionality."""
+
+    def test_add_and_remove_events(self, tmp_path):
+        """Test that creating and deleting a node produces events."""
+        watcher = HotplugWatcher(watch_dirs=[str(tmp_path)]).start()
+        events = []
+        received = threading.Event()
+
+        def on_event(event):
+            events.append(event)
+            if event.action == hotplug.PORT_REMOVED:
+                received.set()
+
+        watcher.subscribe(on_event)
+        try:
+            node = tmp_path / "ttyACM0"
+            node.write_text("")
+            node.unlink()
+            assert received.wait(2.0)
+        finally:
+            watcher.stop()
+
+        port = str(tmp_path / "ttyACM0")
+        assert PortEvent(hotplug.PORT_ADDED, port) in events
+        assert events[-1] == PortEvent(hotplug.PORT_REMOVED, port)
+
+    def test_wait_for(self, tmp_path):
+        """Test waiting for a specific event."""
+        watcher = HotplugWatcher(watch_dirs=[str(tmp_path)]).start()
+        port = str(tmp_path / "ttyUSB3")
+        try:
+            timer = threading.Timer(0.05, (tmp_path / "ttyUSB3").write_text, args=("",))
+            timer.start()
+            assert watcher.wait_for(lambda e: e.port == port, timeout=2.0)
+            timer.join()
+        finally:
+            watcher.stop()
+
+    def test_unsubscribe(self, tmp_path):
+        """Test that unsubscribed callbacks receive no events."""
+        watcher = HotplugWatcher(watch_dirs=[str(tmp_path)]).start()
+        events = []
+        try:
+            watcher.subscribe(events.append)
+            watcher.unsubscribe(events.append)
+            (tmp_path / "ttyUSB0").write_text("")
+            assert not watcher.wait_for(lambda e: False, timeout=0.1)
+        finally:
+            watcher.stop()
+
+        assert events == []
+
+    def test_wait_for_event_present(self):
+        """Test that an already present port returns immediately."""
+        assert hotplug.wait_for_event("/dev/ttyX", hotplug.PORT_ADDED, 0.0, lambda: True)
+
+    def test_wait_for_event_wakes_on_event(self, tmp_path, monkeypatch):
+        """Test that a port event wakes the waiter before the fallback check."""
+        watcher = HotplugWatcher(watch_dirs=[str(tmp_path)]).start()
+        monkeypatch.setattr(hotplug, "get_watcher", lambda: watcher)
+        node = tmp_path / "ttyACM1"
+        try:
+            timer = threading.Timer(0.05, node.write_text, args=("",))
+            timer.start()
+            assert hotplug.wait_for_event(str(node), hotplug.PORT_ADDED, 0.5, lambda: node.exists())
+            timer.join()
+        finally:
+            watcher.stop()
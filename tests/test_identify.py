@@ -0,0 +1,87 @@
+"""Tests for board identification module."""
+
+from tron_shell.identify import BoardIdentifier, BoardInfo, UNKNOWN
+from tron_shell.usb_detector import USBDevice
+
+RULES = [
+    {
+        "vendor_id": "2341",
+        "product_id": "0043",
+        "platform": "atmega328p",
+        "description": "Arduino Uno",
+        "description_keywords": ["arduino", "uno"],
+    },
+    {
+        "vendor_id": "16c0",
+        "product_id": "0483",
+        "platform": "tron200",
+        "description": "Tron TR-200 Controller",
+    },
+]
+
+
+def make_device(port, vid, pid, description, serial_number=None):
+    """Create a USBDevice for testing."""
+    return USBDevice(
+        port=port,
+        vid=vid,
+        pid=pid,
+        serial_number=serial_number,
+        manufacturer=None,
+        product=None,
+        description=description,
+    )
+
+
+class TestBoardIdentifier:
+    """Test board identification."""
+
+    def test_known_device_and_rule(self):
+        """Test combining the VID:PID table with a matching rule."""
+        identifier = BoardIdentifier(RULES, os_type="linux")
+        info = identifier.identify(make_device("/dev/ttyACM0", 0x2341, 0x0043, "Arduino Uno"))
+
+        assert info == BoardInfo("Arduino", "atmega328p", "Arduino Uno")
+        assert info.known
+
+    def test_rule_only_device(self):
+        """Test a device only recognized by a detection rule."""
+        identifier = BoardIdentifier(RULES, os_type="linux")
+        info = identifier.identify(make_device("/dev/ttyACM1", 0x16C0, 0x0483, "Teensy"))
+
+        assert info.name == "Tron TR-200 Controller"
+        assert info.platform == "tron200"
+
+    def test_table_only_device(self):
+        """Test a device only recognized by the VID:PID table."""
+        identifier = BoardIdentifier(RULES, os_type="linux")
+        info = identifier.identify(make_device("/dev/ttyUSB0", 0x10C4, 0xEA60, "CP2102"))
+
+        assert info == BoardInfo("CP210x UART Bridge")
+
+    def test_description_heuristics(self):
+        """Test identification from the description alone."""
+        identifier = BoardIdentifier([], os_type="linux")
+
+        assert identifier.identify(make_device("COM3", None, None, "ESP32 board")).name == (
+            "Espressif"
+        )
+        assert identifier.identify(make_device("COM4", None, None, "Mystery")) is UNKNOWN
+
+    def test_memoized(self, monkeypatch):
+        """Test that each distinct device is identified once."""
+        identifier = BoardIdentifier(RULES, os_type="linux")
+        calls = []
+        original = identifier._identify
+        monkeypatch.setattr(identifier, "_identify", lambda d: calls.append(d) or original(d))
+
+        devices = [make_device("/dev/ttyACM0", 0x2341, 0x0043, "Arduino Uno")] * 3
+        devices.append(make_device("/dev/ttyACM0", 0x2341, 0x0043, "Arduino Uno", "S1"))
+        infos = identifier.identify_many(devices)
+
+        assert len(infos) == 4
+        assert len(calls) == 2
+
+        identifier.clear()
+        identifier.identify(devices[0])
+        assert len(calls) == 3
@@ -0,0 +1,99 @@
+"""Tests for resumable flash checkpoints."""
+
+import pytest
+from tron_shell import journal
+from tron_shell.journal import FlashCheckpoint, image_digest, split_at
+from tron_shell.protocols.stk500 import STK500Programmer
+
+from .test_stk500 import FakeOptiboot
+
+
+@pytest.fixture(autouse=True)
+def save_every_step(monkeypatch):
+    monkeypatch.setattr(journal, "CHECKPOINT_INTERVAL", 0.0)
+
+
+class TestHelpers:
+    """Test image hashing and splitting."""
+
+    def test_split_at(self):
+        segments = [(0x100, b"\x01" * 0x100), (0x0, b"\x02" * 0x10)]
+        below, above = split_at(segments, 0x180)
+        assert [(address, bytes(data)) for address, data in below] == [
+            (0x0, b"\x02" * 0x10),
+            (0x100, b"\x01" * 0x80),
+        ]
+        assert [(address, bytes(data)) for address, data in above] == [(0x180, b"\x01" * 0x80)]
+
+    def test_digest_depends_on_addresses(self):
+        assert image_digest([(0, b"\x00")]) != image_digest([(1, b"\x00")])
+        assert image_digest([(0, b"\x00")]) == image_digest([(0, memoryview(b"\x00"))])
+
+
+class TestFlashCheckpoint:
+    """Test recording and resuming."""
+
+    def test_resume_after_matching_check(self, tmp_path):
+        segments = [(0, b"\x01" * 1024)]
+        FlashCheckpoint("A1B2", segments, tmp_path).advance(512)
+
+        checkpoint = FlashCheckpoint("A1B2", segments, tmp_path)
+        checked = []
+        remaining = checkpoint.remaining(lambda done: checked.append(done) or True)
+
+        assert [(address, len(data)) for address, data in checked[0]] == [(0, 512)]
+        assert [(address, len(data)) for address, data in remaining] == [(512, 512)]
+
+    def test_restart_when_written_region_differs(self, tmp_path):
+        segments = [(0, b"\x01" * 1024)]
+        FlashCheckpoint("A1B2", segments, tmp_path).advance(512)
+        checkpoint = FlashCheckpoint("A1B2", segments, tmp_path)
+        assert checkpoint.remaining(lambda done: False) == segments
+
+    def test_keyed_by_board_and_image(self, tmp_path):
+        segments = [(0, b"\x01" * 1024)]
+        FlashCheckpoint("A1B2", segments, tmp_path).advance(512)
+        assert FlashCheckpoint("OTHER", segments, tmp_path).boundary is None
+        assert FlashCheckpoint("A1B2", [(0, b"\x02" * 1024)], tmp_path).boundary is None
+
+    def test_finish_forgets_checkpoint(self, tmp_path):
+        segments = [(0, b"\x01" * 1024)]
+        checkpoint = FlashCheckpoint("A1B2", segments, tmp_path)
+        checkpoint.advance(512)
+        checkpoint.finish()
+        assert FlashCheckpoint("A1B2", segments, tmp_path).boundary is None
+        assert list(tmp_path.iterdir()) == []
+
+    def test_interrupted_stk500_flash_resumes(self, tmp_path):
+        image = bytes(range(256)) * 8
+        device = FakeOptiboot()
+        checkpoint = FlashCheckpoint("A1B2", [(0, image)], tmp_path)
+
+        def unplug(address):
+            checkpoint.advance(address)
+            if address == 1024:
+                raise OSError("device disconnected")
+
+        programmer = STK500Programmer(device)
+        programmer.sync()
+        with pytest.raises(OSError):
+            programmer.program(checkpoint.segments, progress=unplug)
+
+        checkpoint = FlashCheckpoint("A1B2", [(0, image)], tmp_path)
+        programmer = STK500Programmer(FakeOptibootResume(device))
+        programmer.sync()
+        remaining = checkpoint.remaining(lambda done: programmer.verify(done).verified)
+        result = programmer.program(remaining, progress=checkpoint.advance)
+        checkpoint.finish()
+
+        assert device.flash[: len(image)] == image
+        assert result.pages_written == 8
+        assert result.verified is True
+
+
+class FakeOptibootResume(FakeOptiboot):
+    """The same board after re-enumeration: fresh link, same flash."""
+
+    def __init__(self, previous):
+        super().__init__()
+        self.flash = previous.flash
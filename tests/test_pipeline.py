@@ -0,0 +1,47 @@
+"""Tests for the background block pipeline."""
+
+import threading
+
+import pytest
+from tron_shell.pipeline import Pipeline
+
+
+class TestPipeline:
+    """Test ordering, overlap and shutdown."""
+
+    def test_blocks_prepared_in_order(self):
+        with Pipeline(range(10), lambda block: block * 2) as pipeline:
+            assert list(pipeline) == [block * 2 for block in range(10)]
+
+    def test_next_block_prepared_while_current_is_used(self):
+        prepared = []
+        second_ready = threading.Event()
+
+        def prepare(block):
+            prepared.append(block)
+            if block == 1:
+                second_ready.set()
+            return block
+
+        with Pipeline(range(3), prepare) as pipeline:
+            blocks = iter(pipeline)
+            assert next(blocks) == 0
+            # Block 1 is prepared without the consumer asking for it
+            assert second_ready.wait(timeout=5)
+            assert list(blocks) == [1, 2]
+
+    def test_prepare_error_is_raised_to_consumer(self):
+        def prepare(block):
+            if block == 2:
+                raise ValueError("bad block")
+            return block
+
+        with Pipeline(range(5), prepare) as pipeline:
+            with pytest.raises(ValueError):
+                list(pipeline)
+
+    def test_close_stops_producer(self):
+        pipeline = Pipeline(iter(range(1000000)), lambda block: block, depth=1)
+        assert next(iter(pipeline)) == 0
+        pipeline.close()
+        assert not pipeline._thread.is_alive()
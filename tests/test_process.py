@@ -0,0 +1,137 @@
+"""Tests for the streaming subprocess runner."""
+
+import sys
+
+import pytest
+from tron_shell import process
+from tron_shell.flasher import GenericFlasher
+from tron_shell.process import (
+    parse_avrdude,
+    parse_dfu_util,
+    parse_esptool,
+    parser_for,
+    progress_logger,
+    run_streaming,
+)
+
+
+def python(script):
+    return [sys.executable, "-c", script]
+
+
+class TestParsers:
+    """Test progress parsing for each tool."""
+
+    def test_avrdude(self):
+        assert parse_avrdude("Writing | ################                  | 32% 0.52s") == (
+            "Writing",
+            32.0,
+        )
+        assert parse_avrdude("avrdude: 1024 bytes of flash written") is None
+
+    def test_esptool(self):
+        assert parse_esptool("Writing at 0x00010000... (25 %)") == ("Writing", 25.0)
+        assert parse_esptool("Writing at 0x0001a000 [===>     ]  37.5% 16384/65536 bytes...") == (
+            "Writing",
+            37.5,
+        )
+        assert parse_esptool("Hash of data verified.") is None
+
+    def test_dfu_util(self):
+        assert parse_dfu_util("Download\t[=========                ]  38%        24576 bytes") == (
+            "Download",
+            38.0,
+        )
+
+    def test_parser_for(self):
+        assert parser_for(["/usr/bin/avrdude", "-v"]) is parse_avrdude
+        assert parser_for(["python3", "-m", "esptool", "write_flash"]) is parse_esptool
+        assert parser_for(["dfu-util", "-D", "fw.bin"]) is parse_dfu_util
+        assert parser_for(["st-flash"]) is None
+
+    def test_progress_logger(self):
+        logged = []
+        on_progress = progress_logger(logged.append, step=50)
+        for percent in (0, 10, 48, 52, 100):
+            on_progress("Writing", percent)
+        on_progress("Reading", 4)
+        assert logged == ["Writing: 0%", "Writing: 52%", "Writing: 100%", "Reading: 4%"]
+
+
+class TestRunStreaming:
+    """Test running real child processes."""
+
+    @pytest.fixture(autouse=True, params=[True, False], ids=["selector", "threads"])
+    def reader(self, request, monkeypatch):
+        # The thread reader is what Windows uses; it runs anywhere
+        monkeypatch.setattr(process, "SELECT_PIPES", request.param)
+
+    def test_lines_and_progress_stream(self):
+        script = (
+            "import sys\n"
+            "print('starting', flush=True)\n"
+            "for p in (0, 50, 100):\n"
+            "    sys.stderr.write(f'\\rWriting | {\"#\" * (p // 10):10} | {p}% 0.01s')\n"
+            "    sys.stderr.flush()\n"
+            "sys.stderr.write('\\n')\n"
+        )
+        lines = []
+        progress = []
+
+        result = run_streaming(
+            python(script),
+            on_line=lines.append,
+            on_progress=lambda *p: progress.append(p),
+            parser=parse_avrdude,
+        )
+
+        assert result.ok
+        assert lines[0] == "starting"
+        assert progress == [("Writing", 0.0), ("Writing", 50.0), ("Writing", 100.0)]
+
+    def test_exit_code(self):
+        result = run_streaming(python("import sys; print('bad'); sys.exit(3)"))
+        assert result.returncode == 3
+        assert not result.ok
+        assert result.output == "bad"
+
+    def test_tail_is_bounded(self):
+        result = run_streaming(python("for i in range(1000): print(i)"), tail=5)
+        assert result.tail == ["995", "996", "997", "998", "999"]
+
+    def test_stall_is_killed(self):
+        script = "import time; print('erasing', flush=True); time.sleep(30)"
+        result = run_streaming(python(script), inactivity_timeout=0.3)
+        assert result.stalled
+        assert not result.ok
+        assert result.elapsed < 10
+        assert result.tail == ["erasing"]
+
+    def test_output_keeps_child_alive(self):
+        script = "import time\nfor i in range(5):\n    print(i, flush=True)\n    time.sleep(0.1)\n"
+        result = run_streaming(python(script), inactivity_timeout=0.5)
+        assert result.ok
+
+    def test_overall_timeout(self):
+        script = "import time\nwhile True:\n    print('.', flush=True)\n    time.sleep(0.05)\n"
+        result = run_streaming(python(script), inactivity_timeout=5, timeout=0.3)
+        assert result.timed_out
+        assert not result.stalled
+
+    def test_missing_command(self):
+        with pytest.raises(OSError):
+            run_streaming(["/nonexistent/avrdude"])
+
+
+class TestRunCommand:
+    """Test PlatformFlasher._run_command on top of the runner."""
+
+    def test_success(self):
+        ok, output = GenericFlasher("/dev/null")._run_command(python("print('done')"))
+        assert ok
+        assert output == "done"
+
+    def test_missing_command(self):
+        ok, output = GenericFlasher("/dev/null")._run_command(["/nonexistent/avrdude"])
+        assert not ok
+        assert "nonexistent" in output
@@ -0,0 +1,181 @@
+"""Tests for device registry module."""
+
+import sys
+
+import pytest
+
+from tron_shell import hotplug
+from tron_shell import registry as registry_module
+from tron_shell.registry import DeviceRegistry
+from tron_shell.usb_detector import USBDevice
+
+
+def make_device(port, vid=None, pid=None, serial_number=None, description="Test Device"):
+    """Create a USBDevice for testing."""
+    return USBDevice(
+        port=port,
+        vid=vid,
+        pid=pid,
+        serial_number=serial_number,
+        manufacturer=None,
+        product=None,
+        description=description,
+    )
+
+
+class FakeScan:
+    """Scan function returning a configurable device list."""
+
+    def __init__(self, devices):
+        self.devices = devices
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return list(self.devices)
+
+
+class FakeWatcher:
+    """Watcher stand-in recording subscriptions."""
+
+    def __init__(self):
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def emit(self, action, port):
+        for callback in self.subscribers:
+            callback(hotplug.PortEvent(action, port))
+
+
+class TestDeviceRegistry:
+    """Test device registry functionality."""
+
+    def test_lookups(self):
+        """Test lookups by port, serial, identity and platform."""
+        uno = make_device("/dev/ttyACM0", 0x2341, 0x0043, "A1", "Arduino Uno")
+        esp = make_device("/dev/ttyUSB0", 0x303A, 0x1001, "E1", "ESP32-S3")
+        registry = DeviceRegistry(scan=FakeScan([esp, uno]))
+
+        assert registry.devices() == [uno, esp]
+        assert registry.by_port("/dev/ttyUSB0") is esp
+        assert registry.by_port("/dev/ttyNONEXISTENT") is None
+        assert registry.by_serial("A1") is uno
+        assert registry.by_identity(0x303A, 0x1001, "E1") is esp
+        assert registry.by_platform("Arduino") == [uno]
+        assert registry.platform_of("/dev/ttyUSB0") == "ESP32-S2/S3"
+
+    def test_scans_once(self):
+        """Test that lookups do not rescan without changes."""
+        scan = FakeScan([make_device("/dev/ttyUSB0")])
+        registry = DeviceRegistry(scan=scan, watcher=FakeWatcher())
+
+        for _ in range(5):
+            registry.by_port("/dev/ttyUSB0")
+            registry.devices()
+
+        assert scan.calls == 1
+
+    def test_full_refresh_delta(self):
+        """Test that a full refresh applies only the differences."""
+        first = make_device("/dev/ttyUSB0", 0x10C4, 0xEA60, "S1")
+        second = make_device("/dev/ttyUSB1", 0x10C4, 0xEA60, "S2")
+        scan = FakeScan([first, second])
+        registry = DeviceRegistry(scan=scan)
+        registry.devices()
+        generation = registry.generation
+
+        third = make_device("/dev/ttyUSB2", 0x1A86, 0x7523, "S3")
+        scan.devices = [make_device("/dev/ttyUSB0", 0x10C4, 0xEA60, "S1"), third]
+        added, removed = registry.refresh(full=True)
+
+        assert added == [third]
+        assert removed == ["/dev/ttyUSB1"]
+        assert registry.generation == generation + 1
+        # Unchanged devices keep their existing record
+        assert registry.by_port("/dev/ttyUSB0") is first
+        assert registry.by_serial("S2") is None
+        assert registry.by_platform("CP210x UART Bridge") == [first]
+
+    def test_replaced_device(self):
+        """Test a different board showing up on the same port."""
+        scan = FakeScan([make_device("/dev/ttyUSB0", 0x10C4, 0xEA60, "S1")])
+        registry = DeviceRegistry(scan=scan)
+        registry.devices()
+
+        replacement = make_device("/dev/ttyUSB0", 0x1A86, 0x7523, "S9")
+        scan.devices = [replacement]
+        added, removed = registry.refresh(full=True)
+
+        assert added == [replacement]
+        assert removed == ["/dev/ttyUSB0"]
+        assert registry.by_serial("S1") is None
+        assert registry.by_serial("S9") is replacement
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux hotplug path")
+    def test_hotplug_delta(self, monkeypatch):
+        """Test that hotplug events update only the affected port."""
+        scan = FakeScan([make_device("/dev/ttyUSB0", serial_number="S1")])
+        watcher = FakeWatcher()
+        registry = DeviceRegistry(scan=scan, watcher=watcher)
+        registry.devices()
+
+        new = make_device("/dev/ttyACM0", 0x2341, 0x0043, "A1")
+        monkeypatch.setattr(
+            registry, "_probe", lambda port: new if port == "/dev/ttyACM0" else None
+        )
+
+        watcher.emit(hotplug.PORT_ADDED, "/dev/ttyACM0")
+        assert registry.by_serial("A1") is new
+        assert registry.by_platform("Arduino") == [new]
+
+        watcher.emit(hotplug.PORT_REMOVED, "/dev/ttyUSB0")
+        assert registry.by_port("/dev/ttyUSB0") is None
+        assert [d.port for d in registry.devices()] == ["/dev/ttyACM0"]
+        assert scan.calls == 1
+
+    def test_close_unsubscribes(self):
+        """Test that closing the registry stops hotplug updates."""
+        watcher = FakeWatcher()
+        registry = DeviceRegistry(scan=FakeScan([]), watcher=watcher)
+        registry.devices()
+        assert watcher.subscribers
+
+        registry.close()
+        assert not watcher.subscribers
+
+    def test_watch_after_load(self):
+        """Test that attaching a watcher later rescans once, then applies deltas."""
+        scan = FakeScan([make_device("/dev/ttyUSB0")])
+        registry = DeviceRegistry(scan=scan)
+        registry.devices()
+
+        # A plugged board is missed by an unwatched snapshot
+        scan.devices.append(make_device("/dev/ttyUSB1"))
+        assert registry.by_port("/dev/ttyUSB1") is None
+
+        watcher = FakeWatcher()
+        registry.watch(watcher)
+        registry.watch(FakeWatcher())
+        assert watcher.subscribers == [registry._on_event]
+        assert registry.by_port("/dev/ttyUSB1") is not None
+        registry.devices()
+        assert scan.calls == 2
+
+    def test_shared_registry_watches_on_request(self, monkeypatch):
+        """Test that one-shot use of the shared registry does not start the watcher."""
+        watcher = FakeWatcher()
+        started = []
+        monkeypatch.setattr(registry_module, "_registry", None)
+        monkeypatch.setattr(hotplug, "get_watcher", lambda: started.append(watcher) or watcher)
+
+        shared = registry_module.get_registry()
+        assert shared._watcher is None
+        assert not started
+
+        assert registry_module.get_registry(watch=True) is shared
+        assert shared._watcher is watcher
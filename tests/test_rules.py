@@ -0,0 +1,137 @@
+"""Tests for compiled USB detection rules."""
+
+import random
+
+from tron_shell.rules import CompiledRules, normalize_id
+
+RULES = [
+    {
+        "vendor_id": "2341",
+        "product_id": "0043",
+        "platform": "atmega328p",
+        "description_keywords": ["arduino", "uno", "2341:0043"],
+        "path_contains": {"linux": "ttyacm", "darwin": "cu.usbmodem"},
+    },
+    {
+        "vendor_id": "2341",
+        "product_id": "0010",
+        "platform": "atmega2560",
+        "description_keywords": ["arduino", "mega"],
+    },
+    {"vendor_id": "10C4", "platform": "esp32", "description_keywords": ["cp210", "esp32"]},
+    {"product_id": "7523", "platform": "esp8266"},
+    {
+        "platform": "tron100",
+        "description_keywords": ["tron", "rootcastle"],
+        "path_contains": {"linux": "ttyacm"},
+    },
+]
+
+
+def reference_match(rules, os_type, vid, pid, port_path, description):
+    """Match rules one by one, the way the detector did before compiling."""
+    for rule in rules:
+        if "vendor_id" in rule and normalize_id(rule["vendor_id"]) != vid:
+            continue
+        if "product_id" in rule and normalize_id(rule["product_id"]) != pid:
+            continue
+        path = rule.get("path_contains", {}).get(os_type)
+        if path is not None and path not in port_path.lower():
+            continue
+        if "description_keywords" in rule:
+            desc_lower = description.lower()
+            if not any(kw in desc_lower for kw in rule["description_keywords"]):
+                continue
+        return rule
+    return None
+
+
+class TestCompiledRules:
+    """Test compiled rule matching."""
+
+    def test_normalize_id(self):
+        """Test USB ID normalization."""
+        assert normalize_id("10C4") == "10c4"
+        assert normalize_id(483) == "0483"
+        assert normalize_id(None) is None
+
+    def test_exact_match(self):
+        """Test VID:PID, path and keyword matching."""
+        rules = CompiledRules(RULES, "linux")
+
+        rule = rules.match("2341", "0043", "/dev/ttyACM0", "Arduino Uno")
+        assert rule["platform"] == "atmega328p"
+
+        # Path rule for this OS fails
+        assert rules.match("2341", "0043", "/dev/ttyUSB0", "Arduino Uno") is None
+        # Path rule only exists for another OS
+        assert CompiledRules(RULES, "windows").match("2341", "0043", "COM3", "Arduino")
+
+    def test_vendor_and_product_fallbacks(self):
+        """Test VID-only, PID-only and wildcard rules."""
+        rules = CompiledRules(RULES, "linux")
+
+        assert rules.match("10c4", "ea60", "/dev/ttyUSB0", "CP2102 USB")["platform"] == "esp32"
+        assert rules.match("1a86", "7523", "/dev/ttyUSB1", "USB Serial")["platform"] == "esp8266"
+        assert rules.match(None, None, "/dev/ttyACM3", "Rootcastle Tron")["platform"] == "tron100"
+        assert rules.match(None, None, "/dev/ttyUSB3", "Rootcastle Tron") is None
+
+    def test_rule_order(self):
+        """Test that the earliest matching rule wins across index buckets."""
+        rules = CompiledRules(
+            [
+                {"platform": "first", "description_keywords": ["board"]},
+                {"vendor_id": "1234", "product_id": "5678", "platform": "second"},
+            ],
+            "linux",
+        )
+
+        assert rules.match("1234", "5678", "/dev/ttyUSB0", "My Board")["platform"] == "first"
+        assert rules.match("1234", "5678", "/dev/ttyUSB0", "Other")["platform"] == "second"
+
+    def test_overlapping_keywords(self):
+        """Test keywords that share a start or overlap each other."""
+        rules = CompiledRules(
+            [
+                {"platform": "a", "description_keywords": ["esp"]},
+                {"platform": "b", "description_keywords": ["usb serial"]},
+            ],
+            "linux",
+        )
+        compiled = CompiledRules(
+            [
+                {"platform": "long", "description_keywords": ["esp32-s3"]},
+                {"platform": "short", "description_keywords": ["esp", "serial"]},
+            ],
+            "linux",
+        )
+
+        assert rules.match(None, None, "x", "ESP32 USB Serial")["platform"] == "a"
+        assert compiled.match(None, None, "x", "ESP32-S2")["platform"] == "short"
+        assert compiled.match(None, None, "x", "usb serial")["platform"] == "short"
+
+    def test_matches_reference(self):
+        """Test compiled matching against rule-by-rule matching on random inputs."""
+        rng = random.Random(1234)
+        ids = ["2341", "0043", "0010", "10c4", "ea60", "7523", "1a86", None]
+        words = ["arduino", "uno", "mega", "cp210", "esp32", "tron", "rootcastle", "usb"]
+        paths = ["/dev/ttyACM0", "/dev/ttyUSB0", "COM4"]
+
+        rules = RULES + [
+            {
+                "vendor_id": rng.choice(ids[:-1]),
+                "product_id": rng.choice(ids),
+                "platform": f"sku{i}",
+                "description_keywords": rng.sample(words, 2),
+            }
+            for i in range(200)
+        ]
+        rules = [{k: v for k, v in rule.items() if v is not None} for rule in rules]
+        compiled = CompiledRules(rules, "linux")
+
+        for _ in range(500):
+            vid, pid = rng.choice(ids), rng.choice(ids)
+            path = rng.choice(paths)
+            description = " ".join(rng.sample(words, 3)).title()
+            expected = reference_match(rules, "linux", vid, pid, path, description)
+            assert compiled.match(vid, pid, path, description) is expected
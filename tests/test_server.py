@@ -0,0 +1,250 @@
+"""Tests for the tron serve job server."""
+
+import asyncio
+import json
+import stat
+import threading
+
+import pytest
+from tron_shell import server as server_module
+from tron_shell.flasher import FlashError, GenericFlasher
+from tron_shell.identify import BoardIdentifier
+from tron_shell.registry import DeviceRegistry
+from tron_shell.server import FlashServer, submit
+
+from .test_registry import FakeScan, make_device
+
+
+@pytest.fixture
+def firmware(tmp_path):
+    path = tmp_path / "firmware.bin"
+    path.write_text("fake firmware content")
+    return str(path)
+
+
+@pytest.fixture
+def scan():
+    return FakeScan(
+        [
+            make_device("/dev/ttyACM0", 0x2341, 0x0043, "A1", "Arduino Uno"),
+            make_device("/dev/ttyUSB0", None, None, None, "Test Device"),
+        ]
+    )
+
+
+@pytest.fixture
+def make_server(tmp_path, scan):
+    def make():
+        return FlashServer(
+            tmp_path / "tron.sock",
+            registry=DeviceRegistry(scan=scan),
+            identifier=BoardIdentifier(rules=[]),
+        )
+
+    return make
+
+
+async def exchange(server, requests, until_done=None):
+    """Send requests on one connection and collect events until each is done."""
+    reader, writer = await asyncio.open_unix_connection(str(server.path))
+    for request in requests:
+        writer.write(request if isinstance(request, bytes) else json.dumps(request).encode())
+        writer.write(b"\n")
+    await writer.drain()
+
+    events = []
+    remaining = until_done if until_done is not None else len(requests)
+    while remaining:
+        event = json.loads(await asyncio.wait_for(reader.readline(), 5))
+        events.append(event)
+        if event["event"] == "done":
+            remaining -= 1
+    writer.close()
+    return events
+
+
+def serve(make_server, session):
+    """Start a server, run a client session against it and shut it down."""
+
+    async def main():
+        server = make_server()
+        await server.start()
+        try:
+            return await session(server)
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+class TestFlashServer:
+    """Test the JSON-lines protocol."""
+
+    def test_ping_and_devices(self, make_server, scan):
+        events = serve(
+            make_server,
+            lambda server: exchange(server, [{"id": 1, "op": "ping"}, {"id": 2, "op": "devices"}]),
+        )
+
+        assert events[0] == {"id": 1, "event": "done", "ok": True}
+        devices = {d["port"]: d for d in events[1]["devices"]}
+        assert devices["/dev/ttyACM0"]["name"] == "Arduino"
+        assert devices["/dev/ttyACM0"]["vid_pid"] == "2341:0043"
+        assert devices["/dev/ttyUSB0"]["name"] == "Unknown"
+        # The inventory was scanned once, at startup
+        assert scan.calls == 1
+
+    def test_devices_off_loop(self, make_server, monkeypatch):
+        async def session(server):
+            release = threading.Event()
+            scan = server.registry.devices
+            monkeypatch.setattr(server.registry, "devices", lambda: release.wait(5) and scan())
+            listing = asyncio.ensure_future(exchange(server, [{"id": 1, "op": "devices"}]))
+            # Another client is served while the inventory refreshes
+            assert await exchange(server, [{"id": 2, "op": "ping"}]) == [
+                {"id": 2, "event": "done", "ok": True}
+            ]
+            release.set()
+            return await listing
+
+        events = serve(make_server, session)
+        assert len(events[0]["devices"]) == 2
+
+    def test_flash_job_events(self, make_server, firmware):
+        request = {
+            "id": "job-1",
+            "op": "flash",
+            "port": "/dev/ttyUSB0",
+            "firmware": firmware,
+            "platform": "generic",
+            "reset": False,
+        }
+        events = serve(make_server, lambda server: exchange(server, [request]))
+
+        assert [e["event"] for e in events] == ["queued", "progress", "progress", "done"]
+        assert all(e["id"] == "job-1" for e in events)
+        assert events[0]["position"] == 0
+        assert [e["status"] for e in events[1:3]] == ["flashing", "verifying"]
+        assert events[-1]["ok"] is True
+
+    def test_jobs_queue_per_port(self, make_server, firmware, monkeypatch):
+        lock = threading.Lock()
+        state = {"active": {}, "overlap": False, "ports": set()}
+
+        def slow_flash(self, firmware_path, **kwargs):
+            with lock:
+                if state["active"].get(self.port):
+                    state["overlap"] = True
+                state["active"][self.port] = True
+                state["ports"].add(frozenset(p for p, on in state["active"].items() if on))
+            threading.Event().wait(0.05)
+            with lock:
+                state["active"][self.port] = False
+            return True
+
+        monkeypatch.setattr(GenericFlasher, "flash", slow_flash)
+        requests = [
+            {
+                "id": i,
+                "op": "flash",
+                "port": f"/dev/ttyUSB{i % 2}",
+                "firmware": firmware,
+                "platform": "generic",
+                "reset": False,
+                "verify": False,
+            }
+            for i in range(6)
+        ]
+        events = serve(make_server, lambda server: exchange(server, requests))
+
+        done = [e for e in events if e["event"] == "done"]
+        assert len(done) == 6 and all(e["ok"] for e in done)
+        positions = [e["position"] for e in events if e["event"] == "queued"]
+        assert positions == [0, 0, 1, 1, 2, 2]
+        # One job at a time per port, both ports at once
+        assert not state["overlap"]
+        assert frozenset({"/dev/ttyUSB0", "/dev/ttyUSB1"}) in state["ports"]
+
+    def test_errors(self, make_server, tmp_path):
+        requests = [
+            b"not json",
+            {"id": 1, "op": "explode"},
+            {"id": 2, "op": "flash", "port": "/dev/ttyUSB0"},
+            {
+                "id": 3,
+                "op": "flash",
+                "port": "/dev/ttyUSB0",
+                "firmware": str(tmp_path / "missing.bin"),
+                "platform": "generic",
+                "reset": False,
+            },
+        ]
+        events = serve(make_server, lambda server: exchange(server, requests))
+        done = {e["id"]: e for e in events if e["event"] == "done"}
+
+        assert "Invalid request" in done[None]["error"]
+        assert done[1]["error"] == "Unknown op: explode"
+        assert done[2]["error"] == "Missing firmware"
+        assert done[3]["ok"] is False
+        assert "not found" in done[3]["error"]
+
+    def test_blocking_client(self, make_server, firmware):
+        async def session(server):
+            request = {
+                "id": 7,
+                "op": "verify",
+                "port": "/dev/ttyUSB0",
+                "firmware": firmware,
+                "platform": "generic",
+            }
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, lambda: list(submit(request, server.path, 5)))
+
+        events = serve(make_server, session)
+        assert events[-1] == {
+            "id": 7,
+            "event": "done",
+            "ok": True,
+            "elapsed": events[-1]["elapsed"],
+            "verify_method": None,
+        }
+
+    def test_socket_lifecycle(self, make_server):
+        async def main():
+            first = make_server()
+            await first.start()
+            try:
+                with pytest.raises(FlashError):
+                    await make_server().start()
+            finally:
+                await first.close()
+            assert not first.path.exists()
+
+            # A stale socket file is replaced
+            first.path.write_text("")
+            second = make_server()
+            await second.start()
+            await second.close()
+
+        asyncio.run(main())
+
+    def test_socket_permissions(self, tmp_path, scan):
+        async def main():
+            server = FlashServer(
+                tmp_path / "run" / "tron.sock",
+                registry=DeviceRegistry(scan=scan),
+                identifier=BoardIdentifier(rules=[]),
+            )
+            await server.start()
+            try:
+                return server.path.stat().st_mode, server.path.parent.stat().st_mode
+            finally:
+                await server.close()
+
+        socket_mode, directory_mode = asyncio.run(main())
+        assert stat.S_IMODE(socket_mode) == 0o600
+        assert stat.S_IMODE(directory_mode) == 0o700
+
+    def test_default_socket_path(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        assert server_module.default_socket_path() == tmp_path / "tron-shell.sock"
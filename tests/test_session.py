@@ -0,0 +1,151 @@
+"""Tests for pooled serial sessions."""
+
+import threading
+
+import pytest
+import serial
+from tron_shell.session import SerialSessionPool
+
+
+class FakeHandle:
+    """Unopened serial handle recording opens, closes and settings changes."""
+
+    instances = []
+
+    def __init__(self):
+        self.port = None
+        self.baudrate = 9600
+        self.timeout = None
+        self.parity = serial.PARITY_NONE
+        self.is_open = False
+        self.opens = 0
+        self.changes = []
+        FakeHandle.instances.append(self)
+
+    def __setattr__(self, name, value):
+        if getattr(self, "is_open", False):
+            self.changes.append((name, value))
+        object.__setattr__(self, name, value)
+
+    def open(self):
+        if self.port == "/dev/ttyMISSING":
+            raise serial.SerialException("could not open port")
+        self.opens += 1
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+
+@pytest.fixture
+def pool():
+    FakeHandle.instances = []
+    return SerialSessionPool(factory=FakeHandle)
+
+
+class TestSerialSessionPool:
+    """Test leasing pooled handles."""
+
+    def test_nested_leases_share_one_open(self, pool):
+        with pool.lease("/dev/ttyUSB0") as outer:
+            with pool.lease("/dev/ttyUSB0", baudrate=9600, timeout=1) as reset:
+                assert reset is outer
+            with pool.lease("/dev/ttyUSB0", baudrate=115200, parity=serial.PARITY_EVEN) as ser:
+                assert ser is outer
+            assert pool.held("/dev/ttyUSB0")
+
+        assert len(FakeHandle.instances) == 1
+        assert outer.opens == 1
+        assert outer.is_open is False
+        assert not pool.held("/dev/ttyUSB0")
+        # Only settings that differ are changed on the open handle, and
+        # nested leases put them back
+        assert outer.changes == [
+            ("baudrate", 9600),
+            ("baudrate", 115200),
+            ("parity", serial.PARITY_EVEN),
+            ("parity", serial.PARITY_NONE),
+            ("is_open", False),
+        ]
+
+    def test_nested_lease_restores_settings(self, pool):
+        with pool.lease("/dev/ttyUSB0", baudrate=115200, timeout=1) as outer:
+            with pool.lease("/dev/ttyUSB0", baudrate=1200, timeout=0):
+                assert (outer.baudrate, outer.timeout) == (1200, 0)
+            assert (outer.baudrate, outer.timeout) == (115200, 1)
+
+            # Nothing is restored onto a handle closed under the lease
+            with pool.lease("/dev/ttyUSB0", baudrate=1200):
+                pool.close("/dev/ttyUSB0")
+            assert outer.baudrate == 1200
+
+    def test_first_open_settings(self, pool):
+        with pool.lease("/dev/ttyUSB0", baudrate=1200) as ser:
+            assert ser.port == "/dev/ttyUSB0"
+            assert ser.baudrate == 1200
+            assert ser.timeout == 1
+            assert ser.changes == []
+
+    def test_separate_leases_reopen(self, pool):
+        with pool.lease("/dev/ttyUSB0"):
+            pass
+        with pool.lease("/dev/ttyUSB0"):
+            pass
+        assert len(FakeHandle.instances) == 2
+
+    def test_released_on_error(self, pool):
+        with pytest.raises(RuntimeError):
+            with pool.lease("/dev/ttyUSB0") as ser:
+                raise RuntimeError("flash failed")
+        assert ser.is_open is False
+        assert not pool.held("/dev/ttyUSB0")
+
+    def test_open_failure(self, pool):
+        with pytest.raises(serial.SerialException):
+            with pool.lease("/dev/ttyMISSING"):
+                pass
+        with pool.lease("/dev/ttyUSB0"):
+            assert pool.held("/dev/ttyUSB0")
+
+    def test_close_reopens_on_next_lease(self, pool):
+        with pool.lease("/dev/ttyACM0", baudrate=1200):
+            pool.close("/dev/ttyACM0")
+            assert not pool.held("/dev/ttyACM0")
+            with pool.lease("/dev/ttyACM0", baudrate=57600) as ser:
+                assert ser.baudrate == 57600
+            assert pool.held("/dev/ttyACM0")
+        assert len(FakeHandle.instances) == 2
+        assert not pool.held("/dev/ttyACM0")
+
+    def test_lease_is_exclusive_across_threads(self, pool):
+        entered = threading.Event()
+        order = []
+
+        def other():
+            entered.wait()
+            with pool.lease("/dev/ttyUSB0"):
+                order.append("other")
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        with pool.lease("/dev/ttyUSB0"):
+            entered.set()
+            thread.join(0.1)
+            order.append("owner")
+        thread.join()
+
+        assert order == ["owner", "other"]
+
+    def test_bootloader_claimed_once_per_open(self, pool):
+        with pool.lease("/dev/ttyUSB0"):
+            pool.note_bootloader("/dev/ttyUSB0", "stk500")
+            assert not pool.claim_bootloader("/dev/ttyUSB0", "stm32")
+            pool.note_bootloader("/dev/ttyUSB0", "stk500")
+            assert pool.claim_bootloader("/dev/ttyUSB0", "stk500")
+            assert not pool.claim_bootloader("/dev/ttyUSB0", "stk500")
+
+            # A reopened handle starts afresh
+            pool.note_bootloader("/dev/ttyUSB0", "stk500")
+            pool.close("/dev/ttyUSB0")
+            with pool.lease("/dev/ttyUSB0"):
+                assert not pool.claim_bootloader("/dev/ttyUSB0", "stk500")
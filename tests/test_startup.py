@@ -0,0 +1,77 @@
+"""Startup time budget for the tron CLI."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time allowed for tron_shell.cli, in microseconds. Most of
+# it is click; the budget leaves headroom for slow CI machines.
+IMPORT_BUDGET_US = 150_000
+
+# Modules that must not be loaded just to parse arguments
+HEAVY_MODULES = {
+    "rich",
+    "serial",
+    "usb",
+    "yaml",
+    "tron_shell.flasher",
+    "tron_shell.bootloader",
+    "tron_shell.batch",
+    "tron_shell.registry",
+}
+
+
+def importtime(*args):
+    """Run Python with -X importtime and return {module: cumulative_us}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        timeout=60,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = int(cumulative)
+    return result, modules
+
+
+class TestStartup:
+    """Test CLI startup cost."""
+
+    def test_cli_import_is_light(self):
+        """Test that importing the CLI does not pull in heavy modules."""
+        _, modules = importtime("-c", "import tron_shell.cli")
+
+        assert "tron_shell.cli" in modules
+        assert not HEAVY_MODULES & set(modules)
+
+    def test_cli_import_budget(self):
+        """Test that importing the CLI stays within its time budget."""
+        # Best of three runs to smooth out noise from a busy machine
+        best = min(importtime("-c", "import tron_shell.cli")[1]["tron_shell.cli"] for _ in range(3))
+
+        assert best < IMPORT_BUDGET_US, f"tron_shell.cli took {best / 1000:.1f} ms to import"
+
+    @pytest.mark.parametrize("argv", [["--version"], ["--help"], ["flash", "--help"]])
+    def test_fast_paths(self, argv):
+        """Test that version and help output never load the heavy modules."""
+        result, modules = importtime("-m", "tron_shell.cli", *argv)
+
+        assert result.returncode == 0
+        assert not HEAVY_MODULES & set(modules)
+
+    @pytest.mark.parametrize("argv", [["--version"], ["--help"], ["flash", "--help"]])
+    def test_script_fast_paths(self, argv):
+        """Test that bin/tron answers version and help without colorama or the config."""
+        result, modules = importtime(os.path.join("bin", "tron"), *argv)
+
+        assert result.returncode == 0
+        assert not (HEAVY_MODULES | {"colorama", "tron_core"}) & set(modules)
@@ -0,0 +1,239 @@
+"""Tests for hotplug-triggered station mode."""
+
+import asyncio
+import threading
+
+import pytest
+from tron_shell import hotplug
+from tron_shell import station as station_module
+from tron_shell.flasher import ArduinoFlasher, GenericFlasher
+from tron_shell.identify import BoardIdentifier
+from tron_shell.registry import DeviceRegistry
+from tron_shell.station import RateMeter, Station
+
+from .test_registry import FakeScan, FakeWatcher, make_device
+
+RULES = [
+    {
+        "vendor_id": "1a86",
+        "product_id": "7523",
+        "platform": "generic",
+        "description": "CH340 Board",
+    },
+    {"vendor_id": "2341", "product_id": "0043", "platform": "atmega328p", "description": "Uno"},
+]
+
+
+@pytest.fixture
+def firmware(tmp_path):
+    path = tmp_path / "firmware.bin"
+    path.write_text("fake firmware content")
+    return str(path)
+
+
+@pytest.fixture
+def scan():
+    return FakeScan([])
+
+
+@pytest.fixture
+def watcher():
+    return FakeWatcher()
+
+
+@pytest.fixture
+def make_station(firmware, scan, watcher, monkeypatch):
+    def make(**kwargs):
+        kwargs.setdefault("platform", "generic")
+        kwargs.setdefault("reset", False)
+        registry = DeviceRegistry(scan=scan, watcher=watcher)
+        # Hotplugged ports are read from the fake scan rather than sysfs
+        monkeypatch.setattr(
+            registry, "_probe", lambda port: next((d for d in scan.devices if d.port == port), None)
+        )
+        registry.devices()
+        return Station(
+            firmware,
+            registry=registry,
+            identifier=BoardIdentifier(rules=RULES, known_devices={}),
+            watcher=watcher,
+            **kwargs,
+        )
+
+    return make
+
+
+def plug(scan, watcher, device):
+    """Connect a device and announce it."""
+    scan.devices.append(device)
+    watcher.emit(hotplug.PORT_ADDED, device.port)
+
+
+async def until(condition, timeout=5):
+    """Wait for a condition to become true."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def run_station(station, session):
+    """Run a station alongside a session coroutine, then stop it."""
+
+    async def main():
+        task = asyncio.ensure_future(station.run())
+        # The registry subscribes when it is first loaded, the station when it starts
+        await until(lambda: len(station.watcher.subscribers) == 2)
+        try:
+            await session()
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+class TestRateMeter:
+    """Test the rolling boards-per-minute rate."""
+
+    def test_rate(self):
+        now = [0.0]
+        meter = RateMeter(window=60, clock=lambda: now[0])
+        assert meter.rate() == 0.0
+
+        now[0] = 30
+        meter.record()
+        meter.record()
+        # Two boards in the first half minute
+        assert meter.rate() == pytest.approx(4.0)
+
+        now[0] = 60
+        meter.record()
+        assert meter.rate() == pytest.approx(3.0)
+
+        # Boards older than the window drop out
+        now[0] = 100
+        assert meter.rate() == pytest.approx(1.0)
+
+
+class TestStation:
+    """Test flashing boards as they are plugged in."""
+
+    def test_matches(self, make_station):
+        station = make_station(vid_pids=["0483:5740"])
+        assert station.matches(make_device("/dev/ttyUSB0", 0x1A86, 0x7523))
+        assert station.matches(make_device("/dev/ttyACM0", 0x0483, 0x5740))
+        assert not station.matches(make_device("/dev/ttyUSB1", 0x10C4, 0xEA60))
+
+        # Matched on the identified name too
+        assert make_station(platform="arduino").matches(
+            make_device("/dev/ttyACM1", description="Arduino Uno")
+        )
+        assert not make_station(platform="esp32").matches(
+            make_device("/dev/ttyUSB0", 0x1A86, 0x7523)
+        )
+        # Without a platform, any recognized board
+        assert make_station(platform=None).matches(make_device("/dev/ttyUSB0", 0x1A86, 0x7523))
+        assert not make_station(platform=None).matches(make_device("/dev/ttyUSB2"))
+
+    def test_match_without_platform(self, make_station):
+        station = make_station(platform=None, vid_pids=["0483:5740", "0483:DF11"])
+        assert station.matches(make_device("/dev/ttyACM0", 0x0483, 0x5740))
+        assert station.matches(make_device("/dev/ttyACM1", 0x0483, 0xDF11))
+        # A recognized board of another kind is left alone
+        assert not station.matches(make_device("/dev/ttyUSB0", 0x1A86, 0x7523))
+        assert not station.matches(make_device("/dev/ttyACM2", description="Arduino Uno"))
+
+    def test_flashes_new_boards(self, make_station, scan, watcher):
+        station = make_station()
+        board = make_device("/dev/ttyUSB0", 0x1A86, 0x7523, "S1")
+
+        async def session():
+            plug(scan, watcher, make_device("/dev/ttyUSB9", 0x10C4, 0xEA60, "X"))
+            plug(scan, watcher, board)
+            await until(lambda: station.succeeded == 1)
+
+        run_station(station, session)
+
+        assert [result.port for result in station.results] == ["/dev/ttyUSB0"]
+        assert station.results[0].platform == "generic"
+        assert station.meter.rate() > 0
+        assert watcher.subscribers == [station.registry._on_event]
+
+    def test_reenumeration_not_reflashed(self, make_station, scan, watcher, monkeypatch):
+        monkeypatch.setattr(station_module, "ARRIVAL_SETTLE", 0.05)
+        station = make_station()
+        board = make_device("/dev/ttyUSB0", 0x1A86, 0x7523, "S1")
+
+        async def session():
+            plug(scan, watcher, board)
+            await until(lambda: station.succeeded == 1)
+            # The board reboots into its application and comes back
+            watcher.emit(hotplug.PORT_ADDED, board.port)
+            plug(scan, watcher, make_device("/dev/ttyUSB1", 0x1A86, 0x7523, "S2"))
+            await until(lambda: station.succeeded == 2)
+            await asyncio.sleep(0.1)
+
+        run_station(station, session)
+        assert [result.port for result in station.results] == ["/dev/ttyUSB0", "/dev/ttyUSB1"]
+
+    def test_flash_present(self, make_station, scan, watcher):
+        scan.devices.append(make_device("/dev/ttyUSB0", 0x1A86, 0x7523, "S1"))
+        station = make_station(flash_present=True)
+
+        async def session():
+            await until(lambda: station.succeeded == 1)
+
+        run_station(station, session)
+
+    def test_concurrency_limit(self, make_station, scan, watcher, monkeypatch):
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def slow_flash(self, firmware_path, **kwargs):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            threading.Event().wait(0.05)
+            with lock:
+                state["active"] -= 1
+            return True
+
+        monkeypatch.setattr(GenericFlasher, "flash", slow_flash)
+        station = make_station(concurrency=2, verify=False)
+
+        async def session():
+            for i in range(6):
+                plug(scan, watcher, make_device(f"/dev/ttyUSB{i}", 0x1A86, 0x7523, f"S{i}"))
+            await until(lambda: station.succeeded == 6)
+
+        run_station(station, session)
+        assert state["peak"] == 2
+
+    def test_failures_recorded(self, make_station, scan, watcher, monkeypatch):
+        monkeypatch.setattr(GenericFlasher, "flash", lambda self, firmware_path, **kwargs: False)
+        station = make_station()
+
+        async def session():
+            plug(scan, watcher, make_device("/dev/ttyUSB0", 0x1A86, 0x7523, "S1"))
+            await until(lambda: station.failed == 1)
+
+        run_station(station, session)
+        assert station.results[0].error == "Flash failed"
+        assert station.meter.rate() == 0.0
+
+    def test_identified_boards_use_their_family(self, make_station, scan, watcher, monkeypatch):
+        monkeypatch.setattr(ArduinoFlasher, "flash", lambda self, firmware_path, **kwargs: True)
+        monkeypatch.setattr(ArduinoFlasher, "verify", lambda self, firmware_path, **kwargs: True)
+        station = make_station(platform=None)
+
+        async def session():
+            plug(scan, watcher, make_device("/dev/ttyACM0", 0x2341, 0x0043, "U1"))
+            # Only the simulating generic flasher would take this one
+            plug(scan, watcher, make_device("/dev/ttyUSB0", 0x1A86, 0x7523, "S1"))
+            await until(lambda: station.succeeded == 1 and station.failed == 1)
+
+        run_station(station, session)
+        results = {result.port: result for result in station.results}
+        assert results["/dev/ttyACM0"].platform == "arduino"
+        assert results["/dev/ttyUSB0"].error == "No flasher for generic"
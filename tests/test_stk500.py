@@ -0,0 +1,169 @@
+"""Tests for the STK500v1 protocol engine."""
+
+import pytest
+from tron_shell.flasher import FlashError
+from tron_shell.protocols import stk500
+from tron_shell.protocols.stk500 import STK500Programmer, paginate
+
+
+class FakeOptiboot:
+    """Serial handle emulating an Optiboot bootloader on an ATmega328P."""
+
+    def __init__(self, signature=b"\x1e\x95\x0f", flash_size=32 * 1024, corrupt=None):
+        self.signature = signature
+        self.flash = bytearray(b"\xff" * flash_size)
+        self.corrupt = corrupt
+        self.address = 0
+        self.pending = bytearray()
+        self.output = bytearray()
+        self.writes = 0
+        self.programming = False
+
+    def reset_input_buffer(self):
+        self.output.clear()
+
+    def write(self, data):
+        self.writes += 1
+        self.pending += data
+        while self._step():
+            pass
+        return len(data)
+
+    def read(self, size=1):
+        data = bytes(self.output[:size])
+        del self.output[:size]
+        return data
+
+    def _length(self):
+        command = self.pending[0]
+        if command == stk500.STK_LOAD_ADDRESS:
+            return 4
+        if command == stk500.STK_PROG_PAGE:
+            if len(self.pending) < 3:
+                return None
+            return 5 + (self.pending[1] << 8 | self.pending[2])
+        if command == stk500.STK_READ_PAGE:
+            return 5
+        return 2
+
+    def _step(self):
+        if not self.pending:
+            return False
+        length = self._length()
+        if length is None or len(self.pending) < length:
+            return False
+        command = bytes(self.pending[:length])
+        del self.pending[:length]
+        assert command[-1] == stk500.CRC_EOP
+
+        payload = b""
+        kind = command[0]
+        if kind == stk500.STK_READ_SIGN:
+            payload = self.signature
+        elif kind == stk500.STK_ENTER_PROGMODE:
+            self.programming = True
+        elif kind == stk500.STK_LEAVE_PROGMODE:
+            self.programming = False
+        elif kind == stk500.STK_LOAD_ADDRESS:
+            self.address = (command[1] | command[2] << 8) * 2
+        elif kind == stk500.STK_PROG_PAGE:
+            data = command[4:-1]
+            self.flash[self.address : self.address + len(data)] = data
+            if self.corrupt is not None and self.address <= self.corrupt < self.address + len(data):
+                self.flash[self.corrupt] ^= 0xFF
+        elif kind == stk500.STK_READ_PAGE:
+            size = command[1] << 8 | command[2]
+            payload = bytes(self.flash[self.address : self.address + size])
+        self.output += bytes([stk500.STK_INSYNC]) + payload + bytes([stk500.STK_OK])
+        return True
+
+
+class SilentPort(FakeOptiboot):
+    """Serial handle that never answers."""
+
+    def write(self, data):
+        return len(data)
+
+
+class TestSTK500Programmer:
+    """Test the STK500v1 programmer against an emulated bootloader."""
+
+    def test_paginate_pads_pages(self):
+        pages = paginate([(0x7E, b"\x01\x02\x03\x04")], 128)
+        assert sorted(pages) == [0, 128]
+        assert pages[0][-2:] == b"\x01\x02"
+        assert pages[128][:2] == b"\x03\x04"
+        assert pages[128][2:] == b"\xff" * 126
+
+    def test_sync_and_identify(self):
+        device = FakeOptiboot()
+        programmer = STK500Programmer(device)
+        programmer.sync()
+        chip = programmer.identify()
+        assert chip.name == "atmega328p"
+        assert programmer.page_size == 128
+
+    def test_sync_timeout(self):
+        programmer = STK500Programmer(SilentPort())
+        with pytest.raises(FlashError):
+            programmer.sync(attempts=2)
+
+    def test_program_and_verify(self):
+        device = FakeOptiboot()
+        image = bytes(range(256)) * 4 + b"\xaa\x55"
+        programmer = STK500Programmer(device)
+        programmer.sync()
+
+        result = programmer.program([(0, image)])
+
+        assert device.flash[: len(image)] == image
+        assert result.pages_written == 9
+        assert result.verified is True
+        assert result.image_digest == result.device_digest
+        assert result.verify_method == "read-back"
+        assert not device.programming
+
+    def test_delta_writes_changed_pages_only(self):
+        device = FakeOptiboot()
+        image = bytearray(b"\x5a" * 512)
+        programmer = STK500Programmer(device)
+        programmer.sync()
+        programmer.program([(0, bytes(image))])
+
+        image[200] = 0
+        result = programmer.program([(0, bytes(image))], delta=True)
+
+        assert device.flash[:512] == image
+        assert result.pages_written == 1
+        assert result.sectors_unchanged == 3
+        assert result.verified is True
+
+    def test_pipelined_page_writes(self):
+        device = FakeOptiboot()
+        programmer = STK500Programmer(device, page_size=128)
+        programmer.enter_progmode()
+        writes = device.writes
+        programmer.write_pages(paginate([(0, b"\x00" * 1024)], 128))
+        # One write per page carries both the address and the page data
+        assert device.writes - writes == 8
+
+    def test_verify_detects_mismatch(self):
+        device = FakeOptiboot(corrupt=300)
+        programmer = STK500Programmer(device)
+        result = programmer.program([(0, b"\x12" * 512)])
+        assert result.verified is False
+        assert result.image_digest != result.device_digest
+
+    def test_image_too_large(self):
+        device = FakeOptiboot(signature=b"\x1e\x93\x07")
+        programmer = STK500Programmer(device)
+        with pytest.raises(FlashError):
+            programmer.program([(0, b"\x00" * (16 * 1024))])
+
+    def test_out_of_sync(self):
+        device = FakeOptiboot()
+        device.signature = b""
+        programmer = STK500Programmer(device)
+        device.output += b"\x00"
+        with pytest.raises(FlashError):
+            programmer.read_signature()
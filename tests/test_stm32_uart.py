@@ -0,0 +1,287 @@
+"""Tests for the STM32 USART bootloader engine."""
+
+import pytest
+from tron_shell.flasher import FlashError
+from tron_shell.protocols import stm32_uart
+from tron_shell.protocols.stm32_uart import (
+    ACK,
+    NACK,
+    FLASH_BASE,
+    STM32Bootloader,
+    sector_bounds,
+    sectors_for_range,
+    stm32_crc,
+    xor,
+)
+
+F4_COMMANDS = bytes([0x00, 0x01, 0x02, 0x11, 0x21, 0x31, 0x44, 0x63, 0x73, 0x82, 0x92])
+
+
+def reference_crc(data):
+    """Bit-by-bit model of the STM32 CRC unit."""
+    crc = 0xFFFFFFFF
+    for offset in range(0, len(data), 4):
+        crc ^= int.from_bytes(data[offset : offset + 4], "little")
+        for _ in range(32):
+            crc = (crc << 1) ^ 0x04C11DB7 if crc & 0x80000000 else crc << 1
+            crc &= 0xFFFFFFFF
+    return crc
+
+
+class FakeSTM32:
+    """Serial handle emulating the AN3155 bootloader of an STM32F4."""
+
+    def __init__(self, product_id=0x413, commands=F4_COMMANDS, flash_size=1024 * 1024):
+        self.product_id = product_id
+        self.commands = commands
+        self.flash = bytearray(b"\x00" * flash_size)
+        self.erased = []
+        self.started = None
+        self.pending = bytearray()
+        self.output = bytearray()
+        self.needed = 0
+        self.process = self._run()
+        self.needed = next(self.process)
+
+    def reset_input_buffer(self):
+        self.output.clear()
+
+    def read(self, size=1):
+        data = bytes(self.output[:size])
+        del self.output[:size]
+        return data
+
+    def write(self, data):
+        self.pending += data
+        while len(self.pending) >= self.needed:
+            chunk = bytes(self.pending[: self.needed])
+            del self.pending[: self.needed]
+            self.needed = self.process.send(chunk)
+        return len(data)
+
+    def _address(self, data):
+        assert xor(data[:4]) == data[4]
+        return int.from_bytes(data[:4], "big") - FLASH_BASE
+
+    def _run(self):
+        while (yield 1) != b"\x7f":
+            pass
+        self.output.append(ACK)
+
+        while True:
+            command, complement = yield 2
+            if command ^ complement != 0xFF or command not in self.commands:
+                self.output.append(NACK)
+                continue
+            self.output.append(ACK)
+
+            if command == 0x00:
+                self.output += bytes([len(self.commands), 0x31]) + self.commands + bytes([ACK])
+            elif command == 0x02:
+                self.output += bytes([1]) + self.product_id.to_bytes(2, "big") + bytes([ACK])
+            elif command == 0x11:
+                address = self._address((yield 5))
+                self.output.append(ACK)
+                count, check = yield 2
+                assert count ^ check == 0xFF
+                self.output.append(ACK)
+                self.output += self.flash[address : address + count + 1]
+            elif command == 0x31:
+                address = self._address((yield 5))
+                self.output.append(ACK)
+                count = (yield 1)[0] + 1
+                data = yield count
+                check = (yield 1)[0]
+                assert xor(bytes([count - 1]) + data) == check
+                self.flash[address : address + count] = data
+                self.output.append(ACK)
+            elif command == 0x44:
+                count = int.from_bytes((yield 2), "big") + 1
+                if count == 0x10000:
+                    assert (yield 1) == b"\x00"
+                    self.flash[:] = b"\xff" * len(self.flash)
+                    self.erased = "all"
+                    self.output.append(ACK)
+                    continue
+                sectors = yield 2 * count
+                yield 1
+                self.erased = [
+                    int.from_bytes(sectors[i : i + 2], "big") for i in range(0, len(sectors), 2)
+                ]
+                self.output.append(ACK)
+            elif command == 0xA1:
+                address = self._address((yield 5))
+                self.output.append(ACK)
+                size = yield 5
+                length = int.from_bytes(size[:4], "big")
+                self.output.append(ACK)
+                crc = stm32_crc(bytes(self.flash[address : address + length])).to_bytes(4, "big")
+                self.output += crc + bytes([xor(crc)])
+            elif command == 0x21:
+                self.started = self._address((yield 5)) + FLASH_BASE
+                self.output.append(ACK)
+
+
+class TestHelpers:
+    """Test CRC and sector helpers."""
+
+    def test_crc_matches_hardware_model(self):
+        for data in (b"", b"\x00\x00\x00\x00", b"\x12\x34\x56\x78", bytes(range(64))):
+            assert stm32_crc(data) == reference_crc(data)
+
+    def test_sectors_for_range(self):
+        layout = stm32_uart.LAYOUTS[0x413]
+        # The first 16 KB sector plus the start of the second
+        assert sectors_for_range(layout, FLASH_BASE, FLASH_BASE + 0x4001) == [0, 1]
+        # The 64 KB sector 4 starts at 0x10000
+        assert sectors_for_range(layout, FLASH_BASE + 0x10000, FLASH_BASE + 0x10010) == [4]
+        assert sectors_for_range(layout, FLASH_BASE + 0x20000, FLASH_BASE + 0x40001) == [5, 6]
+
+    def test_sector_bounds(self):
+        layout = stm32_uart.LAYOUTS[0x413]
+        assert sector_bounds(layout, FLASH_BASE + 0x4001) == (
+            FLASH_BASE + 0x4000,
+            FLASH_BASE + 0x8000,
+        )
+        assert sector_bounds(layout, FLASH_BASE + 0x30000) == (
+            FLASH_BASE + 0x20000,
+            FLASH_BASE + 0x40000,
+        )
+        with pytest.raises(FlashError):
+            sector_bounds(layout, FLASH_BASE + 0x100000)
+
+
+class TestSTM32Bootloader:
+    """Test the AN3155 engine against an emulated bootloader."""
+
+    def test_connect(self):
+        bootloader = STM32Bootloader(FakeSTM32())
+        bootloader.connect()
+        assert bootloader.product_id == 0x413
+        assert bootloader.version == 0x31
+        assert bootloader.supports(stm32_uart.CMD_EXTENDED_ERASE)
+
+    def test_connect_timeout(self):
+        device = FakeSTM32()
+        device.write = lambda data: len(data)
+        with pytest.raises(FlashError):
+            STM32Bootloader(device).connect(attempts=2)
+
+    def test_program_erases_only_covered_sectors(self):
+        device = FakeSTM32()
+        bootloader = STM32Bootloader(device)
+        bootloader.connect()
+        image = bytes(range(256)) * 100 + b"\x01\x02"
+
+        result = bootloader.program([(FLASH_BASE, image)])
+
+        assert device.erased == [0, 1]
+        assert device.flash[: len(image)] == image
+        assert result.pages_written == 101
+        assert result.verified is True
+        assert device.started == FLASH_BASE
+
+    def test_unknown_part_mass_erased(self):
+        device = FakeSTM32(product_id=0x999)
+        bootloader = STM32Bootloader(device)
+        bootloader.connect()
+        assert bootloader.layout is None
+
+        result = bootloader.program([(FLASH_BASE + 0x800, b"\x5a" * 2048)], delta=True)
+
+        assert device.erased == "all"
+        assert device.flash[0x800:0x1000] == b"\x5a" * 2048
+        assert device.flash[:0x800] == b"\xff" * 0x800
+        assert result.verified is True
+
+    def test_verify_with_checksum_command(self):
+        device = FakeSTM32(commands=F4_COMMANDS + bytes([0xA1]))
+        bootloader = STM32Bootloader(device)
+        bootloader.connect()
+        reads = []
+        bootloader.read_memory = lambda *args: reads.append(args)
+
+        result = bootloader.program([(FLASH_BASE + 0x10000, b"\xab" * 1024)])
+
+        assert device.erased == [4]
+        assert result.verified is True
+        assert result.verify_method == "device-hash"
+        assert reads == []
+
+    def test_verify_mismatch(self):
+        device = FakeSTM32()
+        bootloader = STM32Bootloader(device)
+        bootloader.connect()
+        write_memory = bootloader.write_memory
+
+        def corrupt(address, data):
+            write_memory(address, bytes([data[0] ^ 0xFF]) + data[1:])
+
+        bootloader.write_memory = corrupt
+        result = bootloader.program([(FLASH_BASE, b"\x11" * 512)], run=False)
+        assert result.verified is False
+        assert device.started is None
+
+    def test_refused_command(self):
+        bootloader = STM32Bootloader(FakeSTM32())
+        bootloader.connect()
+        with pytest.raises(FlashError):
+            bootloader.get_checksum(FLASH_BASE, 4)
+
+    def test_blank_pages_not_sent(self):
+        device = FakeSTM32()
+        device.flash[:] = b"\xff" * len(device.flash)
+        bootloader = STM32Bootloader(device)
+        bootloader.connect()
+        image = b"\x01" * 256 + b"\xff" * 1024 + b"\x02" * 256
+
+        result = bootloader.program([(FLASH_BASE, image)], run=False)
+
+        assert result.pages_written == 2
+        assert result.pages_skipped == 4
+        assert result.verified is True
+        assert device.flash[: len(image)] == image
+
+    def test_delta_erases_changed_sectors_only(self):
+        device = FakeSTM32(commands=F4_COMMANDS + bytes([0xA1]))
+        bootloader = STM32Bootloader(device)
+        bootloader.connect()
+        image = bytearray(b"\x33" * 0x8000)
+        bootloader.program([(FLASH_BASE, bytes(image))], run=False)
+
+        image[0x4100] = 0
+        reads = []
+        bootloader.read_memory = lambda *args: reads.append(args)
+        result = bootloader.program([(FLASH_BASE, bytes(image))], run=False, delta=True)
+
+        assert device.erased == [1]
+        assert device.flash[: len(image)] == image
+        assert result.sectors_unchanged == 1
+        assert result.verified is True
+        assert reads == []
+
+    def test_delta_by_read_back(self):
+        device = FakeSTM32()
+        bootloader = STM32Bootloader(device)
+        bootloader.connect()
+        image = b"\x33" * 0x8000
+        bootloader.program([(FLASH_BASE, image)], run=False)
+
+        result = bootloader.program([(FLASH_BASE, image)], delta=True)
+
+        assert device.erased == [0, 1]
+        assert result.pages_written == 0
+        assert result.sectors_unchanged == 2
+        assert device.started == FLASH_BASE
+
+    def test_standalone_verify_by_read_back(self):
+        device = FakeSTM32()
+        bootloader = STM32Bootloader(device)
+        bootloader.connect()
+        device.flash[:8] = b"\x01\x02\x03\x04\x05\xff\xff\xff"
+
+        report = bootloader.verify([(FLASH_BASE, b"\x01\x02\x03\x04\x05")])
+
+        assert report.method == "read-back"
+        assert report.verified is True
+        assert report.bytes_read == 8
@@ -0,0 +1,146 @@
+"""Tests for sysfs enumeration module."""
+
+import os
+
+import pytest
+
+from tron_shell import sysfs
+from tron_shell.usb_detector import USBDetector
+
+
+def write_attributes(directory, **attributes):
+    """Write sysfs attribute files into a directory."""
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, value in attributes.items():
+        (directory / name).write_text(f"{value}\n")
+
+
+def link_subsystem(directory, bus_dir, subsystem):
+    """Point a device directory's subsystem link at a bus directory."""
+    target = bus_dir / subsystem
+    target.mkdir(parents=True, exist_ok=True)
+    os.symlink(target, directory / "subsystem")
+
+
+@pytest.fixture
+def fake_sysfs(tmp_path):
+    """Build a small sysfs tty tree with CDC-ACM, FTDI and platform ports."""
+    root = tmp_path / "class" / "tty"
+    dev = tmp_path / "dev"
+    devices = tmp_path / "devices"
+    buses = tmp_path / "bus"
+    root.mkdir(parents=True)
+    dev.mkdir()
+
+    # Arduino Uno (CDC-ACM, the tty hangs off the USB interface)
+    uno = devices / "1-1.2"
+    write_attributes(
+        uno,
+        idVendor="2341",
+        idProduct="0043",
+        serial="A1",
+        manufacturer="Arduino",
+        product="Uno",
+        bNumInterfaces="2",
+    )
+    uno_if = uno / "1-1.2:1.0"
+    write_attributes(uno_if)
+    link_subsystem(uno_if, buses, "usb")
+
+    # Quad FTDI (usb-serial, one tty per interface)
+    ftdi = devices / "1-1.3"
+    write_attributes(
+        ftdi,
+        idVendor="0403",
+        idProduct="6011",
+        serial="F1",
+        product="Quad RS232",
+        bNumInterfaces="4",
+    )
+    ftdi_ports = []
+    for index in range(2):
+        interface = ftdi / f"1-1.3:1.{index}"
+        write_attributes(interface, interface=f"Port {index}")
+        port_dir = interface / f"ttyUSB{index}"
+        write_attributes(port_dir)
+        link_subsystem(port_dir, buses, "usb-serial")
+        ftdi_ports.append(port_dir)
+
+    # Platform UART that pyserial skips
+    platform = devices / "serial8250"
+    write_attributes(platform)
+    link_subsystem(platform, buses, "platform")
+
+    for name, target in [
+        ("ttyACM0", uno_if),
+        ("ttyUSB0", ftdi_ports[0]),
+        ("ttyUSB1", ftdi_ports[1]),
+        ("ttyS0", platform),
+    ]:
+        (root / name).mkdir()
+        os.symlink(target, root / name / "device")
+        (dev / name).write_text("")
+
+    # Virtual terminal without a backing device
+    (root / "tty1").mkdir()
+    (dev / "tty1").write_text("")
+
+    return str(root), str(dev)
+
+
+class TestSysfsEnumeration:
+    """Test sysfs port enumeration."""
+
+    def test_enumerate_ports(self, fake_sysfs):
+        """Test enumerating USB serial ports from sysfs."""
+        root, dev = fake_sysfs
+        records = sysfs.enumerate_ports(root, dev)
+
+        assert [r.device for r in records] == [
+            os.path.join(dev, "ttyACM0"),
+            os.path.join(dev, "ttyUSB0"),
+            os.path.join(dev, "ttyUSB1"),
+        ]
+
+        uno = records[0]
+        assert (uno.vid, uno.pid, uno.serial_number) == (0x2341, 0x0043, "A1")
+        assert uno.manufacturer == "Arduino"
+        assert uno.location == "1-1.2:1.0"
+        assert uno.description == "Uno"
+
+        ftdi = records[2]
+        assert (ftdi.vid, ftdi.pid) == (0x0403, 0x6011)
+        assert ftdi.interface == "Port 1"
+        assert ftdi.location == "1-1.3:1.1"
+        assert ftdi.description == "Quad RS232 - Port 1"
+
+    def test_read_port(self, fake_sysfs):
+        """Test reading a single port."""
+        root, dev = fake_sysfs
+
+        record = sysfs.read_port("ttyUSB0", root, dev)
+        assert record.serial_number == "F1"
+        assert sysfs.read_port("ttyS0", root, dev) is None
+        assert sysfs.read_port("tty1", root, dev) is None
+        assert sysfs.read_port("ttyACM9", root, dev) is None
+
+    def test_missing_root(self, tmp_path):
+        """Test enumeration without a sysfs tree."""
+        assert sysfs.enumerate_ports(str(tmp_path / "missing"), str(tmp_path)) == []
+        assert not sysfs.available(str(tmp_path / "missing"))
+
+    def test_is_port_name(self):
+        """Test serial port name filtering."""
+        assert sysfs.is_port_name("ttyACM0")
+        assert sysfs.is_port_name("ttyUSB12")
+        assert not sysfs.is_port_name("tty1")
+        assert not sysfs.is_port_name("sda")
+
+    def test_from_record(self, fake_sysfs):
+        """Test converting records into USBDevice objects."""
+        root, dev = fake_sysfs
+        device = USBDetector.from_record(sysfs.read_port("ttyACM0", root, dev))
+
+        assert device.vid_pid == "2341:0043"
+        assert device.location == "1-1.2:1.0"
+        assert USBDetector.identify_device_type(device) == "Arduino"
@@ -0,0 +1,83 @@
+"""Tests for post-flash verification strategies."""
+
+import random
+
+import pytest
+from tron_shell.flasher import FlashError
+from tron_shell.verify import (
+    DEVICE_HASH,
+    READ_BACK,
+    SAMPLED,
+    md5_hex,
+    sample_pages,
+    verify_ranges,
+)
+
+
+class FakeMemory:
+    """Device memory that counts how it is accessed."""
+
+    def __init__(self, contents):
+        self.contents = bytearray(contents)
+        self.reads = []
+
+    def read(self, address, length):
+        self.reads.append((address, length))
+        return bytes(self.contents[address : address + length])
+
+    def md5(self, address, length):
+        return md5_hex(bytes(self.contents[address : address + length]))
+
+
+class TestVerifyRanges:
+    """Test strategy selection and outcomes."""
+
+    def test_device_hash_reads_nothing(self):
+        memory = FakeMemory(b"\x01" * 1024)
+        report = verify_ranges([(0, b"\x01" * 512)], device_hash=memory.md5, read=memory.read)
+        assert report.method == DEVICE_HASH
+        assert report.verified is True
+        assert report.bytes_read == 0
+        assert memory.reads == []
+
+    def test_read_back_covers_written_ranges_only(self):
+        memory = FakeMemory(b"\x01" * 4096)
+        report = verify_ranges([(0x100, b"\x01" * 16), (0x800, b"\x01" * 32)], read=memory.read)
+        assert report.method == READ_BACK
+        assert report.verified is True
+        assert memory.reads == [(0x100, 16), (0x800, 32)]
+        assert report.image_digest == report.device_digest
+
+    def test_mismatch_is_located(self):
+        memory = FakeMemory(b"\x01" * 1024)
+        memory.contents[0x210] = 0
+        report = verify_ranges([(0, b"\x01" * 0x200), (0x200, b"\x01" * 0x200)], read=memory.read)
+        assert report.verified is False
+        assert report.mismatches == [0x200]
+
+    def test_sampled_when_over_budget(self):
+        memory = FakeMemory(b"\x01" * 0x10000)
+        report = verify_ranges(
+            [(0, b"\x01" * 0x10000)],
+            read=memory.read,
+            max_read=0x1000,
+            page_size=0x100,
+            rng=random.Random(1),
+        )
+        assert report.method == SAMPLED
+        assert report.verified is True
+        assert report.bytes_read == 0x1000
+
+    def test_no_way_to_verify(self):
+        with pytest.raises(FlashError):
+            verify_ranges([(0, b"\x00")])
+
+
+class TestSamplePages:
+    """Test page sampling."""
+
+    def test_first_and_last_pages_always_sampled(self):
+        segments = [(0, b"\x00" * 1000), (0x1000, b"\x00" * 10)]
+        pages = sample_pages(segments, 100, 0, random.Random(0))
+        assert [address for address, _ in pages] == [0, 900, 0x1000]
+        assert len(pages[1][1]) == 100
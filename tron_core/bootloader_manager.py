@@ -9,8 +9,8 @@ class BootloaderManager:
         """Enter bootloader mode with platform-specific sequences"""
         self.platform.enter_bootloader()
     
-    def burn_bootloader(self, fuse_set=None):
-        """Burn bootloader with optional fuse configuration"""
+    def burn_bootloader(self, fuse_set=None, image=None):
+        """Burn bootloader with optional fuse configuration (ARM needs an image)"""
         if self.platform.name.startswith('atmega'):
             self._burn_atmega_bootloader(fuse_set)
         elif self.platform.name.startswith('esp'):
@@ -18,7 +18,7 @@ class BootloaderManager:
         elif self.platform.name.startswith('tron'):
             self._burn_tron_bootloader()
         elif self.platform.name.startswith('stm32'):
-            self._burn_arm_bootloader()
+            self._burn_arm_bootloader(image)
     
     def verify_bootloader(self):
         """Verify bootloader integrity"""
@@ -80,7 +80,29 @@ class BootloaderManager:
         # Custom protocol implementation
         self.debug_logger.log("Burning Tron bootloader via custom UART protocol...")
     
-    def _burn_arm_bootloader(self):
-        """Burn bootloader to ARM devices"""
-        # Use OpenOCD or DFU utilities
-        self.debug_logger.log("Burning ARM bootloader via DFU mode...")
\ No newline at end of file
+    def _burn_arm_bootloader(self, image):
+        """Burn a bootloader image to ARM devices over DFU"""
+        if not image:
+            # The STM32 system bootloader lives in ROM; only a custom one can be written
+            raise RuntimeError('Burning an ARM bootloader needs a bootloader image file')
+        
+        from tron_shell.firmware import FirmwareImage
+        from tron_shell.protocols.dfu import find_dfu_devices
+        from tron_shell.protocols.stm32_uart import FLASH_BASE
+        devices = find_dfu_devices(debug_logger=self.debug_logger)
+        if not devices:
+            raise RuntimeError("No DFU device found. Hold BOOT0 high and reset the board.")
+        
+        dfu = devices[0]
+        base = dfu.layout.start if dfu.layout and dfu.layout.start is not None else FLASH_BASE
+        segments = FirmwareImage.load(image, base_address=base).segments
+        layout = dfu.layout.name if dfu.layout else "unknown layout"
+        self.debug_logger.log(
+            f"Burning ARM bootloader via DFU mode ({layout}, {dfu.transfer_size} byte blocks)..."
+        )
+        result = dfu.program(segments, verify=True, run=False)
+        if result.verified is False:
+            raise RuntimeError('Bootloader verification failed after DFU download')
+        self.debug_logger.log(
+            f"Wrote {result.bytes_written} bytes of bootloader in {result.elapsed:.2f}s"
+        )
@@ -1,6 +1,15 @@
-import subprocess
 import os
+import time
+import subprocess
+from contextlib import contextmanager
+import serial
 from .base_platform import BasePlatform
+from tron_shell.bootloader import RESET_PULSE, port_vid_pid, stk500_probe, wait_for_bootloader
+from tron_shell.flasher import FlashError
+from tron_shell.firmware import FirmwareImage
+from tron_shell.protocols.stk500 import STK500Programmer
+from tron_shell.session import get_pool
+from tron_shell.process import INACTIVITY_TIMEOUT, ProcessResult, progress_logger, run_streaming
 
 class PlatformATmega(BasePlatform):
     """ATmega platform implementation"""
@@ -11,9 +20,20 @@ class PlatformATmega(BasePlatform):
             'atmega328p': 'm328p',
             'atmega2560': 'm2560'
         }
+        # Parts whose bootloader speaks STK500v1 (the ATmega2560 uses STK500v2)
+        self.native_platforms = {'atmega8', 'atmega168', 'atmega328p', 'atmega1284p'}
+        self.native_result = None
     
     def flash_firmware(self, filename):
         """Flash firmware to ATmega device"""
+        self.native_result = None
+        if self.platform in self.native_platforms:
+            try:
+                self._flash_native(filename)
+                return
+            except FlashError as e:
+                self.debug_logger.log(f"Native STK500 flash failed ({e}), falling back to avrdude")
+        
         mcu = self.mcu_map.get(self.platform, 'm328p')
         programmer = 'arduino'
         
@@ -28,15 +48,78 @@ class PlatformATmega(BasePlatform):
         ]
         
         self.debug_logger.log_command(cmd)
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = self._run_avrdude(cmd)
         
-        if result.returncode != 0:
-            raise RuntimeError(f"Flashing failed: {result.stderr}")
+        if not result.ok:
+            raise RuntimeError(f"Flashing failed: {self._failure(result)}")
         
-        self.debug_logger.log_output(result.stdout)
+        self.debug_logger.log_output(result.output)
+    
+    def _run_avrdude(self, cmd):
+        """Run avrdude, logging its progress bars as they advance"""
+        try:
+            return run_streaming(
+                cmd,
+                on_progress=progress_logger(lambda line: self.debug_logger.log(line, level=2)),
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            # avrdude missing or not runnable: a failed run rather than a crash
+            return ProcessResult(None, tail=[str(e)])
+    
+    def _failure(self, result):
+        """Describe a failed avrdude run from the tail of its output"""
+        if result.stalled:
+            return f"avrdude stalled (no output for {INACTIVITY_TIMEOUT:.0f}s)\n{result.output}"
+        return result.output
+    
+    @contextmanager
+    def _native_session(self):
+        """Reset into Optiboot and yield a synced STK500Programmer"""
+        try:
+            with get_pool().lease(self.port, baudrate=self.baud, timeout=1) as ser:
+                ser.dtr = False
+                time.sleep(RESET_PULSE)
+                ser.dtr = True
+                wait_for_bootloader(ser, stk500_probe, port_vid_pid(self.port))
+                programmer = STK500Programmer(ser, debug_logger=self.debug_logger)
+                programmer.sync()
+                programmer.identify()
+                yield programmer
+        except (serial.SerialException, OSError) as e:
+            # Reported as FlashError so callers fall back to avrdude
+            raise FlashError(f"Cannot open {self.port}: {e}")
+    
+    def _flash_native(self, filename):
+        """Flash and read back in one bootloader session over STK500v1"""
+        segments = FirmwareImage.load(filename).segments
+        with self._native_session() as programmer:
+            result = programmer.program(segments, verify=True)
+        
+        self.debug_logger.log(
+            f"Wrote {result.pages_written} pages in {result.elapsed:.2f}s "
+            f"(verified by {result.verify_method}: image {result.image_digest}, "
+            f"device {result.device_digest})"
+        )
+        self.native_result = (filename, result)
     
     def verify_firmware(self, filename):
         """Verify firmware on device"""
+        if self.native_result is not None and self.native_result[0] == filename:
+            # The pages were already read back while flashing
+            if not self.native_result[1].verified:
+                raise RuntimeError("Verification failed: Firmware mismatch")
+            return
+        
+        if self.platform in self.native_platforms:
+            try:
+                report = self._verify_native(filename)
+            except FlashError as e:
+                self.debug_logger.log(f"Native STK500 verify failed ({e}), falling back to avrdude")
+            else:
+                if not report.verified:
+                    raise RuntimeError("Verification failed: Firmware mismatch")
+                return
+        
         mcu = self.mcu_map.get(self.platform, 'm328p')
         
         cmd = [
@@ -50,18 +133,32 @@ class PlatformATmega(BasePlatform):
         ]
         
         self.debug_logger.log_command(cmd)
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = self._run_avrdude(cmd)
         
-        if 'verification error' in result.stdout.lower():
+        if 'verification error' in result.output.lower():
             raise RuntimeError("Verification failed: Firmware mismatch")
+        if result.stalled or result.returncode is None:
+            raise RuntimeError(f"Verification failed: {self._failure(result)}")
+    
+    def _verify_native(self, filename):
+        """Read back only the image's pages over STK500v1"""
+        segments = FirmwareImage.load(filename).segments
+        with self._native_session() as programmer:
+            programmer.enter_progmode()
+            report = programmer.verify(segments)
+            programmer.leave_progmode()
+        
+        self.debug_logger.log(
+            f"Verified {report.bytes_read} bytes by {report.method} "
+            f"(image {report.image_digest}, device {report.device_digest})"
+        )
+        return report
     
     def enter_bootloader(self):
         """Enter bootloader mode"""
-        # Toggle DTR line to reset into bootloader
-        import serial
-        with serial.Serial(self.port, self.baud, timeout=1) as ser:
-            ser.setDTR(False)
-            ser.setDTR(True)
-            ser.setDTR(False)
-        
-        self.debug_logger.log("Entered bootloader mode via DTR toggle")
\ No newline at end of file
+        # Pulse DTR to reset, then sync until Optiboot answers rather than guessing a delay
+        from tron_shell.bootloader import BootloaderManager
+        if BootloaderManager.reset_device(self.port, 'dtr', probe='stk500', baud=self.baud):
+            self.debug_logger.log("Entered bootloader mode via DTR toggle")
+        else:
+            self.debug_logger.log("DTR toggle sent but the bootloader did not answer")
\ No newline at end of file
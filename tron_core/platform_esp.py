@@ -0,0 +1,71 @@
+import time
+from .base_platform import BasePlatform
+from tron_shell.firmware import FirmwareImage
+from tron_shell.protocols.esp_rom import ROM_BAUD, ESPLoader, classic_reset
+from tron_shell.session import get_pool
+
+
+class PlatformESP(BasePlatform):
+    """ESP32/ESP8266 platform implementation"""
+
+    def __init__(self, port, baud, debug_logger):
+        super().__init__(port, baud, debug_logger)
+        self.flash_baud = baud or 460800
+        self.flash_size = 4 * 1024 * 1024
+        self.flash_result = None
+
+    def _connect(self, ser):
+        """Reset into the ROM loader and sync"""
+        classic_reset(ser)
+        loader = ESPLoader(ser, debug_logger=self.debug_logger)
+        loader.sync()
+        loader.detect_chip()
+        return loader
+
+    def flash_firmware(self, filename):
+        """Flash firmware to ESP device"""
+        self.flash_result = None
+        with get_pool().lease(self.port, baudrate=ROM_BAUD, timeout=0.05) as ser:
+            loader = self._connect(ser)
+            segments = FirmwareImage.load(filename, base_address=loader.chip.app_offset).segments
+            loader.change_baud(self.flash_baud)
+            loader.attach_flash(self.flash_size)
+            result = loader.program(segments, verify=True)
+
+        self.debug_logger.log(
+            f"Wrote {result.bytes_written} bytes in {result.pages_written} blocks "
+            f"in {result.elapsed:.2f}s"
+        )
+        self.flash_result = (filename, result)
+
+    def verify_firmware(self, filename):
+        """Verify firmware on device"""
+        if self.flash_result is not None and self.flash_result[0] == filename:
+            # The on-chip MD5 was already checked while flashing
+            result = self.flash_result[1]
+            if result.verified is False:
+                raise RuntimeError("Verification failed: Firmware mismatch")
+            if result.verified is None:
+                self.debug_logger.log("ROM loader cannot hash flash, verification skipped")
+            return
+
+        with get_pool().lease(self.port, baudrate=ROM_BAUD, timeout=0.05) as ser:
+            loader = self._connect(ser)
+            loader.attach_flash(self.flash_size)
+            image = FirmwareImage.load(filename, base_address=loader.chip.app_offset)
+            report = loader.verify(image.segments)
+
+        if report is None:
+            self.debug_logger.log("ROM loader cannot hash flash, verification skipped")
+            return
+        self.debug_logger.log(f"Verified by {report.method}: {report.device_digest}")
+        if not report.verified:
+            raise RuntimeError("Verification failed: Firmware mismatch")
+
+    def enter_bootloader(self):
+        """Enter bootloader mode"""
+        with get_pool().lease(self.port, baudrate=ROM_BAUD, timeout=1) as ser:
+            classic_reset(ser)
+        time.sleep(0.05)
+
+        self.debug_logger.log("Entered ROM loader via DTR/RTS reset")
@@ -1,92 +1,79 @@
 import usb.core
 import usb.util
 import platform
-import serial.tools.list_ports
+
+def _registry():
+    """Return the shared device registry from tron_shell, imported on first use"""
+    from tron_shell.registry import get_registry
+    return get_registry()
 
 class USBDetector:
     """Intelligent USB device detection engine"""
     
     def __init__(self, usb_rules):
+        from tron_shell.identify import BoardIdentifier
+        
         self.usb_rules = usb_rules
         self.os_type = platform.system().lower()
+        self.identifier = BoardIdentifier(usb_rules, os_type=self.os_type)
+        self._platform_index = {}
+        self._index_generation = None
     
     def detect_devices(self, verbose=False):
         """Detect all compatible USB devices"""
-        detected = []
-        
-        # Get all serial ports
-        ports = serial.tools.list_ports.comports()
-        
-        for port in ports:
-            # Extract USB IDs where available
-            vid = pid = None
-            if hasattr(port, 'hwid'):
-                for part in port.hwid.split():
-                    if part.startswith('VID:'):
-                        vid = part[4:].zfill(4)
-                    elif part.startswith('PID:'):
-                        pid = part[4:].zfill(4)
-            
-            # Match against rules
-            for rule in self.usb_rules:
-                if self._match_rule(rule, vid, pid, port.device, port.description):
-                    device_info = {
-                        'port': port.device,
-                        'description': port.description,
-                        'vendor_id': vid or 'unknown',
-                        'product_id': pid or 'unknown',
-                        'platform': rule['platform'],
-                        'rule_match': rule.get('description', 'Custom Rule')
-                    }
-                    detected.append(device_info)
-                    break
+        # Devices come from the shared registry, which scans once and then
+        # only re-reads ports that changed if a long-running mode watches hotplug
+        devices = _registry().devices()
+        detected = self._match_devices(devices)
         
         if verbose:
-            self._print_verbose_info(detected, ports)
+            self._print_verbose_info(detected, devices)
         
         return detected
     
     def detect_by_platform(self, platform_name):
         """Detect devices matching specific platform"""
-        devices = self.detect_devices()
-        for dev in devices:
-            if dev['platform'] == platform_name:
-                return dev
-        return None
-    
-    def _match_rule(self, rule, vid, pid, port_path, description):
-        """Match device against detection rule"""
-        # VID/PID match
-        if 'vendor_id' in rule and rule['vendor_id'] != vid:
-            return False
-        if 'product_id' in rule and rule['product_id'] != pid:
-            return False
+        registry = _registry()
+        devices = registry.devices()
+        
+        if self._index_generation != registry.generation:
+            self._platform_index = {}
+            for dev in self._match_devices(devices):
+                self._platform_index.setdefault(dev['platform'], dev)
+            self._index_generation = registry.generation
         
-        # OS-specific path matching
-        if 'path_contains' in rule:
-            if self.os_type in rule['path_contains']:
-                if rule['path_contains'][self.os_type] not in port_path.lower():
-                    return False
+        return self._platform_index.get(platform_name)
+    
+    def _match_devices(self, devices):
+        """Match devices against rules, reusing results for devices seen before"""
+        detected = []
         
-        # Description keywords
-        if 'description_keywords' in rule:
-            desc_lower = description.lower()
-            if not any(kw in desc_lower for kw in rule['description_keywords']):
-                return False
+        for device, info in zip(devices, self.identifier.identify_many(devices)):
+            if info.platform is None:
+                continue
+            
+            detected.append({
+                'port': device.port,
+                'description': device.description,
+                'vendor_id': f"{device.vid:04x}" if device.vid is not None else 'unknown',
+                'product_id': f"{device.pid:04x}" if device.pid is not None else 'unknown',
+                'platform': info.platform,
+                'rule_match': info.rule
+            })
         
-        return True
+        return detected
     
-    def _print_verbose_info(self, detected, all_ports):
+    def _print_verbose_info(self, detected, all_devices):
         """Print detailed detection information"""
         print("\n=== USB DETECTION REPORT ===")
         print(f"OS: {platform.system()} {platform.release()}")
-        print(f"Total serial ports found: {len(all_ports)}")
+        print(f"Total serial ports found: {len(all_devices)}")
         
         if not detected:
             print("No compatible devices found with current rules")
             print("\nAll detected ports:")
-            for port in all_ports:
-                print(f"- {port.device}: {port.description} ({port.hwid})")
+            for device in all_devices:
+                print(f"- {device.port}: {device.description} ({device.vid_pid or 'n/a'})")
         
         else:
             print(f"\nCompatible devices found: {len(detected)}")
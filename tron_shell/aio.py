@@ -0,0 +1,498 @@
+"""
+asyncio front end for driving many boards from one event loop.
+
+Resets, bootloader probing and waiting for ports run on the event loop: DTR
+pulses and settle times are ``asyncio.sleep`` calls, sync probes wait for the
+port to become readable instead of blocking in ``read()``, and port arrival is
+a hotplug event forwarded to the loop.
+
+The flashers, in-process engines (STK500, ESP ROM, STM32 USART, DFU) and
+external tools alike, are synchronous; flash() and verify() run them on a
+small, bounded pool of worker threads, so a rack of boards costs a fixed
+number of flashing threads however many boards are waiting on resets, probes
+or ports.
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, asynccontextmanager
+from typing import AsyncIterator, Callable, ContextManager, Dict, List, Optional, Tuple
+
+from . import hotplug
+from .batch import (
+    DONE,
+    FAILED,
+    FLASHING,
+    RESETTING,
+    VERIFYING,
+    BatchReport,
+    PortResult,
+)
+from .bootloader import (
+    ENTRY_TIMEOUT,
+    PLATFORM_PROBES,
+    PROBE_BACKOFF,
+    PROBE_BACKOFF_MAX,
+    PROBE_READ_TIMEOUT,
+    RESET_PULSE,
+    SETTLE_TIME,
+    BootloaderManager,
+    get_latencies,
+    port_vid_pid,
+)
+from .flasher import FlashError, PlatformFlasher, TopologyScheduler, get_flasher
+from .identify import get_identifier
+from .session import get_pool, lease_owner
+from .usb_detector import USBDevice
+
+# Worker threads for the blocking in-process engines
+ENGINE_WORKERS = 8
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Per event loop, per port: coroutines leasing the same port take turns
+_port_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Lock]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _engines() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=ENGINE_WORKERS, thread_name_prefix="tron-engine"
+            )
+        return _executor
+
+
+async def _in_worker(func: Callable, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Run in a copy of the caller's context, so leases keep the caller's lease_owner()
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(_engines(), call)
+
+
+@asynccontextmanager
+async def _held(manager: ContextManager) -> AsyncIterator:
+    """Enter a blocking context manager on an engine worker and exit it on the loop."""
+    stack = ExitStack()
+    entering = asyncio.ensure_future(_in_worker(stack.enter_context, manager))
+    try:
+        value = await asyncio.shield(entering)
+    except asyncio.CancelledError:
+        # The worker may still get in; leave again as soon as it does
+        entering.add_done_callback(
+            lambda future: future.cancelled() or future.exception() or stack.close()
+        )
+        raise
+    try:
+        yield value
+    finally:
+        stack.close()
+
+
+def _port_lock(port: str) -> asyncio.Lock:
+    locks = _port_locks.setdefault(asyncio.get_running_loop(), {})
+    lock = locks.get(port)
+    if lock is None:
+        lock = locks[port] = asyncio.Lock()
+    return lock
+
+
+@asynccontextmanager
+async def leased(port: str, **settings) -> AsyncIterator:
+    """
+    Lease a port's pooled handle for use on the event loop.
+
+    The lease is taken on an engine worker, so a lease held elsewhere delays
+    the caller instead of blocking the loop, and it belongs to the caller's
+    lease_owner() rather than to a thread, so the loop can use and release
+    it. Coroutines leasing the same port take turns.
+
+    Args:
+        port: Serial port
+        **settings: pyserial attributes, as for SerialSessionPool.lease()
+
+    Yields:
+        The port's handle
+
+    Raises:
+        serial.SerialException: If the port cannot be opened
+    """
+    async with _port_lock(port):
+        with lease_owner():
+            async with _held(get_pool().lease(port, **settings)) as handle:
+                yield handle
+
+
+def _sync_frames() -> Dict[str, Tuple[bytes, Tuple[bytes, ...]]]:
+    """Sync request and accepted replies for the probes that can run on the loop."""
+    from .protocols import stk500, stm32_uart
+
+    return {
+        "stk500": (
+            bytes([stk500.STK_GET_SYNC, stk500.CRC_EOP]),
+            (bytes([stk500.STK_INSYNC, stk500.STK_OK]),),
+        ),
+        "stm32": (
+            bytes([stm32_uart.AUTOBAUD]),
+            (bytes([stm32_uart.ACK]), bytes([stm32_uart.NACK])),
+        ),
+    }
+
+
+async def read_serial(ser, size: int, timeout: float) -> bytes:
+    """
+    Read up to ``size`` bytes from an open, non-blocking serial handle.
+
+    Waits for the port to become readable on the event loop rather than in
+    ``read()``.
+
+    Returns:
+        The bytes read before the timeout, possibly fewer than ``size``
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    data = bytearray()
+    while len(data) < size:
+        chunk = ser.read(size - len(data))
+        if chunk:
+            data += chunk
+            continue
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+
+        readable = loop.create_future()
+        loop.add_reader(ser.fileno(), lambda: readable.done() or readable.set_result(None))
+        try:
+            await asyncio.wait_for(readable, remaining)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(ser.fileno())
+    return bytes(data)
+
+
+async def wait_for_bootloader(
+    ser, probe: str, vid_pid: Optional[str] = None, timeout: Optional[float] = None
+) -> Optional[float]:
+    """
+    Probe a freshly reset board until its bootloader answers.
+
+    The asyncio counterpart of bootloader.wait_for_bootloader(), with the
+    same backoff and learned per-VID:PID latencies.
+
+    Args:
+        ser: Open serial handle with ``timeout=0``
+        probe: "stk500" or "stm32"
+        vid_pid: Board type whose latency to use and learn
+        timeout: Longest wait
+
+    Returns:
+        Seconds until the bootloader answered, or None
+    """
+    request, replies = _sync_frames()[probe]
+    start = time.monotonic()
+    latencies = get_latencies()
+    typical = latencies.get(vid_pid)
+    if timeout is None:
+        timeout = max(ENTRY_TIMEOUT, 4 * typical) if typical else ENTRY_TIMEOUT
+    if typical:
+        await asyncio.sleep(typical / 2)
+
+    backoff = PROBE_BACKOFF
+    while True:
+        ser.reset_input_buffer()
+        ser.write(request)
+        if await read_serial(ser, len(replies[0]), PROBE_READ_TIMEOUT) in replies:
+            elapsed = time.monotonic() - start
+            latencies.record(vid_pid, elapsed)
+            return elapsed
+        remaining = timeout - (time.monotonic() - start)
+        if remaining <= 0:
+            return None
+        await asyncio.sleep(min(backoff, remaining))
+        backoff = min(backoff * 1.5, PROBE_BACKOFF_MAX)
+
+
+async def wait_for_port(port: str, timeout: float = 10.0, present: bool = True) -> bool:
+    """
+    Wait for a port to appear (or, with ``present=False``, to disappear).
+
+    Hotplug events are forwarded to the loop, so waiting costs no thread.
+
+    Returns:
+        True if the port reached the requested state before the timeout
+    """
+    import serial.tools.list_ports
+
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def on_event(event: hotplug.PortEvent) -> None:
+        if event.port == port:
+            loop.call_soon_threadsafe(changed.set)
+
+    def listed() -> bool:
+        return port in [p.device for p in serial.tools.list_ports.comports()]
+
+    watcher = hotplug.get_watcher()
+    watcher.subscribe(on_event)
+    try:
+        deadline = loop.time() + timeout
+        while True:
+            if await loop.run_in_executor(None, listed) == present:
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                # Ports outside the watched directories are rechecked every second
+                await asyncio.wait_for(changed.wait(), min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+            changed.clear()
+    finally:
+        watcher.unsubscribe(on_event)
+
+
+async def reset(
+    port: str,
+    method: str = "dtr",
+    probe: Optional[str] = None,
+    baud: int = 115200,
+    vid_pid: Optional[str] = None,
+    log: Callable[[str], None] = print,
+) -> bool:
+    """
+    Reset a device into its bootloader.
+
+    Takes the same arguments as BootloaderManager.reset_device(). DTR/RTS
+    resets with an "stk500" or "stm32" probe, or none, run on the loop; other
+    probes run the blocking reset on a worker thread. The port's pooled handle
+    is taken with leased(), so a reset waits for a flash() or verify() still
+    using the port, and two resets of one port never interleave.
+
+    Returns:
+        True if reset successful (and, with a probe, the bootloader answered)
+    """
+    if vid_pid is None:
+        vid_pid = await _in_worker(port_vid_pid, port)
+
+    if method == "1200baud":
+        return await _reset_1200baud(port, vid_pid, log)
+    if probe is not None and probe not in _sync_frames():
+        return await _in_worker(
+            BootloaderManager.reset_device, port, method, probe, baud, vid_pid, log
+        )
+
+    try:
+        async with leased(port, baudrate=baud if probe else 9600, timeout=0) as ser:
+            line = "rts" if method == "rts" else "dtr"
+            setattr(ser, line, False)
+            await asyncio.sleep(RESET_PULSE)
+            setattr(ser, line, True)
+
+            if probe is None:
+                await asyncio.sleep(SETTLE_TIME)
+                return True
+            if await wait_for_bootloader(ser, probe, vid_pid) is None:
+                log(f"No answer from the {probe} bootloader on {port}")
+                return False
+            get_pool().note_bootloader(port, probe)
+            return True
+    except Exception as e:
+        log(f"DTR/RTS reset error: {e}")
+        return False
+
+
+def _touch_1200baud(port: str) -> None:
+    # Opening at 1200 baud and closing is the signal; the device then drops off USB
+    pool = get_pool()
+    with pool.lease(port, baudrate=1200, timeout=0):
+        pool.close(port)
+
+
+async def _reset_1200baud(port: str, vid_pid: Optional[str], log: Callable[[str], None]) -> bool:
+    start = time.monotonic()
+    try:
+        async with _port_lock(port):
+            await _in_worker(_touch_1200baud, port)
+    except Exception as e:
+        log(f"1200 baud reset error: {e}")
+        return False
+
+    await wait_for_port(port, 1.0, present=False)
+    typical = get_latencies().get(vid_pid)
+    timeout = max(ENTRY_TIMEOUT, 4 * typical) if typical else ENTRY_TIMEOUT
+    if not await wait_for_port(port, timeout):
+        log(f"Bootloader port {port} did not come back")
+        return False
+    get_latencies().record(vid_pid, time.monotonic() - start)
+    return True
+
+
+async def enter_bootloader(
+    port: str, platform: str = "auto", log: Callable[[str], None] = print
+) -> bool:
+    """Asyncio counterpart of BootloaderManager.enter_bootloader()."""
+    platform_lower = platform.lower()
+    if platform_lower in ("esp32", "espressif", "stm32"):
+        # Manual boot mode entry; this only gives instructions
+        return BootloaderManager.enter_bootloader(port, platform, log)
+    return await reset(port, "dtr", probe=PLATFORM_PROBES.get(platform_lower), log=log)
+
+
+@asynccontextmanager
+async def session(flasher: PlatformFlasher, **options) -> AsyncIterator[None]:
+    """
+    Hold a flasher's session() across the reset, flash and verify of one board.
+
+    The steps on the loop and on engine workers share one lease_owner(), so
+    they nest their leases in the session and share its open handle.
+    """
+    with lease_owner():
+        async with _held(flasher.session(**options)):
+            yield
+
+
+async def flash(flasher: PlatformFlasher, firmware: str, **options) -> bool:
+    """Run a flasher's flash() on an engine worker thread."""
+    return await _in_worker(flasher.flash, firmware, **options)
+
+
+async def verify(flasher: PlatformFlasher, firmware: str, **options) -> bool:
+    """Run a flasher's verify() on an engine worker thread."""
+    return await _in_worker(flasher.verify, firmware, **options)
+
+
+async def flash_board(
+    result: PortResult,
+    firmware: str,
+    verify: bool = True,
+    reset: bool = True,
+    verbose: bool = False,
+    flash_options: Optional[Dict] = None,
+    on_update: Optional[Callable[[PortResult], None]] = None,
+) -> None:
+    """
+    Reset, flash and verify one board, recording the outcome in its PortResult.
+
+    Args:
+        result: PortResult naming the port and platform; updated in place
+        firmware: Path to the firmware file
+        verify: Verify after flashing
+        reset: Reset into the bootloader before flashing
+        verbose: Enable verbose flasher output
+        flash_options: Extra keyword arguments passed to the flasher
+        on_update: Called with the PortResult whenever it changes state
+    """
+    options = dict(flash_options or {})
+
+    def update(status: str, error: Optional[str] = None) -> None:
+        result.status = status
+        if error is not None:
+            result.error = error
+        if status in (DONE, FAILED):
+            result.finished = time.monotonic()
+        if on_update:
+            on_update(result)
+
+    result.started = time.monotonic()
+    try:
+        flasher = get_flasher(result.platform, result.port, verbose)
+        async with session(flasher, **options):
+            if reset:
+                update(RESETTING)
+                if not await enter_bootloader(result.port, result.platform, result.messages.append):
+                    update(FAILED, "Bootloader not responding")
+                    return
+
+            update(FLASHING)
+            if not await _in_worker(flasher.flash, firmware, **options):
+                update(FAILED, "Flash failed")
+                return
+
+            if verify:
+                update(VERIFYING)
+                if not await _in_worker(flasher.verify, firmware, **options):
+                    update(FAILED, "Verification failed")
+                    return
+
+        update(DONE)
+
+    except FlashError as e:
+        update(FAILED, str(e))
+    except Exception as e:
+        update(FAILED, f"Unexpected error: {e}")
+
+
+async def flash_many(
+    devices: List[USBDevice],
+    firmware: str,
+    platform: Optional[str] = None,
+    concurrency: int = 16,
+    verify: bool = True,
+    reset: bool = True,
+    verbose: bool = False,
+    flash_options: Optional[Dict] = None,
+    on_update: Optional[Callable[[PortResult], None]] = None,
+    scheduler: Optional[TopologyScheduler] = None,
+) -> BatchReport:
+    """
+    Flash the same firmware to many devices from one event loop.
+
+    Takes the same arguments as batch.flash_all(), with ``concurrency`` in
+    place of ``workers``: it bounds how many devices are in progress at once,
+    while only ENGINE_WORKERS threads ever run engine code.
+
+    Returns:
+        BatchReport with one PortResult per device
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    options = dict(flash_options or {})
+    scheduler = scheduler or TopologyScheduler()
+    identified = await _in_worker(get_identifier().identify_many, devices)
+    results = [
+        PortResult(port=device.port, platform=platform or info.name, location=device.location)
+        for device, info in zip(devices, identified)
+    ]
+
+    # Slots are taken together with the topology limits, so a board waiting
+    # on a busy hub does not hold one of them
+    slots = asyncio.Condition()
+    active = 0
+
+    async def board(result: PortResult) -> None:
+        nonlocal active
+        async with slots:
+            await slots.wait_for(
+                lambda: active < concurrency and scheduler.try_acquire(result.location)
+            )
+            active += 1
+        try:
+            await flash_board(result, firmware, verify, reset, verbose, options, on_update)
+        finally:
+            async with slots:
+                active -= 1
+                scheduler.release(result.location)
+                slots.notify_all()
+
+    for result in results:
+        if on_update:
+            on_update(result)
+
+    start = time.monotonic()
+    ordered = scheduler.order(results, lambda r: r.location)
+    await asyncio.gather(*(board(result) for result in ordered))
+    return BatchReport(results=results, elapsed=time.monotonic() - start)
@@ -0,0 +1,191 @@
+"""
+Parallel flashing of many devices at once.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from .usb_detector import USBDevice
+from .identify import get_identifier
+from .flasher import get_flasher, FlashError, TopologyScheduler
+from .bootloader import BootloaderManager
+
+
+# Per-port job states, in the order a job moves through them
+QUEUED = "queued"
+RESETTING = "resetting"
+FLASHING = "flashing"
+VERIFYING = "verifying"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class PortResult:
+    """Progress and outcome of flashing a single port."""
+
+    port: str
+    platform: str
+    location: Optional[str] = None
+    status: str = QUEUED
+    error: Optional[str] = None
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    # Reset messages and instructions, kept here rather than printed over a live display
+    messages: List[str] = field(default_factory=list)
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        """Return seconds spent on this port, if it has started."""
+        if self.started is None:
+            return None
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.started
+
+    @property
+    def ok(self) -> bool:
+        """Return True if the port finished successfully."""
+        return self.status == DONE
+
+
+@dataclass
+class BatchReport:
+    """Summary of a parallel flash run."""
+
+    results: List[PortResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def succeeded(self) -> List[PortResult]:
+        """Return results of ports that flashed successfully."""
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self) -> List[PortResult]:
+        """Return results of ports that failed."""
+        return [r for r in self.results if r.status == FAILED]
+
+    @property
+    def boards_per_minute(self) -> float:
+        """Return the number of successfully flashed boards per minute."""
+        if self.elapsed <= 0:
+            return 0.0
+        return len(self.succeeded) * 60.0 / self.elapsed
+
+
+def flash_all(
+    devices: List[USBDevice],
+    firmware: str,
+    platform: Optional[str] = None,
+    workers: int = 4,
+    verify: bool = True,
+    reset: bool = True,
+    verbose: bool = False,
+    flash_options: Optional[Dict] = None,
+    on_update: Optional[Callable[[PortResult], None]] = None,
+    scheduler: Optional[TopologyScheduler] = None,
+) -> BatchReport:
+    """
+    Flash the same firmware to several devices concurrently.
+
+    Each device goes through reset, flash and verify on its own worker thread;
+    at most ``workers`` devices are handled at the same time, and the scheduler
+    additionally limits how many of them share a USB hub or root port.
+
+    Args:
+        devices: Devices to flash, e.g. the result of USBDetector.detect_devices()
+        firmware: Path to the firmware file
+        platform: Platform for every device (identified per device if not given)
+        workers: Maximum number of devices flashed at the same time
+        verify: Verify each device after flashing
+        reset: Reset each device into its bootloader before flashing
+        verbose: Enable verbose flasher output
+        flash_options: Extra keyword arguments passed to the flasher
+        on_update: Called with the PortResult whenever a port changes state
+        scheduler: Per-hub concurrency limits (default TopologyScheduler limits)
+
+    Returns:
+        BatchReport with one PortResult per device
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+
+    options = dict(flash_options or {})
+    scheduler = scheduler or TopologyScheduler()
+    lock = threading.Lock()
+    names = [info.name for info in get_identifier().identify_many(devices)]
+    results = [
+        PortResult(
+            port=device.port,
+            platform=platform or name,
+            location=device.location,
+        )
+        for device, name in zip(devices, names)
+    ]
+
+    def update(result: PortResult, status: str, error: Optional[str] = None) -> None:
+        with lock:
+            result.status = status
+            if error is not None:
+                result.error = error
+            if status in (DONE, FAILED):
+                result.finished = time.monotonic()
+        if on_update:
+            on_update(result)
+
+    def run(result: PortResult) -> None:
+        result.started = time.monotonic()
+        try:
+            flasher = get_flasher(result.platform, result.port, verbose)
+            with flasher.session(**options):
+                if reset:
+                    update(result, RESETTING)
+                    if not BootloaderManager.enter_bootloader(
+                        result.port, result.platform, result.messages.append
+                    ):
+                        update(result, FAILED, "Bootloader not responding")
+                        return
+
+                update(result, FLASHING)
+                if not flasher.flash(firmware, **options):
+                    update(result, FAILED, "Flash failed")
+                    return
+
+                if verify:
+                    update(result, VERIFYING)
+                    if not flasher.verify(firmware, **options):
+                        update(result, FAILED, "Verification failed")
+                        return
+
+            update(result, DONE)
+
+        except FlashError as e:
+            update(result, FAILED, str(e))
+        except Exception as e:
+            update(result, FAILED, f"Unexpected error: {e}")
+
+    def worker() -> None:
+        while True:
+            result = scheduler.take(pending, lambda r: r.location)
+            if result is None:
+                return
+            try:
+                run(result)
+            finally:
+                scheduler.release(result.location)
+
+    for result in results:
+        if on_update:
+            on_update(result)
+
+    pending = scheduler.order(results, lambda r: r.location)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tron-flash") as pool:
+        for future in [pool.submit(worker) for _ in range(min(workers, len(results)))]:
+            future.result()
+
+    return BatchReport(results=results, elapsed=time.monotonic() - start)
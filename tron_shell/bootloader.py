@@ -1,75 +1,321 @@
 """
 Bootloader management functionality.
+
+Rather than sleeping a fixed time after a reset pulse, the platform's sync
+frame is sent straight away and retried with a short, growing backoff until
+the bootloader answers. How long each kind of board (VID:PID) takes is
+learned as a moving average and kept in the cache directory, so later resets
+start probing just before the bootloader is expected to wake up.
 """
 
+import os
+import json
 import time
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
 import serial
 
+from . import hotplug
+from .config import cache_dir
+from .session import get_pool
+
+# Width of the DTR/RTS reset pulse
+RESET_PULSE = 0.05
+
+# Settle time after a reset with no sync probe for the platform
+SETTLE_TIME = 0.5
+
+# Sync probing: first retry after 10 ms, backing off to at most 250 ms
+PROBE_BACKOFF = 0.01
+PROBE_BACKOFF_MAX = 0.25
+PROBE_READ_TIMEOUT = 0.05
+
+# Longest wait for a bootloader to answer, unless a board is known to be slower
+ENTRY_TIMEOUT = 3.0
+
+# Weight of the newest sample in the per-VID:PID latency average
+LATENCY_ALPHA = 0.3
+
+
+def stk500_probe(ser) -> bool:
+    """Send STK500v1 GET_SYNC; True if an Optiboot-style bootloader answers."""
+    from .protocols import stk500
+
+    ser.reset_input_buffer()
+    ser.write(bytes([stk500.STK_GET_SYNC, stk500.CRC_EOP]))
+    return ser.read(2) == bytes([stk500.STK_INSYNC, stk500.STK_OK])
+
+
+def stm32_probe(ser) -> bool:
+    """Send the USART bootloader's autobaud byte; ACK or NACK means it is running."""
+    from .protocols import stm32_uart
+
+    ser.reset_input_buffer()
+    ser.write(bytes([stm32_uart.AUTOBAUD]))
+    return ser.read(1) in (bytes([stm32_uart.ACK]), bytes([stm32_uart.NACK]))
+
+
+def esp_probe(ser) -> bool:
+    """Send one ROM loader SYNC packet."""
+    from .flasher import FlashError
+    from .protocols.esp_rom import ESPLoader
+
+    try:
+        ESPLoader(ser).sync(attempts=1)
+    except FlashError:
+        return False
+    return True
+
+
+# Sync probes by bootloader protocol
+PROBES: Dict[str, Callable[[serial.Serial], bool]] = {
+    "stk500": stk500_probe,
+    "stm32": stm32_probe,
+    "esp": esp_probe,
+}
+
+# Probe for each platform name accepted by enter_bootloader()
+PLATFORM_PROBES = {
+    "arduino": "stk500",
+    "atmega": "stk500",
+}
+
+
+class EntryLatencies:
+    """Learned reset-to-bootloader times per VID:PID, persisted between runs."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or cache_dir() / "entry-latency.json"
+        self._lock = threading.Lock()
+        self._latencies: Optional[Dict[str, float]] = None
+
+    def _load(self) -> Dict[str, float]:
+        if self._latencies is None:
+            try:
+                with open(self.path) as f:
+                    self._latencies = {key: float(value) for key, value in json.load(f).items()}
+            except (OSError, ValueError, AttributeError):
+                self._latencies = {}
+        return self._latencies
+
+    def get(self, vid_pid: Optional[str]) -> Optional[float]:
+        """Return the typical entry latency in seconds, if learned."""
+        if not vid_pid:
+            return None
+        with self._lock:
+            return self._load().get(vid_pid)
+
+    def record(self, vid_pid: Optional[str], seconds: float) -> None:
+        """Fold a measured entry latency into the average and save it."""
+        if not vid_pid:
+            return
+        with self._lock:
+            latencies = self._load()
+            previous = latencies.get(vid_pid)
+            if previous is None:
+                latencies[vid_pid] = seconds
+            else:
+                latencies[vid_pid] = previous + LATENCY_ALPHA * (seconds - previous)
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".latency-")
+                try:
+                    with os.fdopen(fd, "w") as f:
+                        json.dump(latencies, f)
+                    os.replace(tmp, self.path)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+            except OSError:
+                # Only costs the head start on the next reset
+                pass
+
+
+_latencies: Optional[EntryLatencies] = None
+_latencies_lock = threading.Lock()
+
+
+def get_latencies() -> EntryLatencies:
+    """Return the shared EntryLatencies store."""
+    global _latencies
+    with _latencies_lock:
+        if _latencies is None:
+            _latencies = EntryLatencies()
+        return _latencies
+
+
+def wait_for_bootloader(
+    ser,
+    probe: Callable[[serial.Serial], bool],
+    vid_pid: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> Optional[float]:
+    """
+    Probe a freshly reset board until its bootloader answers.
+
+    Probing starts at half the board's learned entry latency (right away if
+    none is known) and backs off from 10 ms to 250 ms between attempts.
+
+    Args:
+        ser: Open serial handle; its timeout is shortened while probing
+        probe: Sync probe from PROBES
+        vid_pid: Board type whose latency to use and learn
+        timeout: Longest wait; by default ENTRY_TIMEOUT, or four times the
+            learned latency for slower boards
+
+    Returns:
+        Seconds from the call until the bootloader answered, or None
+    """
+    start = time.monotonic()
+    latencies = get_latencies()
+    typical = latencies.get(vid_pid)
+    if timeout is None:
+        timeout = max(ENTRY_TIMEOUT, 4 * typical) if typical else ENTRY_TIMEOUT
+    if typical:
+        time.sleep(typical / 2)
+
+    saved_timeout = ser.timeout
+    ser.timeout = PROBE_READ_TIMEOUT
+    try:
+        backoff = PROBE_BACKOFF
+        while True:
+            if probe(ser):
+                elapsed = time.monotonic() - start
+                latencies.record(vid_pid, elapsed)
+                return elapsed
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0:
+                return None
+            time.sleep(min(backoff, remaining))
+            backoff = min(backoff * 1.5, PROBE_BACKOFF_MAX)
+    finally:
+        ser.timeout = saved_timeout
+
+
+def port_vid_pid(port: str) -> Optional[str]:
+    """Return the VID:PID of the device behind a port, if known."""
+    from .registry import get_registry
+
+    device = get_registry().by_port(port)
+    return device.vid_pid if device else None
+
 
 class BootloaderManager:
     """Manages bootloader interactions for various platforms."""
 
     @staticmethod
-    def reset_device(port: str, method: str = "dtr") -> bool:
+    def reset_device(
+        port: str,
+        method: str = "dtr",
+        probe: Optional[str] = None,
+        baud: int = 115200,
+        vid_pid: Optional[str] = None,
+        log: Callable[[str], None] = print,
+    ) -> bool:
         """
         Reset device to enter bootloader mode.
 
         Args:
             port: Serial port
             method: Reset method (dtr, rts, 1200baud)
+            probe: Bootloader protocol to sync with after a DTR/RTS reset
+                (a key of PROBES); without one a fixed settle time is used
+            baud: Baud rate for the sync probe
+            vid_pid: Board type for latency learning; looked up if not given
+            log: Where failure messages go (stdout by default)
 
         Returns:
-            True if reset successful
+            True if reset successful (and, with a probe, the bootloader answered)
         """
         try:
             if method == "1200baud":
                 # Arduino Leonardo/Micro style reset
-                return BootloaderManager._reset_1200baud(port)
+                return BootloaderManager._reset_1200baud(port, vid_pid, log)
             else:
                 # Standard DTR/RTS reset
-                return BootloaderManager._reset_dtr_rts(port, method)
+                return BootloaderManager._reset_dtr_rts(port, method, probe, baud, vid_pid, log)
         except Exception as e:
-            print(f"Reset failed: {e}")
+            log(f"Reset failed: {e}")
             return False
 
     @staticmethod
-    def _reset_dtr_rts(port: str, signal: str) -> bool:
-        """Reset using DTR or RTS signal."""
+    def _reset_dtr_rts(
+        port: str,
+        signal: str,
+        probe: Optional[str] = None,
+        baud: int = 115200,
+        vid_pid: Optional[str] = None,
+        log: Callable[[str], None] = print,
+    ) -> bool:
+        """Reset using DTR or RTS signal, then wait for the bootloader."""
         try:
-            ser = serial.Serial(port, 9600, timeout=1)
-
-            if signal == "dtr":
-                ser.setDTR(False)
-                time.sleep(0.1)
-                ser.setDTR(True)
-            elif signal == "rts":
-                ser.setRTS(False)
-                time.sleep(0.1)
-                ser.setRTS(True)
-
-            time.sleep(0.5)
-            ser.close()
-            return True
+            with get_pool().lease(port, baudrate=baud if probe else 9600, timeout=1) as ser:
+                if signal == "dtr":
+                    ser.dtr = False
+                    time.sleep(RESET_PULSE)
+                    ser.dtr = True
+                elif signal == "rts":
+                    ser.rts = False
+                    time.sleep(RESET_PULSE)
+                    ser.rts = True
+
+                if probe is None:
+                    time.sleep(SETTLE_TIME)
+                    return True
+
+                if vid_pid is None:
+                    vid_pid = port_vid_pid(port)
+                elapsed = wait_for_bootloader(ser, PROBES[probe], vid_pid)
+                if elapsed is None:
+                    log(f"No answer from the {probe} bootloader on {port}")
+                    return False
+                get_pool().note_bootloader(port, probe)
+                return True
 
         except Exception as e:
-            print(f"DTR/RTS reset error: {e}")
+            log(f"DTR/RTS reset error: {e}")
             return False
 
     @staticmethod
-    def _reset_1200baud(port: str) -> bool:
-        """Reset using 1200 baud touch (Arduino Leonardo/Micro)."""
+    def _reset_1200baud(
+        port: str, vid_pid: Optional[str] = None, log: Callable[[str], None] = print
+    ) -> bool:
+        """
+        Reset using 1200 baud touch (Arduino Leonardo/Micro).
+
+        The board drops off USB and comes back as its bootloader; rather than
+        sleeping, wait for the port to go and reappear.
+        """
         try:
-            # Open at 1200 baud
-            ser = serial.Serial(port, 1200, timeout=1)
-            time.sleep(0.1)
-            ser.close()
+            import serial.tools.list_ports
+
+            if vid_pid is None:
+                vid_pid = port_vid_pid(port)
+            start = time.monotonic()
 
-            # Wait for bootloader
-            time.sleep(2)
+            # Closing the port at 1200 baud is the reset request, even if an
+            # operation holds it open; the next lease reopens the bootloader
+            pool = get_pool()
+            with pool.lease(port, baudrate=1200, timeout=1):
+                pool.close(port)
+
+            def present() -> bool:
+                return port in [p.device for p in serial.tools.list_ports.comports()]
+
+            hotplug.wait_for_event(port, hotplug.PORT_REMOVED, 1.0, present)
+            typical = get_latencies().get(vid_pid)
+            timeout = max(ENTRY_TIMEOUT, 4 * typical) if typical else ENTRY_TIMEOUT
+            if not hotplug.wait_for_event(port, hotplug.PORT_ADDED, timeout, present):
+                log(f"Bootloader port {port} did not come back")
+                return False
+            get_latencies().record(vid_pid, time.monotonic() - start)
             return True
 
         except Exception as e:
-            print(f"1200 baud reset error: {e}")
+            log(f"1200 baud reset error: {e}")
             return False
 
     @staticmethod
@@ -77,6 +323,9 @@ class BootloaderManager:
         """
         Wait for a port to become available.
 
+        Wakes up as soon as the port appears (via hotplug events) instead of
+        polling the serial port list.
+
         Args:
             port: Serial port to wait for
             timeout: Maximum time to wait in seconds
@@ -86,24 +335,22 @@ class BootloaderManager:
         """
         import serial.tools.list_ports
 
-        start_time = time.time()
+        def present() -> bool:
+            return port in [p.device for p in serial.tools.list_ports.comports()]
 
-        while time.time() - start_time < timeout:
-            ports = [p.device for p in serial.tools.list_ports.comports()]
-            if port in ports:
-                return True
-            time.sleep(0.1)
-
-        return False
+        return hotplug.wait_for_event(port, hotplug.PORT_ADDED, timeout, present)
 
     @staticmethod
-    def enter_bootloader(port: str, platform: str = "auto") -> bool:
+    def enter_bootloader(
+        port: str, platform: str = "auto", log: Callable[[str], None] = print
+    ) -> bool:
         """
         Enter bootloader mode for the specified platform.
 
         Args:
             port: Serial port
             platform: Platform type (arduino, esp32, stm32, auto)
+            log: Where instructions and failure messages go (stdout by default)
 
         Returns:
             True if bootloader mode entered successfully
@@ -112,12 +359,14 @@ class BootloaderManager:
 
         if platform_lower == "esp32" or platform_lower == "espressif":
             # ESP32 bootloader entry (GPIO0 low during reset)
-            print("To enter ESP32 bootloader: Hold BOOT button, press RESET, release BOOT")
+            log("To enter ESP32 bootloader: Hold BOOT button, press RESET, release BOOT")
             return True
         elif platform_lower == "stm32":
             # STM32 bootloader entry (BOOT0 high during reset)
-            print("To enter STM32 bootloader: Set BOOT0 high, reset device")
+            log("To enter STM32 bootloader: Set BOOT0 high, reset device")
             return True
         else:
-            # Generic reset attempt
-            return BootloaderManager.reset_device(port, "dtr")
+            # Generic reset attempt, synced with the bootloader where its protocol is known
+            return BootloaderManager.reset_device(
+                port, "dtr", probe=PLATFORM_PROBES.get(platform_lower), log=log
+            )
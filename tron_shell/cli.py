@@ -4,16 +4,28 @@ Main CLI interface for Tron Shell.
 
 import sys
 import click
-from rich.console import Console
-from rich.table import Table
 
-from .usb_detector import USBDetector
-from .flasher import get_flasher, FlashError
-from .bootloader import BootloaderManager
 from . import __version__
 
+# Only click is imported up front: rich, pyserial and the flashing modules are
+# imported by the commands that use them, so `tron --version` and scripted
+# calls stay fast.
 
-console = Console()
+
+class LazyConsole:
+    """Stand-in for a rich Console that imports rich on first use."""
+
+    _console = None
+
+    def __getattr__(self, name):
+        if LazyConsole._console is None:
+            from rich.console import Console
+
+            LazyConsole._console = Console()
+        return getattr(LazyConsole._console, name)
+
+
+console = LazyConsole()
 
 
 def print_header():
@@ -49,10 +61,14 @@ def cli(ctx, version):
 @click.option("-v", "--verbose", is_flag=True, help="Enable verbose output")
 def list(verbose):
     """List all connected USB devices."""
+    from rich.table import Table
+    from .registry import get_registry
+
     print_header()
     console.print("[bold cyan]Scanning for USB devices...[/bold cyan]\n")
 
-    devices = USBDetector.detect_devices()
+    registry = get_registry()
+    devices = registry.devices()
 
     if not devices:
         console.print("[yellow]No USB devices found.[/yellow]")
@@ -65,7 +81,7 @@ def list(verbose):
     table.add_column("Description")
 
     for device in devices:
-        device_type = USBDetector.identify_device_type(device)
+        device_type = registry.platform_of(device.port)
         vid_pid = device.vid_pid or "N/A"
 
         table.add_row(device.port, device_type, vid_pid, device.description)
@@ -91,7 +107,19 @@ def list(verbose):
 @click.option("-v", "--verbose", is_flag=True, help="Enable verbose output")
 @click.option("--verify/--no-verify", default=True, help="Verify after flashing")
 @click.option("--reset/--no-reset", default=True, help="Reset device before flashing")
-def flash(firmware, port, board, baud, platform, verbose, verify, reset):
+@click.option(
+    "--method",
+    help="Flashing method (stk500 for Arduino, rom for ESP32/ESP8266, uart or dfu for STM32)",
+)
+@click.option(
+    "--delta", is_flag=True, help="Only write sectors that differ from the device (needs --method)"
+)
+@click.option(
+    "--resume/--no-resume",
+    default=True,
+    help="Resume a flash interrupted by a disconnect (needs --method)",
+)
+def flash(firmware, port, board, baud, platform, verbose, verify, reset, method, delta, resume):
     """
     Flash firmware to a microcontroller.
 
@@ -106,7 +134,17 @@ def flash(firmware, port, board, baud, platform, verbose, verify, reset):
       tron flash sketch.hex --platform arduino --board arduino:avr:mega
 
       tron flash app.bin --platform esp32 --baud 460800
+
+      tron flash app.bin --platform esp32 --method rom --delta
     """
+    from .usb_detector import USBDetector
+    from .flasher import get_flasher, FlashError
+    from .bootloader import BootloaderManager
+
+    if delta and not method:
+        console.print("[red]Error: --delta needs --method (stk500, rom, uart or dfu)[/red]")
+        sys.exit(1)
+
     try:
         print_header()
         # Auto-detect port if not specified
@@ -131,11 +169,6 @@ def flash(firmware, port, board, baud, platform, verbose, verify, reset):
         if not platform:
             platform = "auto"
 
-        # Reset device if requested
-        if reset:
-            console.print("[cyan]Resetting device to enter bootloader...[/cyan]")
-            BootloaderManager.enter_bootloader(port, platform)
-
         # Get appropriate flasher
         flasher = get_flasher(platform, port, verbose)
 
@@ -145,25 +178,38 @@ def flash(firmware, port, board, baud, platform, verbose, verify, reset):
             flash_options["board"] = board
         if baud:
             flash_options["baud"] = baud
+        if method:
+            flash_options["method"] = method
+            flash_options["verify"] = verify
+            flash_options["delta"] = delta
+            flash_options["resume"] = resume
+
+        # One open port from reset through verify for the in-process engines
+        with flasher.session(**flash_options):
+            # Reset device if requested
+            if reset:
+                console.print("[cyan]Resetting device to enter bootloader...[/cyan]")
+                BootloaderManager.enter_bootloader(port, platform)
+
+            # Flash firmware
+            console.print(f"\n[bold cyan]Flashing {firmware} to {port}...[/bold cyan]\n")
+
+            success = flasher.flash(firmware, **flash_options)
+
+            if not success:
+                console.print("[red]Flash failed![/red]")
+                sys.exit(1)
 
-        # Flash firmware
-        console.print(f"\n[bold cyan]Flashing {firmware} to {port}...[/bold cyan]\n")
-
-        success = flasher.flash(firmware, **flash_options)
-
-        if not success:
-            console.print("[red]Flash failed![/red]")
-            sys.exit(1)
-
-        console.print("[green]✓ Flash completed successfully![/green]")
+            console.print("[green]✓ Flash completed successfully![/green]")
 
-        # Verify if requested
-        if verify:
-            console.print("[cyan]Verifying firmware...[/cyan]")
-            if flasher.verify(firmware):
-                console.print("[green]✓ Verification successful![/green]")
-            else:
-                console.print("[yellow]Warning: Verification failed[/yellow]")
+            # Verify if requested
+            if verify:
+                console.print("[cyan]Verifying firmware...[/cyan]")
+                if flasher.verify(firmware, **flash_options):
+                    how = f" ({flasher.verify_method})" if flasher.verify_method else ""
+                    console.print(f"[green]✓ Verification successful{how}![/green]")
+                else:
+                    console.print("[yellow]Warning: Verification failed[/yellow]")
 
         console.print("\n[bold green]Done![/bold green]")
 
@@ -179,6 +225,383 @@ def flash(firmware, port, board, baud, platform, verbose, verify, reset):
         sys.exit(1)
 
 
+def render_batch_table(results):
+    """Build the per-port status table shown while flashing several devices."""
+    from rich.table import Table
+    from . import batch
+
+    styles = {
+        batch.QUEUED: "dim",
+        batch.RESETTING: "cyan",
+        batch.FLASHING: "bold cyan",
+        batch.VERIFYING: "magenta",
+        batch.DONE: "green",
+        batch.FAILED: "red",
+    }
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Port", style="cyan")
+    table.add_column("Platform", style="green")
+    table.add_column("Status")
+    table.add_column("Time", justify="right")
+    table.add_column("Error", style="red")
+
+    for result in results:
+        style = styles.get(result.status, "white")
+        elapsed = f"{result.elapsed:.1f}s" if result.elapsed is not None else ""
+        table.add_row(
+            result.port,
+            result.platform,
+            f"[{style}]{result.status}[/{style}]",
+            elapsed,
+            result.error or "",
+        )
+
+    return table
+
+
+@cli.command("flash-all")
+@click.argument("firmware", type=click.Path(exists=True))
+@click.option("-p", "--port", "ports", multiple=True, help="Only flash these ports (repeatable)")
+@click.option("-b", "--board", default="arduino:avr:uno", help="Board type (for Arduino)")
+@click.option("--baud", type=int, help="Baud rate for flashing")
+@click.option(
+    "--platform", help="Platform type for every device (identified per device if omitted)"
+)
+@click.option(
+    "-j", "--workers", type=int, default=4, show_default=True, help="Devices flashed at once"
+)
+@click.option(
+    "--per-hub", type=int, default=4, show_default=True, help="Devices flashed at once per USB hub"
+)
+@click.option(
+    "--per-root-port",
+    type=int,
+    default=8,
+    show_default=True,
+    help="Devices flashed at once per USB root port",
+)
+@click.option("--include-unknown", is_flag=True, help="Also flash devices of unknown type")
+@click.option("-v", "--verbose", is_flag=True, help="Enable verbose output")
+@click.option("--verify/--no-verify", default=True, help="Verify after flashing")
+@click.option("--reset/--no-reset", default=True, help="Reset devices before flashing")
+@click.option(
+    "--method",
+    help="Flashing method (stk500 for Arduino, rom for ESP32/ESP8266, uart or dfu for STM32)",
+)
+@click.option(
+    "--delta", is_flag=True, help="Only write sectors that differ from the device (needs --method)"
+)
+@click.option(
+    "--resume/--no-resume",
+    default=True,
+    help="Resume a flash interrupted by a disconnect (needs --method)",
+)
+def flash_all(
+    firmware,
+    ports,
+    board,
+    baud,
+    platform,
+    workers,
+    per_hub,
+    per_root_port,
+    include_unknown,
+    verbose,
+    verify,
+    reset,
+    method,
+    delta,
+    resume,
+):
+    """
+    Flash firmware to all connected devices in parallel.
+
+    FIRMWARE: Path to the firmware file (.hex, .bin, .elf, etc.)
+
+    Examples:
+
+      tron flash-all firmware.hex
+
+      tron flash-all sketch.hex --platform arduino -j 16
+
+      tron flash-all app.bin -p /dev/ttyUSB0 -p /dev/ttyUSB1
+    """
+    from rich.live import Live
+    from .flasher import TopologyScheduler
+    from .registry import get_registry
+    from . import batch
+
+    if delta and not method:
+        console.print("[red]Error: --delta needs --method (stk500, rom, uart or dfu)[/red]")
+        sys.exit(1)
+
+    print_header()
+    console.print("[bold cyan]Scanning for USB devices...[/bold cyan]\n")
+
+    registry = get_registry(watch=True)
+    devices = registry.devices()
+    if ports:
+        devices = [device for device in devices if device.port in ports]
+    elif not platform and not include_unknown:
+        devices = [device for device in devices if registry.platform_of(device.port) != "Unknown"]
+
+    if not devices:
+        console.print("[yellow]No USB devices found.[/yellow]")
+        sys.exit(1)
+
+    flash_options = {}
+    if board:
+        flash_options["board"] = board
+    if baud:
+        flash_options["baud"] = baud
+    if method:
+        flash_options["method"] = method
+        flash_options["verify"] = verify
+        flash_options["delta"] = delta
+        flash_options["resume"] = resume
+
+    console.print(
+        f"[bold cyan]Flashing {firmware} to {len(devices)} device(s) "
+        f"with {workers} worker(s)...[/bold cyan]\n"
+    )
+
+    results = {}
+
+    with Live(render_batch_table([]), console=console, refresh_per_second=4) as live:
+
+        def on_update(result):
+            results[result.port] = result
+            live.update(render_batch_table(results.values()))
+
+        report = batch.flash_all(
+            devices,
+            firmware,
+            platform=platform,
+            workers=workers,
+            verify=verify,
+            reset=reset,
+            verbose=verbose,
+            flash_options=flash_options,
+            on_update=on_update,
+            scheduler=TopologyScheduler(per_hub=per_hub, per_root_port=per_root_port),
+        )
+        live.update(render_batch_table(report.results))
+
+    console.print(
+        f"\n[bold]Summary:[/bold] {len(report.succeeded)}/{len(report.results)} succeeded "
+        f"in {report.elapsed:.1f}s ({report.boards_per_minute:.1f} boards/min)"
+    )
+
+    if report.failed:
+        console.print(f"[red]{len(report.failed)} device(s) failed:[/red]")
+        for result in report.failed:
+            console.print(f"  [red]{result.port}: {result.error}[/red]")
+            for message in result.messages:
+                console.print(f"    {message}")
+        sys.exit(1)
+
+    console.print("\n[bold green]Done![/bold green]")
+
+
+@cli.command()
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    help="Socket path (default: $XDG_RUNTIME_DIR/tron-shell.sock)",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enable verbose output")
+def serve(socket_path, verbose):
+    """
+    Run a job server for line controllers.
+
+    Keeps the device inventory and detection rules in memory and takes flash,
+    verify and reset jobs as JSON lines over a Unix domain socket, queued per
+    port, streaming progress events back.
+
+    Examples:
+
+      tron serve
+
+      tron serve --socket /run/tron/tron.sock
+    """
+    import asyncio
+
+    if not hasattr(asyncio, "start_unix_server"):
+        console.print("[red]Error: tron serve needs Unix domain sockets[/red]")
+        sys.exit(1)
+
+    from .flasher import FlashError
+    from .server import FlashServer
+
+    print_header()
+    server = FlashServer(socket_path, verbose=verbose)
+
+    async def run():
+        try:
+            await server.start()
+            console.print(f"[bold cyan]Listening on {server.path}[/bold cyan] (Ctrl+C to stop)")
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except FlashError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        console.print("\n[cyan]Server stopped.[/cyan]")
+
+
+# Most recent boards shown in the station table
+STATION_ROWS = 20
+
+
+def parse_vid_pids(ctx, param, value):
+    """Normalize --match VID:PID values to the ``2341:0043`` form."""
+    vid_pids = []
+    for item in value:
+        try:
+            vid, pid = (int(part, 16) for part in item.split(":"))
+        except ValueError:
+            raise click.BadParameter(f"{item!r} is not VID:PID in hex, e.g. 2341:0043")
+        vid_pids.append(f"{vid:04X}:{pid:04X}")
+    return tuple(vid_pids)
+
+
+@cli.command()
+@click.option("-f", "--firmware", required=True, type=click.Path(exists=True), help="Firmware file")
+@click.option("--platform", help="Platform to flash; only boards of this platform are flashed")
+@click.option(
+    "-j", "--concurrency", type=int, default=4, show_default=True, help="Boards flashed at once"
+)
+@click.option(
+    "--match",
+    "vid_pids",
+    multiple=True,
+    callback=parse_vid_pids,
+    help="Also flash devices with this VID:PID (repeatable)",
+)
+@click.option("--flash-present", is_flag=True, help="Also flash matching boards already connected")
+@click.option("-b", "--board", default="arduino:avr:uno", help="Board type (for Arduino)")
+@click.option("--baud", type=int, help="Baud rate for flashing")
+@click.option("-v", "--verbose", is_flag=True, help="Enable verbose output")
+@click.option("--verify/--no-verify", default=True, help="Verify after flashing")
+@click.option("--reset/--no-reset", default=True, help="Reset boards before flashing")
+@click.option(
+    "--method",
+    help="Flashing method (stk500 for Arduino, rom for ESP32/ESP8266, uart or dfu for STM32)",
+)
+@click.option(
+    "--delta", is_flag=True, help="Only write sectors that differ from the device (needs --method)"
+)
+@click.option(
+    "--resume/--no-resume",
+    default=True,
+    help="Resume a flash interrupted by a disconnect (needs --method)",
+)
+def station(
+    firmware,
+    platform,
+    concurrency,
+    vid_pids,
+    flash_present,
+    board,
+    baud,
+    verbose,
+    verify,
+    reset,
+    method,
+    delta,
+    resume,
+):
+    """
+    Flash every matching board as soon as it is plugged in.
+
+    Boards match if a detection rule or the known-device table identifies
+    them (as the given platform, if --platform is set), or if their VID:PID
+    is given with --match. With --match and no --platform, only the given
+    VID:PIDs are flashed. Runs until Ctrl+C.
+
+    Examples:
+
+      tron station --firmware sketch.hex --platform arduino
+
+      tron station -f app.bin --platform esp32 -j 8 --method rom
+
+      tron station -f fw.bin --match 0483:5740 --match 0483:df11
+    """
+    import asyncio
+    from rich.live import Live
+    from .station import Station
+    from . import batch
+
+    if delta and not method:
+        console.print("[red]Error: --delta needs --method (stk500, rom, uart or dfu)[/red]")
+        sys.exit(1)
+    if concurrency < 1:
+        console.print("[red]Error: --concurrency must be at least 1[/red]")
+        sys.exit(1)
+
+    flash_options = {}
+    if board:
+        flash_options["board"] = board
+    if baud:
+        flash_options["baud"] = baud
+    if method:
+        flash_options["method"] = method
+        flash_options["verify"] = verify
+        flash_options["delta"] = delta
+        flash_options["resume"] = resume
+
+    print_header()
+    target = platform or (", ".join(vid_pids) if vid_pids else "any known board")
+    console.print(
+        f"[bold cyan]Station ready: flashing {firmware} to {target}, "
+        f"{concurrency} at a time[/bold cyan] (Ctrl+C to stop)\n"
+    )
+
+    current = Station(
+        firmware,
+        platform=platform,
+        concurrency=concurrency,
+        verify=verify,
+        reset=reset,
+        verbose=verbose,
+        flash_options=flash_options,
+        vid_pids=vid_pids,
+        flash_present=flash_present,
+    )
+
+    def render():
+        table = render_batch_table(current.results[-STATION_ROWS:])
+        table.caption = (
+            f"{current.succeeded} flashed, {current.failed} failed, "
+            f"{current.meter.rate():.1f} boards/min"
+        )
+        return table
+
+    try:
+        with Live(get_renderable=render, console=console, refresh_per_second=4):
+            asyncio.run(current.run())
+    except KeyboardInterrupt:
+        pass
+
+    console.print(
+        f"\n[bold]Summary:[/bold] {current.succeeded} flashed, {current.failed} failed "
+        f"({current.meter.rate():.1f} boards/min)"
+    )
+    if current.failed:
+        for result in current.results:
+            if result.status == batch.FAILED:
+                console.print(f"  [red]{result.port}: {result.error}[/red]")
+                for message in result.messages:
+                    console.print(f"    {message}")
+        sys.exit(1)
+
+
 @cli.command()
 @click.argument("port")
 @click.option(
@@ -196,6 +619,8 @@ def reset(port, method):
 
       tron reset COM3 --method 1200baud
     """
+    from .bootloader import BootloaderManager
+
     print_header()
     console.print(f"[cyan]Resetting device on {port} using {method} method...[/cyan]")
 
@@ -223,6 +648,9 @@ def info(port, verbose):
 
       tron info COM3 --verbose
     """
+    from rich.table import Table
+    from .usb_detector import USBDetector
+
     print_header()
     device = USBDetector.find_device_by_port(port)
 
@@ -255,6 +683,8 @@ def info(port, verbose):
 @cli.command()
 def platforms():
     """List supported platforms and their details."""
+    from rich.table import Table
+
     print_header()
     console.print("\n[bold cyan]Supported Platforms[/bold cyan]\n")
 
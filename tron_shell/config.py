@@ -0,0 +1,221 @@
+"""
+Configuration file loading.
+
+Parsing YAML is slow once the rules file holds thousands of entries, so the
+parsed and validated configuration is kept in a marshal snapshot next to
+other user caches. The snapshot is keyed by the YAML file's path, mtime and
+size and is rebuilt only when the file changes.
+"""
+
+import os
+import copy
+import marshal
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .rules import normalize_id
+
+# User configuration, as installed by the setup instructions
+USER_CONFIG_PATH = Path.home() / ".tron" / "config.yaml"
+
+# Rules shipped with the source tree
+BUNDLED_CONFIG_PATH = Path(__file__).resolve().parent.parent / "config" / "default_rules.yaml"
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "default_baud": 115200,
+    "timeout": 5.0,
+    "usb_rules": [],
+    "debug": {
+        "protocol_log": False,
+        "verbose_errors": True,
+        "keep_temp_files": False,
+    },
+}
+
+# Bump whenever validate_config() changes what ends up in the snapshot
+CACHE_FORMAT = 2
+
+
+class ConfigError(ValueError):
+    """Exception raised when a configuration file is invalid."""
+
+    pass
+
+
+def default_config_path() -> Optional[Path]:
+    """
+    Return the configuration file to use.
+
+    Returns:
+        ~/.tron/config.yaml if it exists, else the bundled default rules,
+        or None if neither exists
+    """
+    for path in (USER_CONFIG_PATH, BUNDLED_CONFIG_PATH):
+        if path.is_file():
+            return path
+    return None
+
+
+def cache_dir() -> Path:
+    """Return the directory holding Tron Shell's cache files."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(Path.home(), ".cache")
+    return Path(base) / "tron-shell"
+
+
+def validate_config(config: Any) -> Dict[str, Any]:
+    """
+    Validate a parsed configuration and fill in defaults.
+
+    Rule vendor and product IDs are normalized to four lowercase hex digits.
+
+    Args:
+        config: Parsed YAML document
+
+    Returns:
+        Validated configuration dictionary
+
+    Raises:
+        ConfigError: If the configuration is malformed
+    """
+    if config is None:
+        config = {}
+    if not isinstance(config, dict):
+        raise ConfigError("Configuration must be a mapping")
+
+    result = copy.deepcopy(DEFAULT_CONFIG)
+    result.update(config)
+
+    for key in ("default_baud", "timeout"):
+        value = result[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ConfigError(f"{key} must be a number")
+
+    section = config.get("debug") or {}
+    if not isinstance(section, dict):
+        raise ConfigError("debug must be a mapping")
+    debug = dict(DEFAULT_CONFIG["debug"])
+    debug.update(section)
+    result["debug"] = debug
+
+    rules = result.get("usb_rules") or []
+    if not isinstance(rules, list):
+        raise ConfigError("usb_rules must be a list")
+
+    for index, rule in enumerate(rules, 1):
+        if not isinstance(rule, dict):
+            raise ConfigError(f"usb_rules entry #{index} must be a mapping")
+        if "platform" not in rule:
+            raise ConfigError(f"usb_rules entry #{index} has no platform")
+        for key in ("vendor_id", "product_id"):
+            if rule.get(key) is not None:
+                rule[key] = normalize_id(rule[key])
+        keywords = rule.get("description_keywords")
+        if keywords is not None and not isinstance(keywords, list):
+            raise ConfigError(f"usb_rules entry #{index}: description_keywords must be a list")
+
+    result["usb_rules"] = rules
+    return result
+
+
+def _yaml():
+    """Import PyYAML on demand; it is optional and only needed on a cache miss."""
+    try:
+        import yaml
+    except ImportError:  # pragma: no cover - PyYAML is optional for tron_shell
+        return None
+    return yaml
+
+
+def _parse_yaml(path: str) -> Any:
+    """Parse a YAML file, using libyaml's C loader when it is available."""
+    yaml = _yaml()
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(path, "rb") as f:
+        return yaml.load(f, Loader=loader)
+
+
+def _cache_file(path: str) -> Path:
+    digest = hashlib.sha1(path.encode("utf-8", "surrogateescape")).hexdigest()
+    return cache_dir() / f"config-{digest}.marshal"
+
+
+def _read_snapshot(cache_file: Path, key: Tuple) -> Optional[Dict[str, Any]]:
+    try:
+        with open(cache_file, "rb") as f:
+            snapshot_key, config = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    return config if snapshot_key == key else None
+
+
+def _write_snapshot(cache_file: Path, key: Tuple, config: Dict[str, Any]) -> None:
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_file.parent, prefix=".config-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                marshal.dump((key, config), f)
+            os.replace(tmp, cache_file)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except (OSError, ValueError):
+        # A read-only or full cache directory only costs us the speedup
+        pass
+
+
+def _copy(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a loaded configuration so callers cannot change the cached one."""
+    try:
+        # A marshal round trip copies plain data far faster than copy.deepcopy()
+        return marshal.loads(marshal.dumps(config))
+    except ValueError:
+        # YAML values marshal cannot take, such as unquoted dates
+        return copy.deepcopy(config)
+
+
+_loaded: Dict[Tuple, Dict[str, Any]] = {}
+
+
+def load_config(path: Optional[os.PathLike] = None, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Load and validate a YAML configuration file.
+
+    Args:
+        path: Configuration file (default_config_path() if not given)
+        use_cache: Use and refresh the on-disk snapshot of the parsed file
+
+    Returns:
+        Configuration dictionary; DEFAULT_CONFIG if there is no file or
+        PyYAML is not installed
+
+    Raises:
+        ConfigError: If the configuration is malformed
+    """
+    path = path or default_config_path()
+    if path is None or not os.path.exists(path):
+        return copy.deepcopy(DEFAULT_CONFIG)
+
+    path = os.path.abspath(os.fspath(path))
+    stat = os.stat(path)
+    key = (CACHE_FORMAT, path, stat.st_mtime_ns, stat.st_size)
+
+    if key in _loaded:
+        return _copy(_loaded[key])
+
+    config = None
+    cache_file = _cache_file(path)
+    if use_cache:
+        config = _read_snapshot(cache_file, key)
+
+    if config is None:
+        if _yaml() is None:
+            return copy.deepcopy(DEFAULT_CONFIG)
+        config = validate_config(_parse_yaml(path))
+        if use_cache:
+            _write_snapshot(cache_file, key, config)
+
+    _loaded[key] = config
+    return _copy(config)
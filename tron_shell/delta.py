@@ -0,0 +1,108 @@
+"""
+Delta flashing: find the sectors whose device contents differ from an image.
+
+A full flash leaves every sector the image touches holding the image bytes,
+with 0xFF wherever the image has no data. Delta flashing compares each such
+sector with the device (by an on-chip hash where the bootloader has one, by
+reading it back otherwise) and rewrites only the sectors that differ.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, List, Sequence, Tuple
+
+from .firmware import Segment
+
+# Returns the (start, end) of the erase sector containing an address
+SectorOf = Callable[[int], Tuple[int, int]]
+
+# Returns True if the device already holds ``data`` at ``address``
+Unchanged = Callable[[int, bytes], bool]
+
+
+def fixed_sectors(size: int) -> SectorOf:
+    """Sector lookup for flash made of equally sized sectors."""
+
+    def sector_of(address: int) -> Tuple[int, int]:
+        start = address - address % size
+        return start, start + size
+
+    return sector_of
+
+
+def covered_sectors(segments: Sequence[Segment], sector_of: SectorOf) -> List[Tuple[int, int]]:
+    """
+    List the sectors an image touches.
+
+    Returns:
+        Sorted (start, end) ranges of every sector overlapping a segment
+    """
+    sectors = set()
+    for address, data in segments:
+        end = address + len(data)
+        while address < end:
+            sector = sector_of(address)
+            sectors.add(sector)
+            address = sector[1]
+    return sorted(sectors)
+
+
+def sector_image(segments: Sequence[Segment], start: int, end: int, fill: int = 0xFF) -> bytes:
+    """Return what a sector holds after a full flash of the image."""
+    sector = bytearray([fill]) * (end - start)
+    for address, data in segments:
+        low = max(address, start)
+        high = min(address + len(data), end)
+        if low < high:
+            sector[low - start : high - start] = data[low - address : high - address]
+    return bytes(sector)
+
+
+@dataclass
+class DeltaPlan:
+    """Sectors of an image that differ from the device."""
+
+    sectors: List[Tuple[int, int]] = field(default_factory=list)
+    changed: List[Segment] = field(default_factory=list)
+
+    @property
+    def unchanged(self) -> int:
+        """Number of sectors that already match."""
+        return len(self.sectors) - len(self.changed)
+
+    def segments(self) -> List[Segment]:
+        """Changed sectors, with adjacent ones coalesced into runs."""
+        runs: List[Tuple[int, List[bytes]]] = []
+        end = None
+        for address, data in self.changed:
+            if runs and address == end:
+                runs[-1][1].append(data)
+            else:
+                runs.append((address, [data]))
+            end = address + len(data)
+        return [(address, b"".join(parts)) for address, parts in runs]
+
+
+def plan_delta(
+    segments: Sequence[Segment],
+    sector_of: SectorOf,
+    unchanged: Unchanged,
+    fill: int = 0xFF,
+) -> DeltaPlan:
+    """
+    Compare an image with the device sector by sector.
+
+    Args:
+        segments: (address, data) segments of the image
+        sector_of: Erase sector lookup for the device
+        unchanged: Device comparison for one sector's expected contents
+        fill: Value of erased flash
+
+    Returns:
+        DeltaPlan whose segments() are the sectors to rewrite
+    """
+    plan = DeltaPlan(covered_sectors(segments, sector_of))
+    for start, end in plan.sectors:
+        expected = sector_image(segments, start, end, fill)
+        if not unchanged(start, expected):
+            plan.changed.append((start, expected))
+    return plan
@@ -0,0 +1,311 @@
+"""
+Firmware image loading.
+
+A FirmwareImage is a sparse map of flash contents: sorted, non-overlapping
+(address, memoryview) segments. Intel HEX files are decoded in bulk into one
+buffer; raw binaries and ELF files are memory-mapped, so even multi-megabyte
+images are parsed once and shared by every backend without copying.
+"""
+
+import os
+import mmap
+import bisect
+import struct
+import binascii
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+from .flasher import FlashError
+
+Segment = Tuple[int, Union[bytes, memoryview]]
+
+HEX_SUFFIXES = (".hex", ".ihex", ".ihx")
+ELF_MAGIC = b"\x7fELF"
+PT_LOAD = 1
+
+
+def iter_pages(
+    segments: Sequence[Segment], page_size: int, fill: int = 0xFF
+) -> Iterator[Tuple[int, Union[bytes, memoryview]]]:
+    """
+    Split sorted, non-overlapping segments into page-aligned pages.
+
+    Pages lying wholly inside one segment are yielded as views into it;
+    pages only partly covered are copied and padded with ``fill``.
+
+    Args:
+        segments: (address, data) segments sorted by address
+        page_size: Page size in bytes
+        fill: Value for bytes of a page not covered by any segment
+
+    Yields:
+        (page address, page contents) in address order
+    """
+    partial: Optional[bytearray] = None
+    partial_address = None
+
+    for address, data in segments:
+        data = memoryview(data)
+        end = address + len(data)
+        offset = 0
+        while offset < len(data):
+            current = address + offset
+            page = current - current % page_size
+            count = min(page + page_size, end) - current
+
+            if partial is not None and partial_address != page:
+                yield partial_address, bytes(partial)
+                partial = None
+
+            if count == page_size:
+                yield page, data[offset : offset + page_size]
+            else:
+                if partial is None:
+                    partial = bytearray([fill]) * page_size
+                    partial_address = page
+                partial[current - page : current - page + count] = data[offset : offset + count]
+            offset += count
+
+    if partial is not None:
+        yield partial_address, bytes(partial)
+
+
+@dataclass
+class WritePlan:
+    """Pages of an image that actually need writing after an erase."""
+
+    page_size: int
+    pages: List[Tuple[int, Union[bytes, memoryview]]] = field(default_factory=list)
+    skipped: List[int] = field(default_factory=list)
+
+    def runs(self) -> List[Segment]:
+        """Coalesce consecutive pages into (address, data) runs."""
+        runs: List[Tuple[int, List[Union[bytes, memoryview]]]] = []
+        for address, page in self.pages:
+            if runs and runs[-1][0] + len(runs[-1][1]) * self.page_size == address:
+                runs[-1][1].append(page)
+            else:
+                runs.append((address, [page]))
+        return [(address, b"".join(pages)) for address, pages in runs]
+
+
+def plan_writes(segments: Sequence[Segment], page_size: int, erased: int = 0xFF) -> WritePlan:
+    """
+    Drop pages that hold nothing but the erased value.
+
+    Only valid for backends that erase the whole image range before writing:
+    a skipped page is then already in its final state. Each page is compared
+    against a precomputed blank page with a single memcmp.
+
+    Args:
+        segments: (address, data) segments sorted by address
+        page_size: Write granularity in bytes
+        erased: Value of an erased flash byte
+
+    Returns:
+        WritePlan listing the pages to write and the addresses skipped
+    """
+    blank = bytes([erased]) * page_size
+    plan = WritePlan(page_size)
+    for address, page in iter_pages(segments, page_size, erased):
+        if blank.startswith(page):
+            plan.skipped.append(address)
+        else:
+            plan.pages.append((address, page))
+    return plan
+
+
+class FirmwareImage:
+    """Flash contents loaded from a firmware file."""
+
+    def __init__(
+        self,
+        segments: List[Segment],
+        entry: Optional[int] = None,
+        path: Optional[str] = None,
+        mapping: Optional[mmap.mmap] = None,
+    ):
+        self.segments = sorted(segments, key=lambda segment: segment[0])
+        self.entry = entry
+        self.path = path
+        self._mapping = mapping
+
+        for (address, data), (next_address, _) in zip(self.segments, self.segments[1:]):
+            if address + len(data) > next_address:
+                raise FlashError(f"Overlapping segments at 0x{next_address:08X}")
+
+    @classmethod
+    def load(cls, path: Union[str, os.PathLike], base_address: int = 0) -> "FirmwareImage":
+        """
+        Load a firmware file.
+
+        Args:
+            path: Intel HEX (.hex/.ihex/.ihx), ELF (.elf) or raw binary file
+            base_address: Load address for raw binaries
+
+        Returns:
+            FirmwareImage with the file's flash contents
+
+        Raises:
+            FlashError: If the file is missing or malformed
+        """
+        path = Path(path)
+        if not path.exists():
+            raise FlashError(f"Firmware file not found: {path}")
+
+        if path.suffix.lower() in HEX_SUFFIXES:
+            return cls._load_hex(path)
+
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return cls([], path=str(path))
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if mapping[:4] == ELF_MAGIC:
+            return cls._load_elf(path, mapping)
+        return cls([(base_address, memoryview(mapping))], path=str(path), mapping=mapping)
+
+    @classmethod
+    def _load_hex(cls, path: Path) -> "FirmwareImage":
+        lines = path.read_bytes().split()
+        for number, line in enumerate(lines, 1):
+            if not line.startswith(b":"):
+                raise FlashError(f"{path}:{number}: not an Intel HEX record")
+        try:
+            raw = memoryview(binascii.unhexlify(b"".join(line[1:] for line in lines)))
+        except (binascii.Error, ValueError):
+            raise FlashError(f"{path}: invalid hex digits")
+
+        # Walk the records, remembering where each data record's bytes are in raw
+        records = []
+        upper = 0
+        entry = None
+        position = 0
+        for number, line in enumerate(lines, 1):
+            length = raw[position] if position < len(raw) else -1
+            size = length + 5
+            if (
+                length < 0
+                or len(line) != 2 * size + 1
+                or sum(raw[position : position + size]) & 0xFF
+            ):
+                raise FlashError(f"{path}:{number}: bad record length or checksum")
+
+            kind = raw[position + 3]
+            data_start = position + 4
+            if kind == 0x00:
+                address = upper + (raw[position + 1] << 8 | raw[position + 2])
+                records.append((address, data_start, data_start + length))
+            elif kind == 0x01:
+                break
+            elif kind == 0x02:
+                upper = int.from_bytes(raw[data_start : data_start + 2], "big") << 4
+            elif kind == 0x04:
+                upper = int.from_bytes(raw[data_start : data_start + 2], "big") << 16
+            elif kind in (0x03, 0x05):
+                entry = int.from_bytes(raw[data_start : data_start + length], "big")
+            position += size
+
+        # Lay contiguous runs out back to back in a single buffer
+        runs: List[List[int]] = []
+        for address, start, end in sorted(records):
+            stop = address + end - start
+            if runs and address <= runs[-1][1]:
+                runs[-1][1] = max(runs[-1][1], stop)
+            else:
+                runs.append([address, stop])
+
+        offsets = []
+        total = 0
+        for start, stop in runs:
+            offsets.append(total)
+            total += stop - start
+        buffer = bytearray(b"\xff") * total
+
+        run_starts = [start for start, _ in runs]
+        for address, start, end in records:
+            index = bisect.bisect_right(run_starts, address) - 1
+            offset = offsets[index] + address - runs[index][0]
+            buffer[offset : offset + end - start] = raw[start:end]
+
+        view = memoryview(buffer)
+        segments = [
+            (start, view[offset : offset + stop - start])
+            for (start, stop), offset in zip(runs, offsets)
+        ]
+        return cls(segments, entry=entry, path=str(path))
+
+    @classmethod
+    def _load_elf(cls, path: Path, mapping: mmap.mmap) -> "FirmwareImage":
+        view = memoryview(mapping)
+        if len(view) < 52 or view[4] not in (1, 2) or view[5] not in (1, 2):
+            raise FlashError(f"{path}: unsupported ELF header")
+
+        is64 = view[4] == 2
+        order = "<" if view[5] == 1 else ">"
+        if is64:
+            entry, phoff = struct.unpack_from(order + "QQ", view, 24)
+            phentsize, phnum = struct.unpack_from(order + "HH", view, 54)
+            header = order + "IIQQQQQQ"
+        else:
+            entry, phoff = struct.unpack_from(order + "II", view, 24)
+            phentsize, phnum = struct.unpack_from(order + "HH", view, 42)
+            header = order + "IIIIIIII"
+
+        segments = []
+        for index in range(phnum):
+            fields = struct.unpack_from(header, view, phoff + index * phentsize)
+            if is64:
+                p_type, _, p_offset, _, p_paddr, p_filesz, _, _ = fields
+            else:
+                p_type, p_offset, _, p_paddr, p_filesz, _, _, _ = fields
+            if p_type != PT_LOAD or not p_filesz:
+                continue
+            if p_offset + p_filesz > len(view):
+                raise FlashError(f"{path}: segment {index} extends past end of file")
+            # Flash images are placed at the load (physical) address
+            segments.append((p_paddr, view[p_offset : p_offset + p_filesz]))
+
+        return cls(segments, entry=entry, path=str(path), mapping=mapping)
+
+    @property
+    def size(self) -> int:
+        """Number of bytes of flash the image covers."""
+        return sum(len(data) for _, data in self.segments)
+
+    @property
+    def start(self) -> Optional[int]:
+        """Lowest address in the image."""
+        return self.segments[0][0] if self.segments else None
+
+    @property
+    def end(self) -> Optional[int]:
+        """Address just past the highest byte in the image."""
+        if not self.segments:
+            return None
+        address, data = self.segments[-1]
+        return address + len(data)
+
+    def chunks(
+        self, page_size: int, fill: int = 0xFF
+    ) -> Iterator[Tuple[int, Union[bytes, memoryview]]]:
+        """Iterate over the image as page-aligned pages (see iter_pages())."""
+        return iter_pages(self.segments, page_size, fill)
+
+    def close(self) -> None:
+        """Release the memory mapping of a binary or ELF image."""
+        self.segments = []
+        if self._mapping is not None:
+            try:
+                self._mapping.close()
+            except BufferError:
+                # A caller still holds a view; the mapping goes away with it
+                pass
+            self._mapping = None
+
+    def __enter__(self) -> "FirmwareImage":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -2,11 +2,15 @@
 Platform-specific firmware flashing implementations.
 """
 
-import subprocess
+import time
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Tuple
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 from pathlib import Path
 
+T = TypeVar("T")
+
 
 class FlashError(Exception):
     """Exception raised when firmware flashing fails."""
@@ -20,6 +24,10 @@ class PlatformFlasher(ABC):
     def __init__(self, port: str, verbose: bool = False):
         self.port = port
         self.verbose = verbose
+        # ProgramResult of the last in-process flash, reused by verify()
+        self.last_result = None
+        # How the last verify() checked the device (see tron_shell.verify)
+        self.verify_method: Optional[str] = None
 
     @abstractmethod
     def flash(self, firmware_path: str, **kwargs) -> bool:
@@ -36,43 +44,112 @@ class PlatformFlasher(ABC):
         pass
 
     @abstractmethod
-    def verify(self, firmware_path: str) -> bool:
+    def verify(self, firmware_path: str, **kwargs) -> bool:
         """
         Verify flashed firmware.
 
         Args:
             firmware_path: Path to firmware file
+            **kwargs: Platform-specific options, as for flash()
 
         Returns:
             True if verification successful
         """
         pass
 
-    def _run_command(self, cmd: List[str]) -> Tuple[bool, str]:
+    def _reuse_verify(self) -> Optional[bool]:
+        """Return the outcome of the check made while flashing in-process, if any."""
+        self.verify_method = None
+        if self.last_result is None or self.last_result.verified is None:
+            return None
+        self.verify_method = self.last_result.verify_method
+        return self.last_result.verified
+
+    def _checkpoint(self, segments, options: Dict):
+        """
+        Open the resume journal entry for this board and image.
+
+        Returns:
+            FlashCheckpoint, or None if resuming is off or the board has no
+            USB serial number to recognise it by after re-enumeration
+        """
+        if not options.get("resume", True):
+            return None
+        serial_number = options.get("serial_number")
+        if serial_number is None:
+            from .usb_detector import USBDetector
+
+            device = USBDetector.find_device_by_port(self.port)
+            serial_number = device.serial_number if device else None
+        if not serial_number:
+            return None
+
+        from .journal import FlashCheckpoint
+
+        return FlashCheckpoint(serial_number, segments)
+
+    @contextmanager
+    def session(self, **options) -> Iterator[None]:
+        """
+        Keep the port open across the reset, flash and verify of one operation.
+
+        The in-process serial engines (``method`` set to anything but
+        ``"dfu"``) lease the pooled handle for the port, so holding a lease
+        here makes them share one open handle instead of reopening, and
+        resetting, the board at each step. External tools open the port
+        themselves, so nothing is held for them.
+        """
+        if options.get("method") in (None, "dfu"):
+            yield
+            return
+
+        from .session import get_pool
+
+        with get_pool().lease(self.port):
+            yield
+
+    def _record_verify(self, report) -> bool:
+        """Take a VerifyReport from a standalone verify session."""
+        self.verify_method = report.method
+        if self.verbose:
+            print(
+                f"Verified by {report.method} ({report.bytes_read} bytes read): "
+                f"image {report.image_digest}, device {report.device_digest}"
+            )
+        return report.verified
+
+    def _run_command(
+        self, cmd: List[str], progress: Optional[Callable[[str, float], None]] = None
+    ) -> Tuple[bool, str]:
         """
         Run a shell command and return result.
 
+        Output is streamed (printed line by line when verbose) and the command
+        is killed if it prints nothing for INACTIVITY_TIMEOUT seconds.
+
         Args:
             cmd: Command and arguments as list
+            progress: Called with (stage, percent) as the tool reports progress
 
         Returns:
-            Tuple of (success, output)
+            Tuple of (success, output), output being the last lines printed
         """
+        from .process import INACTIVITY_TIMEOUT, run_streaming
+
         try:
             if self.verbose:
                 print(f"Running: {' '.join(cmd)}")
 
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+            result = run_streaming(
+                cmd, on_line=print if self.verbose else None, on_progress=progress
+            )
 
-            output = result.stdout + result.stderr
+            if result.stalled:
+                return False, (
+                    f"Command stalled (no output for {INACTIVITY_TIMEOUT:.0f}s)\n{result.output}"
+                )
+            return result.returncode == 0, result.output
 
-            if self.verbose:
-                print(output)
-
-            return result.returncode == 0, output
-
-        except subprocess.TimeoutExpired:
-            return False, "Command timed out"
         except Exception as e:
             return False, str(e)
 
@@ -85,55 +162,235 @@ class ArduinoFlasher(PlatformFlasher):
         self.board = board
 
     def flash(self, firmware_path: str, **kwargs) -> bool:
-        """Flash using avrdude (Arduino bootloader)."""
+        """
+        Flash using the Arduino bootloader.
+
+        Pass ``method="stk500"`` to program the board in-process over the
+        bootloader's STK500v1 protocol; the written pages are read back in the
+        same session, so verify() needs no second pass. With ``delta=True``
+        only pages that differ from the board's flash are written. Progress
+        is journaled by USB serial number, so a flash interrupted by a
+        disconnect resumes where it stopped (``resume=False`` turns this off).
+        """
         board = kwargs.get("board", self.board)
         baud = kwargs.get("baud", 115200)
+        method = kwargs.get("method", "avrdude")
 
-        # This is a simulation - in real implementation would use avrdude
         if not Path(firmware_path).exists():
             raise FlashError(f"Firmware file not found: {firmware_path}")
 
         if self.verbose:
             print(f"Flashing {firmware_path} to {self.port}")
-            print(f"Board: {board}, Baud: {baud}")
+            print(f"Board: {board}, Baud: {baud}, Method: {method}")
 
-        # Simulate successful flash
+        if method == "stk500":
+            return self._flash_stk500(firmware_path, baud, kwargs)
+
+        # This is a simulation - in real implementation would use avrdude
+        self.last_result = None
         return True
 
-    def verify(self, firmware_path: str) -> bool:
-        """Verify firmware (simulation)."""
+    @contextmanager
+    def _stk500_session(self, baud: int):
+        """Open the port, run the bootloader and yield a synced STK500Programmer."""
+        import serial
+
+        from .bootloader import RESET_PULSE, port_vid_pid, stk500_probe, wait_for_bootloader
+        from .protocols.stk500 import STK500Programmer
+        from .session import get_pool
+
+        pool = get_pool()
+        try:
+            with pool.lease(self.port, baudrate=baud, timeout=1) as ser:
+                # A reset earlier in the same session() already left Optiboot running
+                if not pool.claim_bootloader(self.port, "stk500"):
+                    # Pulse DTR to run the bootloader, as the Arduino IDE does
+                    ser.dtr = False
+                    time.sleep(RESET_PULSE)
+                    ser.dtr = True
+                    # Start talking as soon as it answers; sync() reports a no-show
+                    wait_for_bootloader(ser, stk500_probe, port_vid_pid(self.port))
+                programmer = STK500Programmer(ser)
+                programmer.sync()
+                programmer.identify()
+                yield programmer
+        except serial.SerialException as e:
+            raise FlashError(f"Cannot open {self.port}: {e}")
+
+    def _flash_stk500(self, firmware_path: str, baud: int, options: Dict) -> bool:
+        from .firmware import FirmwareImage
+
+        segments = FirmwareImage.load(firmware_path).segments
+        checkpoint = self._checkpoint(segments, options)
+        with self._stk500_session(baud) as programmer:
+            if checkpoint is not None:
+
+                def written(done):
+                    programmer.enter_progmode()
+                    return programmer.verify(done).verified
+
+                segments = checkpoint.remaining(written)
+            self.last_result = programmer.program(
+                segments,
+                verify=options.get("verify", True),
+                delta=options.get("delta", False),
+                progress=checkpoint.advance if checkpoint is not None else None,
+            )
+        if checkpoint is not None:
+            checkpoint.finish()
+
+        if self.verbose:
+            result = self.last_result
+            print(
+                f"Wrote {result.pages_written} pages in {result.elapsed:.2f}s "
+                f"({result.sectors_unchanged} unchanged)"
+            )
         return True
 
+    def verify(self, firmware_path: str, **kwargs) -> bool:
+        """
+        Verify firmware, reusing the read-back of an in-process flash.
+
+        Otherwise, with ``method="stk500"`` the image's pages are read back in
+        a new bootloader session; above ``max_read`` bytes only a sample is.
+        """
+        verified = self._reuse_verify()
+        if verified is not None:
+            return verified
+        if kwargs.get("method") != "stk500":
+            return True
+
+        from .firmware import FirmwareImage
+
+        segments = FirmwareImage.load(firmware_path).segments
+        with self._stk500_session(kwargs.get("baud", 115200)) as programmer:
+            programmer.enter_progmode()
+            report = programmer.verify(segments, kwargs.get("max_read"))
+            programmer.leave_progmode()
+        return self._record_verify(report)
+
 
 class ESP32Flasher(PlatformFlasher):
     """Flasher for ESP32/ESP8266 boards."""
 
     def flash(self, firmware_path: str, **kwargs) -> bool:
-        """Flash using esptool."""
+        """
+        Flash using esptool.
+
+        Pass ``method="rom"`` to talk to the ROM loader in-process: the image
+        is uploaded deflate-compressed at ``baud`` and checked against an
+        on-chip MD5, so verify() needs no read-back. With ``delta=True`` only
+        the 4 KB sectors whose on-chip MD5 differs are rewritten. As with
+        ArduinoFlasher, an interrupted flash resumes unless ``resume=False``.
+        """
         baud = kwargs.get("baud", 460800)
         flash_mode = kwargs.get("flash_mode", "dio")
         flash_freq = kwargs.get("flash_freq", "40m")
+        method = kwargs.get("method", "esptool")
 
         if not Path(firmware_path).exists():
             raise FlashError(f"Firmware file not found: {firmware_path}")
 
         if self.verbose:
             print(f"Flashing {firmware_path} to {self.port}")
-            print(f"Baud: {baud}, Mode: {flash_mode}, Freq: {flash_freq}")
+            print(f"Baud: {baud}, Mode: {flash_mode}, Freq: {flash_freq}, Method: {method}")
+
+        if method == "rom":
+            return self._flash_rom(firmware_path, baud, kwargs)
 
         # Simulate successful flash
+        self.last_result = None
         return True
 
-    def verify(self, firmware_path: str) -> bool:
-        """Verify firmware (simulation)."""
+    @contextmanager
+    def _rom_session(self, baud: int, options: Dict):
+        """Reset into the ROM loader and yield an ESPLoader with flash attached."""
+        import serial
+
+        from .protocols.esp_rom import ROM_BAUD, ESPLoader, classic_reset
+        from .session import get_pool
+
+        try:
+            with get_pool().lease(self.port, baudrate=ROM_BAUD, timeout=0.05) as ser:
+                if options.get("reset", True):
+                    classic_reset(ser)
+                loader = ESPLoader(ser)
+                loader.sync()
+                loader.detect_chip()
+                loader.change_baud(baud)
+                loader.attach_flash(options.get("flash_size", 4 * 1024 * 1024))
+                yield loader
+        except serial.SerialException as e:
+            raise FlashError(f"Cannot open {self.port}: {e}")
+
+    def _flash_rom(self, firmware_path: str, baud: int, options: Dict) -> bool:
+        from .firmware import FirmwareImage
+
+        with self._rom_session(baud, options) as loader:
+            address = options.get("address", loader.chip.app_offset)
+            segments = FirmwareImage.load(firmware_path, base_address=address).segments
+            checkpoint = self._checkpoint(segments, options)
+            if checkpoint is not None:
+
+                def written(done):
+                    report = loader.verify(done)
+                    return report is not None and report.verified
+
+                segments = checkpoint.remaining(written)
+            self.last_result = loader.program(
+                segments,
+                verify=options.get("verify", True),
+                delta=options.get("delta", False),
+                progress=checkpoint.advance if checkpoint is not None else None,
+            )
+        if checkpoint is not None:
+            checkpoint.finish()
+
+        if self.verbose:
+            result = self.last_result
+            print(
+                f"Wrote {result.bytes_written} bytes in {result.elapsed:.2f}s "
+                f"({result.sectors_unchanged} sector(s) unchanged)"
+            )
         return True
 
+    def verify(self, firmware_path: str, **kwargs) -> bool:
+        """
+        Verify firmware, reusing the on-chip MD5 of an in-process flash.
+
+        Otherwise, with ``method="rom"`` the ROM loader hashes the image's
+        ranges in a new session; nothing is read back.
+        """
+        verified = self._reuse_verify()
+        if verified is not None:
+            return verified
+        if kwargs.get("method") != "rom":
+            return True
+
+        from .firmware import FirmwareImage
+
+        with self._rom_session(kwargs.get("baud", 460800), kwargs) as loader:
+            address = kwargs.get("address", loader.chip.app_offset)
+            segments = FirmwareImage.load(firmware_path, base_address=address).segments
+            report = loader.verify(segments)
+            # The ESP8266 ROM cannot hash flash
+            return True if report is None else self._record_verify(report)
+
 
 class STM32Flasher(PlatformFlasher):
     """Flasher for STM32 boards."""
 
     def flash(self, firmware_path: str, **kwargs) -> bool:
-        """Flash using st-flash or dfu-util."""
+        """
+        Flash using st-flash or dfu-util.
+
+        Pass ``method="uart"`` to program through the USART system bootloader
+        in-process: only the sectors the image covers are erased, and the
+        result is checked with the bootloader's CRC command when available.
+        ``method="dfu"`` does the same over USB DFU with pyusb. With
+        ``delta=True`` only sectors that differ from the device are erased and
+        rewritten.
+        """
         method = kwargs.get("method", "stlink")
 
         if not Path(firmware_path).exists():
@@ -143,11 +400,122 @@ class STM32Flasher(PlatformFlasher):
             print(f"Flashing {firmware_path} to {self.port}")
             print(f"Method: {method}")
 
+        if method == "uart":
+            return self._flash_uart(firmware_path, kwargs.get("baud", 115200), kwargs)
+        if method == "dfu":
+            return self._flash_dfu(firmware_path, kwargs)
+
         # Simulate successful flash
+        self.last_result = None
         return True
 
-    def verify(self, firmware_path: str) -> bool:
-        """Verify firmware (simulation)."""
+    @contextmanager
+    def _uart_session(self, baud: int):
+        """Open the port and yield a connected STM32Bootloader."""
+        import serial
+
+        from .protocols.stm32_uart import STM32Bootloader
+        from .session import get_pool
+
+        try:
+            with get_pool().lease(
+                self.port, baudrate=baud, parity=serial.PARITY_EVEN, timeout=0.5
+            ) as ser:
+                bootloader = STM32Bootloader(ser)
+                bootloader.connect()
+                yield bootloader
+        except serial.SerialException as e:
+            raise FlashError(f"Cannot open {self.port}: {e}")
+
+    def _flash_uart(self, firmware_path: str, baud: int, options: Dict) -> bool:
+        from .firmware import FirmwareImage
+        from .protocols.stm32_uart import FLASH_BASE
+
+        segments = FirmwareImage.load(
+            firmware_path, base_address=options.get("address", FLASH_BASE)
+        ).segments
+        with self._uart_session(baud) as bootloader:
+            self.last_result = bootloader.program(
+                segments,
+                verify=options.get("verify", True),
+                skip_blank=options.get("skip_blank", True),
+                delta=options.get("delta", False),
+            )
+
+        if self.verbose:
+            result = self.last_result
+            print(
+                f"Wrote {result.bytes_written} bytes in {result.elapsed:.2f}s "
+                f"({result.pages_skipped} blank page(s) skipped, "
+                f"{result.sectors_unchanged} sector(s) unchanged)"
+            )
+        return True
+
+    def _dfu_image(self, firmware_path: str, options: Dict):
+        """Find the DFU device and load the image at its flash base."""
+        from .firmware import FirmwareImage
+        from .protocols.dfu import ST_DFU_PID, ST_VID, find_dfu_devices
+        from .protocols.stm32_uart import FLASH_BASE
+
+        devices = find_dfu_devices(
+            options.get("vid", ST_VID),
+            options.get("pid", ST_DFU_PID),
+            options.get("serial_number"),
+        )
+        if not devices:
+            raise FlashError("No DFU device found. Is the board in DFU mode (BOOT0 high)?")
+
+        dfu = devices[0]
+        base = dfu.layout.start if dfu.layout and dfu.layout.start is not None else FLASH_BASE
+        segments = FirmwareImage.load(
+            firmware_path, base_address=options.get("address", base)
+        ).segments
+        return dfu, segments
+
+    def _flash_dfu(self, firmware_path: str, options: Dict) -> bool:
+        dfu, segments = self._dfu_image(firmware_path, options)
+        self.last_result = dfu.program(
+            segments,
+            verify=options.get("verify", True),
+            skip_blank=options.get("skip_blank", True),
+            delta=options.get("delta", False),
+        )
+
+        if self.verbose:
+            result = self.last_result
+            print(
+                f"Wrote {result.bytes_written} bytes in {result.elapsed:.2f}s "
+                f"({result.pages_skipped} blank page(s) skipped, "
+                f"{result.sectors_unchanged} sector(s) unchanged)"
+            )
+        return True
+
+    def verify(self, firmware_path: str, **kwargs) -> bool:
+        """
+        Verify firmware, reusing the checksum of an in-process flash.
+
+        Otherwise, ``method="uart"`` checks the image's ranges in a new
+        bootloader session (by CRC when the bootloader offers it), and
+        ``method="dfu"`` reads them back over USB. Read-backs above
+        ``max_read`` bytes are sampled.
+        """
+        verified = self._reuse_verify()
+        if verified is not None:
+            return verified
+
+        method = kwargs.get("method")
+        if method == "uart":
+            from .firmware import FirmwareImage
+            from .protocols.stm32_uart import FLASH_BASE
+
+            segments = FirmwareImage.load(
+                firmware_path, base_address=kwargs.get("address", FLASH_BASE)
+            ).segments
+            with self._uart_session(kwargs.get("baud", 115200)) as bootloader:
+                return self._record_verify(bootloader.verify(segments, kwargs.get("max_read")))
+        if method == "dfu":
+            dfu, segments = self._dfu_image(firmware_path, kwargs)
+            return self._record_verify(dfu.verify(segments, kwargs.get("max_read")))
         return True
 
 
@@ -166,11 +534,186 @@ class GenericFlasher(PlatformFlasher):
         # Simulate successful flash
         return True
 
-    def verify(self, firmware_path: str) -> bool:
+    def verify(self, firmware_path: str, **kwargs) -> bool:
         """Verify firmware (simulation)."""
         return True
 
 
+class TopologyScheduler:
+    """
+    Limits how many devices are flashed at once behind the same USB hub.
+
+    Ports are grouped by their USB location (e.g. ``1-1.2.3:1.0``): the hub is
+    the parent of the device in the port chain (``1-1.2``) and the root port is
+    the first-level port on the bus (``1-1``). Devices with no known location are
+    never limited.
+    """
+
+    def __init__(self, per_hub: Optional[int] = 4, per_root_port: Optional[int] = 8):
+        self.per_hub = per_hub
+        self.per_root_port = per_root_port
+        self._active: Dict[str, int] = {}
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def topology(location: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Split a USB location into its root port and hub.
+
+        Args:
+            location: USB location as reported by pyserial
+
+        Returns:
+            Tuple of (root_port, hub), both None if the location is unknown
+        """
+        if not location or "-" not in location:
+            return None, None
+
+        path = location.split(":", 1)[0]
+        bus, _, ports = path.partition("-")
+        chain = ports.split(".")
+        if not bus or not chain[0]:
+            return None, None
+
+        root_port = f"{bus}-{chain[0]}"
+        hub = f"{bus}-{'.'.join(chain[:-1])}" if len(chain) > 1 else f"usb{bus}"
+        return root_port, hub
+
+    def _limits(self, location: Optional[str]) -> List[Tuple[str, int]]:
+        root_port, hub = self.topology(location)
+        limits = []
+        if root_port and self.per_root_port:
+            limits.append((f"root:{root_port}", self.per_root_port))
+        if hub and self.per_hub:
+            limits.append((f"hub:{hub}", self.per_hub))
+        return limits
+
+    def _available(self, location: Optional[str]) -> bool:
+        return all(self._active.get(key, 0) < limit for key, limit in self._limits(location))
+
+    def _reserve(self, location: Optional[str]) -> None:
+        for key, _ in self._limits(location):
+            self._active[key] = self._active.get(key, 0) + 1
+
+    def try_acquire(self, location: Optional[str]) -> bool:
+        """
+        Reserve a flashing slot for a location without blocking.
+
+        Returns:
+            True if the slot was reserved
+        """
+        with self._cond:
+            if not self._available(location):
+                return False
+            self._reserve(location)
+            return True
+
+    def acquire(self, location: Optional[str]) -> None:
+        """Block until a flashing slot for the location is free and reserve it."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._available(location))
+            self._reserve(location)
+
+    def release(self, location: Optional[str]) -> None:
+        """Release a slot previously reserved for the location."""
+        with self._cond:
+            for key, _ in self._limits(location):
+                self._active[key] -= 1
+                if not self._active[key]:
+                    del self._active[key]
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, location: Optional[str]) -> Iterator[None]:
+        """Context manager holding a flashing slot for the location."""
+        self.acquire(location)
+        try:
+            yield
+        finally:
+            self.release(location)
+
+    def take(self, pending: List[T], location: Callable[[T], Optional[str]]) -> Optional[T]:
+        """
+        Remove and return the first pending item whose hub has a free slot.
+
+        Blocks while every pending item is waiting on a busy hub, so worker
+        threads pick up work from idle hubs instead of queueing behind a full one.
+        The slot is reserved on return and must be released by the caller.
+
+        Args:
+            pending: Shared list of items still to be flashed
+            location: Function returning the USB location of an item
+
+        Returns:
+            The reserved item, or None once the list is empty
+        """
+        with self._cond:
+            while pending:
+                for index, item in enumerate(pending):
+                    if self._available(location(item)):
+                        del pending[index]
+                        self._reserve(location(item))
+                        return item
+                self._cond.wait()
+            return None
+
+    def order(self, items: List[T], location: Callable[[T], Optional[str]]) -> List[T]:
+        """
+        Interleave items across root ports and hubs.
+
+        Args:
+            items: Items to order
+            location: Function returning the USB location of an item
+
+        Returns:
+            Items reordered round-robin by root port, then by hub
+        """
+        groups: Dict[Tuple[Optional[str], Optional[str]], List[T]] = {}
+        for item in items:
+            groups.setdefault(self.topology(location(item)), []).append(item)
+
+        by_root: Dict[Optional[str], List[List[T]]] = {}
+        for (root_port, _), group in groups.items():
+            by_root.setdefault(root_port, []).append(group)
+
+        def round_robin(queues):
+            queues = [iter(queue) for queue in queues]
+            result = []
+            while queues:
+                remaining = []
+                for queue in queues:
+                    item = next(queue, None)
+                    if item is not None:
+                        result.append(item)
+                        remaining.append(queue)
+                queues = remaining
+            return result
+
+        return round_robin([round_robin(hubs) for hubs in by_root.values()])
+
+
+def flasher_family(platform: str) -> Optional[str]:
+    """
+    Return the flasher family a platform or chip name belongs to.
+
+    Args:
+        platform: Platform or chip name (arduino, atmega328p, esp32, stm32f4, ...)
+
+    Returns:
+        "arduino", "esp32" or "stm32", or None if only the generic flasher
+        would take it
+    """
+    platform_lower = platform.lower()
+
+    if "arduino" in platform_lower or "atmega" in platform_lower:
+        return "arduino"
+    elif "esp32" in platform_lower or "esp8266" in platform_lower or "espressif" in platform_lower:
+        return "esp32"
+    elif "stm32" in platform_lower or "stm" in platform_lower:
+        return "stm32"
+    return None
+
+
 def get_flasher(platform: str, port: str, verbose: bool = False) -> PlatformFlasher:
     """
     Get appropriate flasher for the platform.
@@ -183,13 +726,13 @@ def get_flasher(platform: str, port: str, verbose: bool = False) -> PlatformFlas
     Returns:
         Platform-specific flasher instance
     """
-    platform_lower = platform.lower()
+    family = flasher_family(platform)
 
-    if "arduino" in platform_lower:
+    if family == "arduino":
         return ArduinoFlasher(port, verbose)
-    elif "esp32" in platform_lower or "esp8266" in platform_lower or "espressif" in platform_lower:
+    elif family == "esp32":
         return ESP32Flasher(port, verbose)
-    elif "stm32" in platform_lower or "stm" in platform_lower:
+    elif family == "stm32":
         return STM32Flasher(port, verbose)
     else:
         return GenericFlasher(port, verbose)
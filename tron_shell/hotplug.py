@@ -0,0 +1,290 @@
+"""
+Serial port hotplug notifications.
+
+On Linux, device nodes appearing in and disappearing from /dev are reported
+through inotify as soon as the kernel creates them. Elsewhere the watcher
+falls back to polling the serial port list from a single shared thread.
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Set
+
+# inotify constants from <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+_WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_TO | IN_MOVED_FROM | IN_ATTRIB
+
+PORT_ADDED = "add"
+PORT_REMOVED = "remove"
+
+
+@dataclass(frozen=True)
+class PortEvent:
+    """A serial port appearing or disappearing."""
+
+    action: str
+    port: str
+
+
+class HotplugWatcher:
+    """
+    Watches for serial ports being added or removed.
+
+    Callbacks registered with subscribe() run on the watcher thread and should
+    return quickly.
+    """
+
+    def __init__(self, watch_dirs: Iterable[str] = ("/dev",), poll_interval: float = 0.1):
+        self.watch_dirs = [d for d in watch_dirs if os.path.isdir(d)]
+        self.poll_interval = poll_interval
+        self.mode: Optional[str] = None
+        self._subscribers: List[Callable[[PortEvent], None]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._inotify_fd: Optional[int] = None
+        self._wake_r: Optional[int] = None
+        self._wake_w: Optional[int] = None
+        self._watches = {}
+
+    def subscribe(self, callback: Callable[[PortEvent], None]) -> None:
+        """Register a callback for port events."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[PortEvent], None]) -> None:
+        """Remove a previously registered callback."""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def start(self) -> "HotplugWatcher":
+        """Start the watcher thread, using inotify when available."""
+        with self._lock:
+            if self._thread is not None:
+                return self
+
+            self._stopping.clear()
+            if self._open_inotify():
+                self.mode = "inotify"
+                target = self._inotify_loop
+            else:
+                self.mode = "poll"
+                target = self._poll_loop
+
+            self._thread = threading.Thread(target=target, name="tron-hotplug", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the watcher thread and release its resources."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+
+        self._stopping.set()
+        if self._wake_w is not None:
+            os.write(self._wake_w, b"\0")
+        thread.join()
+
+        for fd in (self._inotify_fd, self._wake_r, self._wake_w):
+            if fd is not None:
+                os.close(fd)
+        self._inotify_fd = self._wake_r = self._wake_w = None
+        self._watches = {}
+
+    @property
+    def running(self) -> bool:
+        """Return True if the watcher thread is running."""
+        return self._thread is not None
+
+    def _dispatch(self, event: PortEvent) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Hotplug subscriber error: {e}")
+
+    def _open_inotify(self) -> bool:
+        if not sys.platform.startswith("linux") or not self.watch_dirs:
+            return False
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return False
+
+            for directory in self.watch_dirs:
+                wd = libc.inotify_add_watch(fd, os.fsencode(directory), _WATCH_MASK)
+                if wd >= 0:
+                    self._watches[wd] = directory
+
+            if not self._watches:
+                os.close(fd)
+                return False
+
+        except (OSError, AttributeError):
+            return False
+
+        self._inotify_fd = fd
+        self._wake_r, self._wake_w = os.pipe()
+        return True
+
+    def _inotify_loop(self) -> None:
+        while not self._stopping.is_set():
+            readable, _, _ = select.select([self._inotify_fd, self._wake_r], [], [])
+            if self._inotify_fd not in readable:
+                continue
+
+            try:
+                data = os.read(self._inotify_fd, 64 * 1024)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    continue
+                raise
+
+            for event in self._parse_events(data):
+                self._dispatch(event)
+
+    def _parse_events(self, data: bytes) -> List[PortEvent]:
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+
+            port = os.path.join(directory, os.fsdecode(name))
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                events.append(PortEvent(PORT_REMOVED, port))
+            else:
+                # IN_ATTRIB follows udev fixing up permissions, which is when
+                # the port actually becomes usable
+                events.append(PortEvent(PORT_ADDED, port))
+        return events
+
+    def _poll_loop(self) -> None:
+        import serial.tools.list_ports
+
+        known: Optional[Set[str]] = None
+        while not self._stopping.wait(self.poll_interval):
+            with self._lock:
+                if not self._subscribers:
+                    known = None
+                    continue
+
+            current = {p.device for p in serial.tools.list_ports.comports()}
+            if known is not None:
+                for port in sorted(current - known):
+                    self._dispatch(PortEvent(PORT_ADDED, port))
+                for port in sorted(known - current):
+                    self._dispatch(PortEvent(PORT_REMOVED, port))
+            known = current
+
+    def wait_for(self, predicate: Callable[[PortEvent], bool], timeout: float) -> bool:
+        """
+        Block until an event matching the predicate arrives.
+
+        Args:
+            predicate: Function selecting the event to wait for
+            timeout: Maximum time to wait in seconds
+
+        Returns:
+            True if a matching event arrived before the timeout
+        """
+        matched = threading.Event()
+
+        def on_event(event: PortEvent) -> None:
+            if predicate(event):
+                matched.set()
+
+        self.subscribe(on_event)
+        try:
+            return matched.wait(timeout)
+        finally:
+            self.unsubscribe(on_event)
+
+
+_watcher: Optional[HotplugWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def get_watcher() -> HotplugWatcher:
+    """
+    Return the shared, running hotplug watcher.
+
+    Returns:
+        HotplugWatcher shared by all callers in this process
+    """
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = HotplugWatcher().start()
+        return _watcher
+
+
+def wait_for_event(port: str, action: str, timeout: float, present: Callable[[], bool]) -> bool:
+    """
+    Wait until a port is added or removed.
+
+    The presence check runs once up front (after subscribing, so no event can be
+    missed in between) and again only when an event for the port arrives or,
+    as a fallback for ports outside the watched directories, once per second.
+
+    Args:
+        port: Serial port to wait for
+        action: PORT_ADDED or PORT_REMOVED
+        timeout: Maximum time to wait in seconds
+        present: Function returning True if the port is currently present
+
+    Returns:
+        True if the port reached the requested state before the timeout
+    """
+    wanted = action == PORT_ADDED
+    changed = threading.Event()
+
+    def on_event(event: PortEvent) -> None:
+        if event.port == port:
+            changed.set()
+
+    watcher = get_watcher()
+    watcher.subscribe(on_event)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if present() == wanted:
+                return True
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+
+            changed.wait(min(remaining, 1.0))
+            changed.clear()
+    finally:
+        watcher.unsubscribe(on_event)
@@ -0,0 +1,157 @@
+"""
+Board identification shared by the tron_shell and tron_core stacks.
+
+Combines the VID:PID table in USBDetector.KNOWN_DEVICES with the detection
+rules from the YAML config, and remembers the answer for every device seen.
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import load_config
+from .rules import CompiledRules
+
+
+@dataclass(frozen=True)
+class BoardInfo:
+    """Result of identifying a device."""
+
+    name: str
+    platform: Optional[str] = None
+    rule: Optional[str] = None
+
+    @property
+    def known(self) -> bool:
+        """Return True if the device was recognized at all."""
+        return self.name != "Unknown"
+
+
+UNKNOWN = BoardInfo("Unknown")
+
+DeviceKey = Tuple[Optional[int], Optional[int], str, Optional[str], str]
+
+
+class BoardIdentifier:
+    """
+    Identifies boards from their USB IDs, description and port.
+
+    ``name`` comes from the KNOWN_DEVICES table and description heuristics, as
+    shown by ``tron list``; ``platform`` is the platform of the first matching
+    detection rule (e.g. ``atmega328p``). Devices only recognized by a rule are
+    named after that rule.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[List[Dict[str, Any]]] = None,
+        known_devices: Optional[Dict[Tuple[int, Optional[int]], str]] = None,
+        os_type: Optional[str] = None,
+    ):
+        if rules is None:
+            rules = load_config().get("usb_rules") or []
+        if known_devices is None:
+            from .usb_detector import USBDetector
+
+            known_devices = USBDetector.KNOWN_DEVICES
+
+        self.rules = CompiledRules(rules, os_type)
+        self.known_devices = known_devices
+        self._cache: Dict[DeviceKey, BoardInfo] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(device) -> DeviceKey:
+        return (device.vid, device.pid, device.description, device.serial_number, device.port)
+
+    def _known_name(self, device) -> str:
+        # Check exact VID:PID match
+        if device.vid and device.pid:
+            key = (device.vid, device.pid)
+            if key in self.known_devices:
+                return self.known_devices[key]
+
+        # Check VID-only match
+        if device.vid:
+            key = (device.vid, None)
+            if key in self.known_devices:
+                return self.known_devices[key]
+
+        # Check description for known patterns
+        desc_lower = device.description.lower()
+        if "arduino" in desc_lower:
+            return "Arduino"
+        elif "esp32" in desc_lower or "esp8266" in desc_lower:
+            return "Espressif"
+        elif "stm32" in desc_lower or "stlink" in desc_lower:
+            return "STM32"
+
+        return "Unknown"
+
+    def _identify(self, device) -> BoardInfo:
+        vid = f"{device.vid:04x}" if device.vid is not None else None
+        pid = f"{device.pid:04x}" if device.pid is not None else None
+        rule = self.rules.match(vid, pid, device.port, device.description)
+        name = self._known_name(device)
+
+        if rule is None:
+            return BoardInfo(name) if name != "Unknown" else UNKNOWN
+
+        description = rule.get("description", "Custom Rule")
+        if name == "Unknown":
+            name = description
+        return BoardInfo(name, rule.get("platform"), description)
+
+    def identify(self, device) -> BoardInfo:
+        """
+        Identify a device.
+
+        Args:
+            device: USBDevice (or any object with vid, pid, description,
+                serial_number and port attributes)
+
+        Returns:
+            BoardInfo for the device
+        """
+        key = self._key(device)
+        info = self._cache.get(key)
+        if info is None:
+            info = self._identify(device)
+            with self._lock:
+                self._cache[key] = info
+        return info
+
+    def identify_many(self, devices) -> List[BoardInfo]:
+        """
+        Identify several devices, computing each distinct device only once.
+
+        Args:
+            devices: Iterable of devices
+
+        Returns:
+            BoardInfo for each device, in the same order
+        """
+        return [self.identify(device) for device in devices]
+
+    def clear(self) -> None:
+        """Forget all remembered results."""
+        with self._lock:
+            self._cache.clear()
+
+
+_identifier: Optional[BoardIdentifier] = None
+_identifier_lock = threading.Lock()
+
+
+def get_identifier() -> BoardIdentifier:
+    """
+    Return the shared identifier using the default configuration's rules.
+
+    Returns:
+        BoardIdentifier shared by all callers in this process
+    """
+    global _identifier
+    with _identifier_lock:
+        if _identifier is None:
+            _identifier = BoardIdentifier()
+        return _identifier
@@ -0,0 +1,159 @@
+"""
+Checkpoints for resuming an interrupted flash.
+
+While an in-process engine writes an image, the address up to which the
+device has acknowledged it is recorded in a small journal file, keyed by the
+board's USB serial number and a hash of the image. If the board drops off
+USB, the next flash of the same image to the same board (whatever port it
+re-enumerates as) hashes the region already written and, if it matches,
+carries on from the checkpoint instead of starting again.
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+from .config import cache_dir
+from .firmware import Segment
+
+# Seconds between journal writes while flashing
+CHECKPOINT_INTERVAL = 0.5
+
+
+def journal_dir() -> Path:
+    """Return the directory holding flash checkpoints."""
+    return cache_dir() / "journal"
+
+
+def image_digest(segments: Sequence[Segment]) -> str:
+    """SHA-256 over an image's addresses and contents."""
+    digest = hashlib.sha256()
+    for address, data in sorted(segments, key=lambda segment: segment[0]):
+        digest.update(address.to_bytes(8, "little"))
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def split_at(segments: Sequence[Segment], boundary: int) -> List[List[Segment]]:
+    """
+    Split segments into the parts below and at or above an address.
+
+    Returns:
+        [parts below ``boundary``, parts from ``boundary`` on]
+    """
+    below: List[Segment] = []
+    above: List[Segment] = []
+    for address, data in sorted(segments, key=lambda segment: segment[0]):
+        end = address + len(data)
+        if end <= boundary:
+            below.append((address, data))
+        elif address >= boundary:
+            above.append((address, data))
+        else:
+            data = memoryview(data)
+            below.append((address, data[: boundary - address]))
+            above.append((boundary, data[boundary - address :]))
+    return [below, above]
+
+
+class FlashCheckpoint:
+    """
+    Journal entry for flashing one image to one board.
+
+    Engines report progress through advance(); the checkpoint is written at
+    most every CHECKPOINT_INTERVAL seconds and removed by finish().
+    """
+
+    def __init__(
+        self,
+        serial_number: str,
+        segments: Sequence[Segment],
+        directory: Optional[Path] = None,
+        debug_logger=None,
+    ):
+        self.serial_number = serial_number
+        self.segments = list(segments)
+        self.digest = image_digest(self.segments)
+        key = hashlib.sha1(serial_number.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+        self.path = (directory or journal_dir()) / f"{key}-{self.digest[:16]}.json"
+        self.debug_logger = debug_logger
+        self.boundary = self._load()
+        self._saved_at = 0.0
+
+    def _log(self, message: str) -> None:
+        if self.debug_logger is not None:
+            self.debug_logger.log(message)
+
+    def _load(self) -> Optional[int]:
+        try:
+            with open(self.path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("serial_number") != self.serial_number or entry.get("image") != self.digest:
+            return None
+        return entry.get("boundary")
+
+    def _save(self) -> None:
+        entry = {
+            "serial_number": self.serial_number,
+            "image": self.digest,
+            "boundary": self.boundary,
+            "updated": time.time(),
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".journal-")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(entry, f)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            # Without a writable cache an interrupted flash just starts over
+            pass
+
+    def remaining(self, check: Callable[[List[Segment]], bool]) -> List[Segment]:
+        """
+        Return what is left to write.
+
+        Args:
+            check: Hashes or reads back segments already on the device and
+                returns True if they match
+
+        Returns:
+            The segments from the checkpoint on if the written region checks
+            out, else the whole image
+        """
+        if not self.boundary:
+            return self.segments
+        done, rest = split_at(self.segments, self.boundary)
+        if check(done):
+            self._log(f"Resuming at 0x{self.boundary:08X} after an interrupted flash")
+            return rest
+        self._log("Region written before the interruption does not match; starting over")
+        self.boundary = None
+        return self.segments
+
+    def advance(self, address: int) -> None:
+        """Record that the device has acknowledged everything below ``address``."""
+        self.boundary = address
+        now = time.monotonic()
+        if now - self._saved_at >= CHECKPOINT_INTERVAL:
+            self._saved_at = now
+            self._save()
+
+    def finish(self) -> None:
+        """Forget the checkpoint once the flash is complete."""
+        self.boundary = None
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,81 @@
+"""
+Double-buffered block preparation for the in-process flashing engines.
+
+Host-side work on a block (compressing, framing, hashing) runs on a producer
+thread while the previous block is on the wire. zlib, hashlib and pyserial all
+release the GIL for the heavy part, so the link does not sit idle waiting on
+Python between blocks.
+"""
+
+import queue
+import threading
+from typing import Callable, Generic, Iterable, Iterator, TypeVar
+
+S = TypeVar("S")
+T = TypeVar("T")
+
+_ITEM = "item"
+_DONE = "done"
+_ERROR = "error"
+
+
+class Pipeline(Generic[S, T]):
+    """
+    Prepares blocks on a background thread, a bounded number ahead of the consumer.
+
+    Iterate over the pipeline to get prepared blocks in order. An exception
+    raised by ``prepare`` is re-raised from the iteration; closing the pipeline
+    (or leaving its ``with`` block) early stops the producer.
+    """
+
+    def __init__(self, blocks: Iterable[S], prepare: Callable[[S], T], depth: int = 2):
+        """
+        Args:
+            blocks: Raw blocks, consumed lazily by the producer thread
+            prepare: Work done on each block ahead of time
+            depth: Most prepared blocks kept waiting; 2 means double buffering
+        """
+        self._queue: "queue.Queue" = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._produce, args=(blocks, prepare), name="tron-pipeline", daemon=True
+        )
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, blocks: Iterable[S], prepare: Callable[[S], T]) -> None:
+        try:
+            for block in blocks:
+                if not self._put((_ITEM, prepare(block))):
+                    return
+            self._put((_DONE, None))
+        except Exception as e:
+            self._put((_ERROR, e))
+
+    def __iter__(self) -> Iterator[T]:
+        while True:
+            kind, value = self._queue.get()
+            if kind == _DONE:
+                return
+            if kind == _ERROR:
+                raise value
+            yield value
+
+    def close(self) -> None:
+        """Stop the producer and wait for it to exit."""
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self) -> "Pipeline[S, T]":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,317 @@
+"""
+Streaming runner for external flashing tools.
+
+avrdude, esptool and dfu-util report progress as they go, but
+``subprocess.run(capture_output=True)`` shows nothing until they exit, keeps
+all of their output in memory, and can only give up after a fixed wall-clock
+timeout. The runner here reads the child's stdout and stderr as they arrive
+(splitting on carriage returns too, which progress bars redraw with), turns
+progress lines into (stage, percent) updates, keeps only the last lines of
+output, and kills a child that has printed nothing for a while. The pipes are
+watched with a selector, or on Windows, where select() takes only sockets,
+read by two threads feeding a queue.
+"""
+
+import os
+import re
+import time
+import queue
+import selectors
+import threading
+import subprocess
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds without any output before a tool is considered stuck
+INACTIVITY_TIMEOUT = 30.0
+
+# Output lines kept for error messages
+TAIL_LINES = 200
+
+# Longest partial line buffered before it is passed on anyway
+MAX_LINE = 64 * 1024
+
+# (stage, percent), e.g. ("Writing", 42.0)
+Progress = Tuple[str, float]
+
+# Returns the progress a line of tool output reports, if any
+ProgressParser = Callable[[str], Optional[Progress]]
+
+AVRDUDE_PROGRESS = re.compile(r"^(Reading|Writing)\s*\|[# ]*\|\s*(\d+)%")
+ESPTOOL_PROGRESS = re.compile(r"^(Writing|Reading|Erasing)\b.*?\(?(\d+(?:\.\d+)?) ?%")
+DFU_UTIL_PROGRESS = re.compile(r"^(Download|Upload|Erase)\s*\[[= ]*\]\s*(\d+)%")
+
+_LINE_BREAK = re.compile(rb"[\r\n]")
+
+# False where pipes cannot be selected on
+SELECT_PIPES = os.name != "nt"
+
+
+def _parser(pattern: "re.Pattern[str]") -> ProgressParser:
+    def parse(line: str) -> Optional[Progress]:
+        match = pattern.search(line.strip())
+        return (match.group(1), float(match.group(2))) if match else None
+
+    return parse
+
+
+# avrdude: "Writing | ################                   | 32% 0.52s"
+parse_avrdude = _parser(AVRDUDE_PROGRESS)
+
+# esptool: "Writing at 0x00010000... (25 %)" or "Writing at 0x00010000 [==>  ]  25.0% ..."
+parse_esptool = _parser(ESPTOOL_PROGRESS)
+
+# dfu-util: "Download	[=========                ]  38%        24576 bytes"
+parse_dfu_util = _parser(DFU_UTIL_PROGRESS)
+
+PARSERS: Dict[str, ProgressParser] = {
+    "avrdude": parse_avrdude,
+    "esptool": parse_esptool,
+    "esptool.py": parse_esptool,
+    "dfu-util": parse_dfu_util,
+}
+
+
+def parser_for(cmd: Sequence[str]) -> Optional[ProgressParser]:
+    """Pick the progress parser for a command line (``python -m esptool`` included)."""
+    if not cmd:
+        return None
+    if len(cmd) > 2 and cmd[1] == "-m":
+        return PARSERS.get(cmd[2])
+    return PARSERS.get(Path(cmd[0]).name)
+
+
+def progress_logger(log: Callable[[str], None], step: float = 10) -> Callable[[str, float], None]:
+    """
+    Turn progress updates into occasional log lines.
+
+    Returns:
+        An on_progress callback that logs each new stage and then every
+        ``step`` percent of it
+    """
+    state = {"stage": None, "next": 0.0}
+
+    def on_progress(stage: str, percent: float) -> None:
+        if stage != state["stage"]:
+            state["stage"], state["next"] = stage, 0.0
+        if percent >= state["next"]:
+            log(f"{stage}: {percent:.0f}%")
+            state["next"] = (percent // step + 1) * step
+
+    return on_progress
+
+
+class OutputTail:
+    """
+    Splits a tool's output into lines, reports progress and keeps the tail.
+
+    ``feed`` takes raw chunks as read from one stream, ``end`` flushes that
+    stream's partial last line.
+    """
+
+    def __init__(
+        self,
+        on_line: Optional[Callable[[str], None]] = None,
+        on_progress: Optional[Callable[[str, float], None]] = None,
+        parser: Optional[ProgressParser] = None,
+        tail: int = TAIL_LINES,
+    ):
+        self.on_line = on_line
+        self.on_progress = on_progress
+        self.parser = parser
+        self.lines: deque = deque(maxlen=tail)
+        self._partial: Dict[object, bytes] = {}
+        self._last_progress: Optional[Progress] = None
+
+    def _progress(self, text: str) -> None:
+        if self.parser is None or self.on_progress is None:
+            return
+        update = self.parser(text)
+        if update is not None and update != self._last_progress:
+            self._last_progress = update
+            self.on_progress(*update)
+
+    def _emit(self, raw: bytes) -> None:
+        text = raw.decode("utf-8", "replace").rstrip()
+        if not text:
+            return
+        self.lines.append(text)
+        if self.on_line is not None:
+            self.on_line(text)
+        self._progress(text)
+
+    def feed(self, stream: object, chunk: bytes) -> None:
+        """Take a chunk of output read from a stream."""
+        *complete, rest = _LINE_BREAK.split(self._partial.get(stream, b"") + chunk)
+        for raw in complete:
+            self._emit(raw)
+        if len(rest) > MAX_LINE:
+            self._emit(rest)
+            rest = b""
+        self._partial[stream] = rest
+        # Progress bars redraw in place; report them before the next redraw
+        if rest:
+            self._progress(rest.decode("utf-8", "replace"))
+
+    def end(self, stream: object) -> None:
+        """Flush the last, unterminated line of a stream that has closed."""
+        self._emit(self._partial.pop(stream, b""))
+
+
+@dataclass
+class ProcessResult:
+    """Outcome of a streamed command."""
+
+    returncode: Optional[int]
+    tail: List[str] = field(default_factory=list)
+    stalled: bool = False
+    timed_out: bool = False
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """True if the command ran to completion and succeeded."""
+        return self.returncode == 0 and not self.stalled and not self.timed_out
+
+    @property
+    def output(self) -> str:
+        """The last lines of stdout and stderr, interleaved as they arrived."""
+        return "\n".join(self.tail)
+
+
+def run_streaming(
+    cmd: Sequence[str],
+    on_line: Optional[Callable[[str], None]] = None,
+    on_progress: Optional[Callable[[str, float], None]] = None,
+    parser: Optional[ProgressParser] = None,
+    inactivity_timeout: float = INACTIVITY_TIMEOUT,
+    timeout: Optional[float] = None,
+    tail: int = TAIL_LINES,
+) -> ProcessResult:
+    """
+    Run a command, streaming its output.
+
+    Args:
+        cmd: Command and arguments
+        on_line: Called with each line of output as it arrives
+        on_progress: Called with (stage, percent) when the output reports
+            new progress
+        parser: Progress parser; by default chosen from the command name
+        inactivity_timeout: Kill the command after this long without output
+        timeout: Overall limit, if any
+        tail: Number of output lines to keep
+
+    Returns:
+        ProcessResult with the exit code and the tail of the output
+
+    Raises:
+        OSError: If the command cannot be started
+    """
+    if parser is None:
+        parser = parser_for(cmd)
+
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        list(cmd), stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    result = ProcessResult(None)
+    output = OutputTail(on_line, on_progress, parser, tail)
+
+    read, close = (_select_reader if SELECT_PIPES else _thread_reader)(proc)
+    try:
+        open_streams = 2
+        last_output = start
+        while open_streams:
+            now = time.monotonic()
+            wait = inactivity_timeout - (now - last_output)
+            if timeout is not None:
+                wait = min(wait, timeout - (now - start))
+            if wait <= 0:
+                if timeout is not None and now - start >= timeout:
+                    result.timed_out = True
+                else:
+                    result.stalled = True
+                proc.kill()
+                break
+
+            for stream, chunk in read(wait):
+                if not chunk:
+                    open_streams -= 1
+                    output.end(stream)
+                    continue
+                last_output = time.monotonic()
+                output.feed(stream, chunk)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        result.returncode = proc.wait()
+        close()
+
+    result.tail = list(output.lines)
+    result.elapsed = time.monotonic() - start
+    return result
+
+
+# Waits up to the given seconds and returns the (stream, chunk) pairs read;
+# an empty chunk means the stream has closed
+ChunkReader = Callable[[float], List[Tuple[object, bytes]]]
+
+
+def _select_reader(proc: subprocess.Popen) -> Tuple[ChunkReader, Callable[[], None]]:
+    """Read a child's stdout and stderr through one selector."""
+    selector = selectors.DefaultSelector()
+    for stream in (proc.stdout, proc.stderr):
+        selector.register(stream, selectors.EVENT_READ)
+
+    def read(wait: float) -> List[Tuple[object, bytes]]:
+        chunks = []
+        for key, _ in selector.select(wait):
+            chunk = os.read(key.fd, 65536)
+            if not chunk:
+                selector.unregister(key.fileobj)
+            chunks.append((key.fd, chunk))
+        return chunks
+
+    def close() -> None:
+        selector.close()
+        proc.stdout.close()
+        proc.stderr.close()
+
+    return read, close
+
+
+def _thread_reader(proc: subprocess.Popen) -> Tuple[ChunkReader, Callable[[], None]]:
+    """Read a child's stdout and stderr on two threads feeding a queue."""
+    chunks: queue.Queue = queue.Queue()
+
+    def pump(stream) -> None:
+        try:
+            while True:
+                try:
+                    chunk = stream.read1(65536)
+                except (OSError, ValueError):
+                    chunk = b""
+                chunks.put((stream, chunk))
+                if not chunk:
+                    return
+        finally:
+            # Closed here: closing it from the caller would block on this read
+            stream.close()
+
+    for stream in (proc.stdout, proc.stderr):
+        threading.Thread(target=pump, args=(stream,), daemon=True).start()
+
+    def read(wait: float) -> List[Tuple[object, bytes]]:
+        try:
+            ready = [chunks.get(timeout=wait)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                ready.append(chunks.get_nowait())
+            except queue.Empty:
+                return ready
+
+    return read, lambda: None
@@ -0,0 +1,58 @@
+"""
+In-process bootloader protocol implementations.
+
+Each engine talks to a bootloader over an already open pyserial-like handle
+(anything with read(), write() and reset_input_buffer()).
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+from ..flasher import FlashError
+from ..verify import VerifyReport
+
+
+@dataclass
+class ProgramResult:
+    """Outcome of programming a flash image."""
+
+    pages_written: int
+    bytes_written: int
+    elapsed: float
+    verified: Optional[bool] = None
+    pages_skipped: int = 0
+    image_digest: Optional[str] = None
+    device_digest: Optional[str] = None
+    sectors_unchanged: int = 0
+    verify_method: Optional[str] = None
+
+    def record(self, report: VerifyReport) -> None:
+        """Take the outcome of post-flash verification."""
+        self.verified = report.verified
+        self.image_digest = report.image_digest
+        self.device_digest = report.device_digest
+        self.verify_method = report.method
+
+
+def read_exact(ser, size: int, what: str = "response") -> bytes:
+    """
+    Read exactly ``size`` bytes from a serial handle.
+
+    Args:
+        ser: Serial handle whose timeout bounds each read
+        size: Number of bytes to read
+        what: Description used in the error message
+
+    Returns:
+        The bytes read
+
+    Raises:
+        FlashError: If the device stops answering before ``size`` bytes arrive
+    """
+    data = bytearray()
+    while len(data) < size:
+        chunk = ser.read(size - len(data))
+        if not chunk:
+            raise FlashError(f"Timeout waiting for {what} ({len(data)}/{size} bytes)")
+        data += chunk
+    return bytes(data)
@@ -0,0 +1,533 @@
+"""
+USB DFU 1.1 and ST DfuSe downloads over pyusb.
+
+Blocks are sent with the transfer size advertised in the DFU functional
+descriptor, and the device is polled for status only as often as its
+bwPollTimeout asks. DfuSe devices (STM32) erase just the pages the image
+covers, taken from the memory layout in their interface string.
+"""
+
+import re
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+from ..delta import plan_delta
+from ..firmware import Segment, plan_writes
+from ..flasher import FlashError
+from ..verify import VerifyReport, verify_ranges
+from . import ProgramResult
+
+# Class requests (DFU 1.1, section 3)
+DFU_DETACH = 0
+DFU_DNLOAD = 1
+DFU_UPLOAD = 2
+DFU_GETSTATUS = 3
+DFU_CLRSTATUS = 4
+DFU_GETSTATE = 5
+DFU_ABORT = 6
+
+REQUEST_OUT = 0x21  # class, interface, host to device
+REQUEST_IN = 0xA1  # class, interface, device to host
+
+# Device states
+STATE_IDLE = 2
+STATE_DNLOAD_SYNC = 3
+STATE_DNBUSY = 4
+STATE_DNLOAD_IDLE = 5
+STATE_MANIFEST_SYNC = 6
+STATE_MANIFEST = 7
+STATE_MANIFEST_WAIT_RESET = 8
+STATE_UPLOAD_IDLE = 9
+STATE_ERROR = 10
+
+STATUS_OK = 0
+
+# DfuSe commands, sent as block 0 downloads
+DFUSE_SET_ADDRESS = 0x21
+DFUSE_ERASE = 0x41
+
+DFU_CLASS = 0xFE
+DFU_SUBCLASS = 0x01
+FUNCTIONAL_DESCRIPTOR = 0x21
+DFUSE_VERSION = 0x011A
+
+ST_VID = 0x0483
+ST_DFU_PID = 0xDF11
+
+USB_TIMEOUT_MS = 5000
+
+
+@dataclass(frozen=True)
+class FunctionalDescriptor:
+    """DFU functional descriptor (DFU 1.1, table 4.2)."""
+
+    attributes: int
+    detach_timeout: int
+    transfer_size: int
+    version: int
+
+
+@dataclass
+class MemoryRegion:
+    """A run of equally sized pages in a DfuSe memory layout."""
+
+    start: int
+    page_count: int
+    page_size: int
+    properties: str
+
+    @property
+    def end(self) -> int:
+        return self.start + self.page_count * self.page_size
+
+    @property
+    def erasable(self) -> bool:
+        return bool((ord(self.properties) - ord("a") + 1) & 0x2)
+
+
+@dataclass
+class MemoryLayout:
+    """Memory layout from a DfuSe interface string."""
+
+    name: str
+    regions: List[MemoryRegion] = field(default_factory=list)
+
+    @property
+    def start(self) -> Optional[int]:
+        return self.regions[0].start if self.regions else None
+
+    def pages_for_range(self, start: int, end: int) -> List[int]:
+        """
+        Find the erasable pages overlapping an address range.
+
+        Returns:
+            Start addresses of pages overlapping [start, end)
+        """
+        pages = []
+        for region in self.regions:
+            if region.end <= start or region.start >= end or not region.erasable:
+                continue
+            first = max(0, (start - region.start) // region.page_size)
+            last = min(region.page_count, -(-(end - region.start) // region.page_size))
+            pages.extend(region.start + n * region.page_size for n in range(first, last))
+        return pages
+
+    def page_bounds(self, address: int) -> Tuple[int, int]:
+        """
+        Find the page containing an address.
+
+        Returns:
+            (start, end) addresses of the page
+
+        Raises:
+            FlashError: If no region of the layout contains the address
+        """
+        for region in self.regions:
+            if region.start <= address < region.end:
+                start = address - (address - region.start) % region.page_size
+                return start, start + region.page_size
+        raise FlashError(f"Address 0x{address:08X} is outside the {self.name} layout")
+
+
+_UNITS = {" ": 1, "": 1, "B": 1, "K": 1024, "M": 1024 * 1024}
+_SEGMENT = re.compile(r"(\d+)\*(\d+)\s?([ BKM]?)([a-g])")
+
+
+def parse_layout(text: str) -> Optional[MemoryLayout]:
+    """
+    Parse a DfuSe memory layout string.
+
+    Example: ``@Internal Flash  /0x08000000/04*016Kg,01*064Kg,07*128Kg``
+
+    Returns:
+        MemoryLayout, or None if the string is not a DfuSe layout
+    """
+    if not text or not text.startswith("@"):
+        return None
+    parts = text[1:].split("/")
+    layout = MemoryLayout(parts[0].strip())
+    for address_text, segments_text in zip(parts[1::2], parts[2::2]):
+        address = int(address_text.strip(), 16)
+        for count, size, unit, properties in _SEGMENT.findall(segments_text):
+            region = MemoryRegion(address, int(count), int(size) * _UNITS[unit], properties)
+            layout.regions.append(region)
+            address = region.end
+    return layout
+
+
+def parse_functional_descriptor(extra: Sequence[int]) -> Optional[FunctionalDescriptor]:
+    """Find the DFU functional descriptor in a block of class-specific descriptors."""
+    extra = bytes(extra)
+    offset = 0
+    while offset + 2 <= len(extra):
+        length, kind = extra[offset], extra[offset + 1]
+        if length < 2:
+            break
+        if kind == FUNCTIONAL_DESCRIPTOR and length >= 7:
+            body = extra[offset : offset + length]
+            version = int.from_bytes(body[7:9], "little") if length >= 9 else 0x0100
+            return FunctionalDescriptor(
+                attributes=body[2],
+                detach_timeout=int.from_bytes(body[3:5], "little"),
+                transfer_size=int.from_bytes(body[5:7], "little"),
+                version=version,
+            )
+        offset += length
+    return None
+
+
+class DFUDevice:
+    """A DFU interface of a USB device opened with pyusb."""
+
+    def __init__(
+        self,
+        dev,
+        interface: int = 0,
+        alt: int = 0,
+        descriptor: Optional[FunctionalDescriptor] = None,
+        layout: Optional[MemoryLayout] = None,
+        debug_logger=None,
+    ):
+        self.dev = dev
+        self.interface = interface
+        self.alt = alt
+        self.descriptor = descriptor or FunctionalDescriptor(0, 0, 1024, 0x0110)
+        self.layout = layout
+        self.debug_logger = debug_logger
+
+    @property
+    def transfer_size(self) -> int:
+        return self.descriptor.transfer_size
+
+    @property
+    def dfuse(self) -> bool:
+        """Return True if the device speaks ST's DfuSe extensions."""
+        return self.descriptor.version == DFUSE_VERSION or self.layout is not None
+
+    def _log(self, message: str) -> None:
+        if self.debug_logger is not None:
+            self.debug_logger.log(message, level=2)
+
+    def _out(self, request: int, value: int = 0, data: bytes = b"") -> None:
+        self.dev.ctrl_transfer(REQUEST_OUT, request, value, self.interface, data, USB_TIMEOUT_MS)
+
+    def _in(self, request: int, value: int, length: int) -> bytes:
+        data = self.dev.ctrl_transfer(
+            REQUEST_IN, request, value, self.interface, length, USB_TIMEOUT_MS
+        )
+        return bytes(data)
+
+    def get_status(self) -> Tuple[int, int, int]:
+        """
+        Read the device status.
+
+        Returns:
+            Tuple of (bStatus, bwPollTimeout in ms, bState)
+        """
+        data = self._in(DFU_GETSTATUS, 0, 6)
+        if len(data) < 6:
+            raise FlashError("Short DFU status reply")
+        return data[0], int.from_bytes(data[1:4], "little"), data[4]
+
+    def clear_status(self) -> None:
+        self._out(DFU_CLRSTATUS)
+
+    def abort(self) -> None:
+        self._out(DFU_ABORT)
+
+    def ensure_idle(self) -> None:
+        """Bring the device back to dfuIDLE from an error or unfinished transfer."""
+        for _ in range(3):
+            _, _, state = self.get_status()
+            if state == STATE_IDLE:
+                return
+            if state == STATE_ERROR:
+                self.clear_status()
+            else:
+                self.abort()
+        raise FlashError("DFU device did not return to the idle state")
+
+    def wait_ready(self, what: str) -> int:
+        """
+        Poll until the device finishes the last request.
+
+        Each GETSTATUS tells how long to wait before the next one, so the
+        device is never polled sooner than it asks.
+
+        Returns:
+            Final device state
+        """
+        while True:
+            status, poll_timeout, state = self.get_status()
+            if status != STATUS_OK or state == STATE_ERROR:
+                self.clear_status()
+                raise FlashError(f"DFU {what} failed (status {status})")
+            if state not in (STATE_DNBUSY, STATE_DNLOAD_SYNC, STATE_MANIFEST):
+                return state
+            if poll_timeout:
+                time.sleep(poll_timeout / 1000.0)
+
+    def download(self, block: int, data: bytes, what: str = "download") -> int:
+        """Send one DNLOAD block and wait for the device to process it."""
+        self._out(DFU_DNLOAD, block, data)
+        return self.wait_ready(what)
+
+    def set_address(self, address: int) -> None:
+        self.download(0, bytes([DFUSE_SET_ADDRESS]) + address.to_bytes(4, "little"), "set address")
+
+    def erase_page(self, address: int) -> None:
+        self.download(0, bytes([DFUSE_ERASE]) + address.to_bytes(4, "little"), "erase")
+
+    def erase_range(self, start: int, end: int) -> int:
+        """
+        Erase the pages overlapping [start, end).
+
+        Returns:
+            Number of pages erased
+        """
+        if self.layout is None:
+            raise FlashError("DFU device has no memory layout; cannot erase by page")
+        pages = self.layout.pages_for_range(start, end)
+        for page in pages:
+            self.erase_page(page)
+        return len(pages)
+
+    def _check_plain(self, address: int) -> None:
+        # Plain DFU 1.1 has no addresses: transfers always start at the image's first byte
+        if not self.dfuse and address != 0:
+            raise FlashError(
+                f"Plain DFU device cannot address 0x{address:08X}; transfers start at 0"
+            )
+
+    def write(self, address: int, data: bytes) -> int:
+        """
+        Write data at an address, one transfer-size block per request.
+
+        Returns:
+            Number of blocks sent
+
+        Raises:
+            FlashError: If a plain DFU device is given a non-zero address
+        """
+        self._check_plain(address)
+        size = self.transfer_size
+        blocks = 0
+        if not self.dfuse:
+            for offset in range(0, len(data), size):
+                self.download(blocks, data[offset : offset + size])
+                blocks += 1
+            return blocks
+
+        # DfuSe blocks land at the last set address + (block - 2) * transfer size
+        for base in range(0, len(data), size * 0xFFFD):
+            self.set_address(address + base)
+            chunk = data[base : base + size * 0xFFFD]
+            for offset in range(0, len(chunk), size):
+                self.download(2 + offset // size, chunk[offset : offset + size])
+                blocks += 1
+        return blocks
+
+    def read(self, address: int, length: int) -> bytes:
+        """
+        Read memory back with UPLOAD requests.
+
+        Raises:
+            FlashError: If a plain DFU device is given a non-zero address
+        """
+        self._check_plain(address)
+        size = self.transfer_size
+        data = bytearray()
+        if self.dfuse:
+            self.set_address(address)
+            self.abort()
+            block = 2
+        else:
+            block = 0
+        while len(data) < length:
+            chunk = self._in(DFU_UPLOAD, block, min(size, length - len(data)))
+            if not chunk:
+                break
+            data += chunk
+            block += 1
+        self.abort()
+        return bytes(data)
+
+    def leave(self, address: Optional[int] = None) -> None:
+        """Leave DFU mode and run the application."""
+        if self.dfuse and address is not None:
+            self.set_address(address)
+        self._out(DFU_DNLOAD, 0, b"")
+        try:
+            self.get_status()
+        except Exception:
+            # The device usually drops off the bus as it manifests
+            pass
+
+    def _plan_size(self) -> int:
+        # Padding of a partly covered block must stay inside erased flash pages
+        sizes = [self.transfer_size]
+        if self.layout is not None:
+            sizes += [region.page_size for region in self.layout.regions]
+        return min(sizes)
+
+    def verify(self, segments: Sequence[Segment], max_read: Optional[int] = None) -> VerifyReport:
+        """
+        Read memory back and compare it with an image.
+
+        DFU has no hash request, so the ranges are uploaded, or on DfuSe
+        devices a sample of their blocks if they exceed ``max_read`` bytes.
+
+        Returns:
+            VerifyReport naming the method used
+        """
+        self.ensure_idle()
+        return verify_ranges(
+            sorted(segments, key=lambda segment: segment[0]),
+            read=self.read,
+            # Sampled blocks need addressed reads, which only DfuSe has
+            max_read=max_read if self.dfuse else None,
+            page_size=self.transfer_size,
+        )
+
+    def _holds(self, address: int, data: bytes) -> bool:
+        # True if memory at ``address`` already contains ``data``
+        return self.read(address, len(data)) == data
+
+    def program(
+        self,
+        segments: Sequence[Segment],
+        verify: bool = True,
+        run: bool = True,
+        skip_blank: bool = True,
+        delta: bool = False,
+    ) -> ProgramResult:
+        """
+        Erase the pages an image covers, download it and read it back.
+
+        Args:
+            segments: (address, data) segments to write
+            verify: Read the written ranges back and compare, including
+                blocks skipped for being blank
+            run: Leave DFU mode afterwards
+            skip_blank: On DfuSe devices, do not send blocks that are all
+                0xFF since the erase already left them that way
+            delta: On DfuSe devices, read each page back first and rewrite
+                only the pages that differ
+
+        Returns:
+            ProgramResult counting transfer blocks
+        """
+        start = time.monotonic()
+        segments = sorted(segments, key=lambda segment: segment[0])
+        entry = segments[0][0] if segments else None
+        self.ensure_idle()
+
+        unchanged = 0
+        if delta and self.dfuse and self.layout is not None:
+            changes = plan_delta(segments, self.layout.page_bounds, self._holds)
+            self._log(f"{changes.unchanged} of {len(changes.sectors)} page(s) unchanged")
+            segments = changes.segments()
+            unchanged = changes.unchanged
+        elif delta:
+            self._log("Device cannot erase by page; writing the whole image")
+
+        if self.dfuse:
+            erased = sum(
+                self.erase_range(address, address + len(data)) for address, data in segments
+            )
+            self._log(f"Erased {erased} page(s)")
+
+        result = ProgramResult(
+            pages_written=0, bytes_written=0, elapsed=0.0, sectors_unchanged=unchanged
+        )
+        writes = segments
+        if skip_blank and self.dfuse:
+            plan = plan_writes(segments, self._plan_size())
+            writes = plan.runs()
+            result.pages_skipped = len(plan.skipped)
+
+        for address, data in writes:
+            result.pages_written += self.write(address, data)
+            result.bytes_written += len(data)
+
+        if verify:
+            result.record(self.verify(segments))
+
+        if run:
+            self.leave(entry)
+        result.elapsed = time.monotonic() - start
+        return result
+
+
+def find_dfu_devices(
+    vid: Optional[int] = None,
+    pid: Optional[int] = None,
+    serial_number: Optional[str] = None,
+    debug_logger=None,
+) -> List[DFUDevice]:
+    """
+    Find USB devices exposing a DFU interface.
+
+    Only the first alternate setting of each device is returned; for STM32
+    parts that is internal flash.
+
+    Args:
+        vid: Only match this vendor ID
+        pid: Only match this product ID
+        serial_number: Only match this USB serial number
+
+    Returns:
+        DFUDevice for each matching device
+    """
+    try:
+        import usb.core
+        import usb.util
+    except ImportError:
+        raise FlashError("DFU support requires pyusb (pip install pyusb)")
+
+    found = []
+    for dev in usb.core.find(find_all=True):
+        if vid is not None and dev.idVendor != vid:
+            continue
+        if pid is not None and dev.idProduct != pid:
+            continue
+        try:
+            config = dev.get_active_configuration()
+        except usb.core.USBError:
+            config = dev[0]
+
+        interfaces = [
+            intf
+            for intf in config
+            if intf.bInterfaceClass == DFU_CLASS and intf.bInterfaceSubClass == DFU_SUBCLASS
+        ]
+        if not interfaces:
+            continue
+        if serial_number is not None:
+            if usb.util.get_string(dev, dev.iSerialNumber) != serial_number:
+                continue
+
+        descriptor = None
+        for intf in interfaces:
+            descriptor = parse_functional_descriptor(intf.extra_descriptors or [])
+            if descriptor:
+                break
+        if descriptor is None:
+            descriptor = parse_functional_descriptor(config.extra_descriptors or [])
+
+        intf = interfaces[0]
+        layout = None
+        if intf.iInterface:
+            layout = parse_layout(usb.util.get_string(dev, intf.iInterface))
+        found.append(
+            DFUDevice(
+                dev,
+                intf.bInterfaceNumber,
+                intf.bAlternateSetting,
+                descriptor,
+                layout,
+                debug_logger,
+            )
+        )
+    return found
@@ -0,0 +1,508 @@
+"""
+Espressif serial ROM bootloader protocol (ESP32 and ESP8266).
+
+Commands are SLIP-framed packets. Images are uploaded deflate-compressed on
+the ESP32, whose ROM also computes an MD5 of flash so no read-back is needed;
+the ESP8266 ROM only supports plain uploads and cannot hash flash.
+"""
+
+import time
+import zlib
+import struct
+import hashlib
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from ..delta import fixed_sectors, plan_delta
+from ..firmware import Segment
+from ..flasher import FlashError
+from ..pipeline import Pipeline
+from ..verify import VerifyReport, verify_ranges
+from . import ProgramResult
+
+SLIP_END = 0xC0
+SLIP_ESC = 0xDB
+SLIP_ESC_END = 0xDC
+SLIP_ESC_ESC = 0xDD
+
+# ROM command opcodes
+FLASH_BEGIN = 0x02
+FLASH_DATA = 0x03
+FLASH_END = 0x04
+SYNC = 0x08
+READ_REG = 0x0A
+SPI_SET_PARAMS = 0x0B
+SPI_ATTACH = 0x0D
+CHANGE_BAUDRATE = 0x0F
+FLASH_DEFL_BEGIN = 0x10
+FLASH_DEFL_DATA = 0x11
+FLASH_DEFL_END = 0x12
+SPI_FLASH_MD5 = 0x13
+
+CHECKSUM_SEED = 0xEF
+CHIP_DETECT_MAGIC_REG = 0x40001000
+ROM_BAUD = 115200
+
+FLASH_SECTOR_SIZE = 0x1000
+FLASH_WRITE_SIZE = 0x400
+
+# Compressed uploads are split at this alignment so the next chunk can be
+# compressed while the current one is being sent
+DEFL_CHUNK_SIZE = 0x10000
+
+# Timeouts scale with the amount of flash touched
+DEFAULT_TIMEOUT = 3.0
+ERASE_TIMEOUT_PER_MB = 30.0
+WRITE_TIMEOUT_PER_MB = 40.0
+MD5_TIMEOUT_PER_MB = 8.0
+
+
+@dataclass(frozen=True)
+class ESPChip:
+    """Capabilities of an Espressif chip's ROM loader."""
+
+    name: str
+    app_offset: int
+    compressed: bool
+    md5: bool
+    change_baud: bool
+    spi_attach: bool
+
+
+CHIPS = {
+    0xFFF0C101: ESPChip("esp8266", 0x0, False, False, False, False),
+    0x00F01D83: ESPChip("esp32", 0x10000, True, True, True, True),
+}
+
+
+def slip_encode(packet: bytes) -> bytes:
+    """Wrap a packet in a SLIP frame."""
+    body = packet.replace(bytes([SLIP_ESC]), bytes([SLIP_ESC, SLIP_ESC_ESC])).replace(
+        bytes([SLIP_END]), bytes([SLIP_ESC, SLIP_ESC_END])
+    )
+    return bytes([SLIP_END]) + body + bytes([SLIP_END])
+
+
+def slip_decode(frame: bytes) -> bytes:
+    """Undo SLIP escaping of a frame body (without the END delimiters)."""
+    return frame.replace(bytes([SLIP_ESC, SLIP_ESC_END]), bytes([SLIP_END])).replace(
+        bytes([SLIP_ESC, SLIP_ESC_ESC]), bytes([SLIP_ESC])
+    )
+
+
+def checksum(data: bytes) -> int:
+    """Return the ROM's XOR checksum of a data block."""
+    value = CHECKSUM_SEED
+    for byte in data:
+        value ^= byte
+    return value
+
+
+def timeout_per_mb(seconds_per_mb: float, size: int) -> float:
+    """Scale a per-megabyte timeout to ``size`` bytes, never below the default."""
+    return max(DEFAULT_TIMEOUT, seconds_per_mb * size / 1e6)
+
+
+def esp8266_erase_size(offset: int, size: int) -> int:
+    """
+    Erase size to pass to the ESP8266 ROM's FLASH_BEGIN.
+
+    The ROM erases the head of the region twice over, so the requested size is
+    shrunk to make it erase exactly the sectors needed.
+    """
+    sectors_per_block = 16
+    num_sectors = (size + FLASH_SECTOR_SIZE - 1) // FLASH_SECTOR_SIZE
+    start_sector = offset // FLASH_SECTOR_SIZE
+
+    head_sectors = min(sectors_per_block - start_sector % sectors_per_block, num_sectors)
+    if num_sectors < 2 * head_sectors:
+        return (num_sectors + 1) // 2 * FLASH_SECTOR_SIZE
+    return (num_sectors - head_sectors) * FLASH_SECTOR_SIZE
+
+
+def split_aligned(segments: Sequence[Segment], size: int) -> List[Segment]:
+    """
+    Split segments at multiples of ``size``.
+
+    With ``size`` a multiple of the sector size, no two pieces share a sector,
+    so erasing one piece never touches another.
+    """
+    pieces = []
+    for address, data in segments:
+        data = memoryview(data)
+        offset = 0
+        while offset < len(data):
+            end = min(len(data), (address + offset) // size * size + size - address)
+            pieces.append((address + offset, data[offset:end]))
+            offset = end
+    return pieces
+
+
+def pad_to_sectors(segments: Sequence[Segment], size: int = FLASH_SECTOR_SIZE) -> List[Segment]:
+    """
+    Grow segments to whole sectors, merging those that share one.
+
+    The ROM erases whole sectors at the start of every region, so a region
+    must never end inside a sector another region also writes. Gaps and
+    padding are filled with 0xFF, which is what the erase leaves there.
+    """
+    merged: List[Tuple[int, bytearray]] = []
+    for address, data in sorted(segments, key=lambda segment: segment[0]):
+        start = address // size * size
+        end = -(-(address + len(data)) // size) * size
+        if merged and start < merged[-1][0] + len(merged[-1][1]):
+            base, run = merged[-1]
+        else:
+            base, run = start, bytearray()
+            merged.append((base, run))
+        run.extend(b"\xff" * (end - base - len(run)))
+        run[address - base : address - base + len(data)] = data
+    return [(base, bytes(run)) for base, run in merged]
+
+
+def classic_reset(ser) -> None:
+    """
+    Reset into the ROM loader through the usual DTR/RTS auto-reset circuit.
+
+    RTS drives EN and DTR drives GPIO0; holding GPIO0 low while EN is
+    released boots the chip into the serial loader.
+    """
+    ser.dtr = False
+    ser.rts = True
+    time.sleep(0.1)
+    ser.dtr = True
+    ser.rts = False
+    time.sleep(0.05)
+    ser.dtr = False
+
+
+class ESPLoader:
+    """Talks to the Espressif ROM loader over an open serial handle."""
+
+    def __init__(self, ser, debug_logger=None):
+        self.ser = ser
+        self.chip: Optional[ESPChip] = None
+        self.debug_logger = debug_logger
+        self._buffer = bytearray()
+        # ESP32 ROM replies end in 4 status bytes, the ESP8266 ROM in 2
+        self._status_length = 4
+
+    def _log(self, message: str) -> None:
+        if self.debug_logger is not None:
+            self.debug_logger.log(message, level=2)
+
+    def _read_frame(self, timeout: float) -> bytes:
+        deadline = time.monotonic() + timeout
+        while True:
+            start = self._buffer.find(SLIP_END)
+            if start >= 0:
+                end = self._buffer.find(SLIP_END, start + 1)
+                if end > start + 1:
+                    frame = bytes(self._buffer[start + 1 : end])
+                    del self._buffer[: end + 1]
+                    return slip_decode(frame)
+                if end == start + 1:
+                    # Back-to-back delimiters: drop the first one
+                    del self._buffer[: start + 1]
+                    continue
+
+            if time.monotonic() > deadline:
+                raise FlashError("Timeout waiting for ROM loader response")
+            chunk = self.ser.read(max(1, self.ser.in_waiting))
+            if chunk:
+                self._buffer += chunk
+
+    def command(
+        self,
+        op: int,
+        data: bytes = b"",
+        check: int = 0,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> Tuple[int, bytes]:
+        """
+        Send a command and wait for its response.
+
+        Args:
+            op: Command opcode
+            data: Command payload
+            check: Checksum field (only used by data commands)
+            timeout: Seconds to wait for the response
+
+        Returns:
+            Tuple of (value field, response body without status bytes)
+
+        Raises:
+            FlashError: On timeout or a failure status
+        """
+        packet = struct.pack("<BBHI", 0x00, op, len(data), check) + data
+        self.ser.write(slip_encode(packet))
+
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = self._read_frame(max(0.0, deadline - time.monotonic()))
+            if len(frame) < 8 or frame[0] != 0x01 or frame[1] != op:
+                # Stale response, e.g. the extra replies to SYNC
+                continue
+            (value,) = struct.unpack("<I", frame[4:8])
+            body = frame[8:]
+            status = body[-self._status_length :]
+            if len(status) < 2:
+                raise FlashError(f"Malformed response to command 0x{op:02X}")
+            if status[0] != 0:
+                raise FlashError(f"ROM loader command 0x{op:02X} failed (error 0x{status[1]:02X})")
+            return value, body[: -self._status_length]
+
+    def sync(self, attempts: int = 7) -> None:
+        """
+        Synchronize with the ROM loader and settle its baud rate detection.
+
+        Raises:
+            FlashError: If the loader does not answer
+        """
+        packet = struct.pack("<BBHI", 0x00, SYNC, 36, 0) + b"\x07\x07\x12\x20" + b"\x55" * 32
+        for attempt in range(attempts):
+            self.ser.reset_input_buffer()
+            self._buffer.clear()
+            self.ser.write(slip_encode(packet))
+            try:
+                frame = self._read_frame(0.1)
+            except FlashError:
+                continue
+            if len(frame) >= 10 and frame[0] == 0x01 and frame[1] == SYNC:
+                self._status_length = len(frame) - 8
+                # The ROM answers each SYNC several times; drop the extra replies
+                time.sleep(0.05)
+                self.ser.reset_input_buffer()
+                self._buffer.clear()
+                self._log(f"ROM loader sync after {attempt + 1} attempt(s)")
+                return
+        raise FlashError("No response from ROM loader (sync failed)")
+
+    def read_reg(self, address: int) -> int:
+        """Read a 32-bit register."""
+        value, _ = self.command(READ_REG, struct.pack("<I", address))
+        return value
+
+    def detect_chip(self) -> ESPChip:
+        """
+        Identify the chip from its magic register.
+
+        Raises:
+            FlashError: If the chip is not supported
+        """
+        magic = self.read_reg(CHIP_DETECT_MAGIC_REG)
+        self.chip = CHIPS.get(magic)
+        if self.chip is None:
+            raise FlashError(f"Unsupported Espressif chip (magic 0x{magic:08X})")
+        self._log(f"Detected {self.chip.name}")
+        return self.chip
+
+    def change_baud(self, baud: int) -> None:
+        """Switch both ends of the link to a new baud rate."""
+        if self.chip is not None and not self.chip.change_baud:
+            self._log(f"{self.chip.name} ROM cannot change baud rate, staying at {ROM_BAUD}")
+            return
+        self.command(CHANGE_BAUDRATE, struct.pack("<II", baud, 0))
+        self.ser.baudrate = baud
+        time.sleep(0.05)
+        self.ser.reset_input_buffer()
+        self._buffer.clear()
+
+    def attach_flash(self, flash_size: int) -> None:
+        """Attach the SPI flash and tell the ROM its size."""
+        if self.chip is not None and not self.chip.spi_attach:
+            return
+        self.command(SPI_ATTACH, struct.pack("<II", 0, 0))
+        self.command(
+            SPI_SET_PARAMS,
+            struct.pack("<IIIIII", 0, flash_size, 0x10000, FLASH_SECTOR_SIZE, 0x100, 0xFFFF),
+        )
+
+    def write_compressed(
+        self, address: int, data: bytes, compressed: Optional[bytes] = None
+    ) -> int:
+        """
+        Write a region with deflate-compressed blocks.
+
+        Args:
+            address: Flash offset of the region
+            data: Region contents
+            compressed: ``data`` already deflated, if done ahead of time
+
+        Returns:
+            Number of blocks sent
+        """
+        if compressed is None:
+            compressed = zlib.compress(data, 9)
+        blocks = (len(compressed) + FLASH_WRITE_SIZE - 1) // FLASH_WRITE_SIZE
+        # The ROM erases the whole region up front
+        erase_size = (len(data) + FLASH_SECTOR_SIZE - 1) // FLASH_SECTOR_SIZE * FLASH_SECTOR_SIZE
+        self.command(
+            FLASH_DEFL_BEGIN,
+            struct.pack("<IIII", erase_size, blocks, FLASH_WRITE_SIZE, address),
+            timeout=timeout_per_mb(ERASE_TIMEOUT_PER_MB, erase_size),
+        )
+
+        block_timeout = timeout_per_mb(WRITE_TIMEOUT_PER_MB, FLASH_WRITE_SIZE * 4)
+        for seq in range(blocks):
+            block = compressed[seq * FLASH_WRITE_SIZE : (seq + 1) * FLASH_WRITE_SIZE]
+            self.command(
+                FLASH_DEFL_DATA,
+                struct.pack("<IIII", len(block), seq, 0, 0) + block,
+                checksum(block),
+                timeout=block_timeout,
+            )
+        return blocks
+
+    def write_plain(self, address: int, data: bytes) -> int:
+        """
+        Write a region uncompressed, for ROMs without deflate support.
+
+        Returns:
+            Number of blocks sent
+        """
+        blocks = (len(data) + FLASH_WRITE_SIZE - 1) // FLASH_WRITE_SIZE
+        erase_size = esp8266_erase_size(address, len(data))
+        self.command(
+            FLASH_BEGIN,
+            struct.pack("<IIII", erase_size, blocks, FLASH_WRITE_SIZE, address),
+            timeout=timeout_per_mb(ERASE_TIMEOUT_PER_MB, len(data)),
+        )
+
+        for seq in range(blocks):
+            block = data[seq * FLASH_WRITE_SIZE : (seq + 1) * FLASH_WRITE_SIZE]
+            block = block.ljust(FLASH_WRITE_SIZE, b"\xff")
+            self.command(
+                FLASH_DATA,
+                struct.pack("<IIII", len(block), seq, 0, 0) + block,
+                checksum(block),
+            )
+        return blocks
+
+    def flash_md5(self, address: int, size: int) -> str:
+        """
+        Have the chip hash a flash region.
+
+        Returns:
+            MD5 digest in hex
+        """
+        _, body = self.command(
+            SPI_FLASH_MD5,
+            struct.pack("<IIII", address, size, 0, 0),
+            timeout=timeout_per_mb(MD5_TIMEOUT_PER_MB, size),
+        )
+        if len(body) == 32:
+            return body.decode("ascii").lower()
+        return body[:16].hex()
+
+    def verify(
+        self, segments: Sequence[Segment], expected: Optional[Sequence[str]] = None
+    ) -> Optional[VerifyReport]:
+        """
+        Compare on-chip MD5 hashes of flash with an image.
+
+        Args:
+            segments: (address, data) ranges to check
+            expected: MD5 hex digests of the ranges, if already computed
+
+        Returns:
+            VerifyReport, or None when the ROM cannot hash flash (ESP8266)
+        """
+        if self.chip is None:
+            self.detect_chip()
+        if not self.chip.md5:
+            return None
+        report = verify_ranges(
+            [
+                (address, bytes(data).ljust((len(data) + 3) & ~3, b"\xff"))
+                for address, data in segments
+            ],
+            device_hash=self.flash_md5,
+            expected=expected,
+        )
+        for address in report.mismatches:
+            self._log(f"MD5 mismatch in region at 0x{address:06X}")
+        return report
+
+    def finish(self, reboot: bool = True) -> None:
+        """Leave the loader, optionally running the new firmware."""
+        op = FLASH_DEFL_END if self.chip is None or self.chip.compressed else FLASH_END
+        self.command(op, struct.pack("<I", 0 if reboot else 1))
+
+    @staticmethod
+    def _prepare(chunk: Segment) -> Tuple[int, memoryview, bytes, str]:
+        # Host-side work for one chunk, run on the pipeline thread
+        address, data = chunk
+        return address, data, zlib.compress(data, 9), hashlib.md5(data).hexdigest()
+
+    def program(
+        self,
+        segments: Sequence[Segment],
+        verify: bool = True,
+        reboot: bool = True,
+        delta: bool = False,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> ProgramResult:
+        """
+        Write an image and check it against on-chip MD5 hashes.
+
+        Args:
+            segments: (address, data) segments to write
+            verify: Compare an on-chip MD5 of every segment with the image
+            reboot: Run the new firmware afterwards
+            delta: Compare an on-chip MD5 of every 4 KB sector with the image
+                first and rewrite only the sectors that differ
+            progress: Called with the end address of each region or chunk the
+                ROM has acknowledged
+
+        Returns:
+            ProgramResult; ``verified`` stays None when the ROM cannot hash flash
+        """
+        start = time.monotonic()
+        if self.chip is None:
+            self.detect_chip()
+
+        result = ProgramResult(pages_written=0, bytes_written=0, elapsed=0.0)
+        if delta and self.chip.md5:
+            changes = plan_delta(
+                sorted(segments, key=lambda segment: segment[0]),
+                fixed_sectors(FLASH_SECTOR_SIZE),
+                lambda address, data: self.flash_md5(address, len(data))
+                == hashlib.md5(data).hexdigest(),
+            )
+            self._log(f"{changes.unchanged} of {len(changes.sectors)} sector(s) unchanged")
+            segments = changes.segments()
+            result.sectors_unchanged = changes.unchanged
+        elif delta:
+            self._log(f"{self.chip.name} ROM cannot hash flash; writing the whole image")
+        # Whole sectors, so no region's erase clobbers another's data (and
+        # resume checkpoints fall on sector boundaries)
+        segments = pad_to_sectors(segments)
+        written = []
+        digests = []
+        if self.chip.compressed:
+            # Compress and hash chunk N+1 while chunk N is on the wire
+            with Pipeline(split_aligned(segments, DEFL_CHUNK_SIZE), self._prepare) as chunks:
+                for address, data, compressed, digest in chunks:
+                    result.pages_written += self.write_compressed(address, data, compressed)
+                    result.bytes_written += len(data)
+                    written.append((address, data))
+                    digests.append(digest)
+                    if progress is not None:
+                        progress(address + len(data))
+        else:
+            for address, data in segments:
+                result.pages_written += self.write_plain(address, data)
+                result.bytes_written += len(data)
+                written.append((address, data))
+                if progress is not None:
+                    progress(address + len(data))
+
+        if verify:
+            report = self.verify(written, digests or None)
+            if report is not None:
+                result.record(report)
+
+        self.finish(reboot)
+        result.elapsed = time.monotonic() - start
+        return result
@@ -0,0 +1,271 @@
+"""
+STK500v1 protocol as spoken by the Arduino/Optiboot bootloader.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from ..delta import fixed_sectors, plan_delta
+from ..firmware import Segment, iter_pages
+from ..flasher import FlashError
+from ..verify import VerifyReport, verify_ranges
+from . import ProgramResult, read_exact
+
+# Command and response bytes from AVR061
+STK_OK = 0x10
+STK_INSYNC = 0x14
+CRC_EOP = 0x20
+STK_GET_SYNC = 0x30
+STK_ENTER_PROGMODE = 0x50
+STK_LEAVE_PROGMODE = 0x51
+STK_LOAD_ADDRESS = 0x55
+STK_PROG_PAGE = 0x64
+STK_READ_PAGE = 0x74
+STK_READ_SIGN = 0x75
+
+
+@dataclass(frozen=True)
+class AVRChip:
+    """Flash geometry of an AVR part."""
+
+    name: str
+    flash_size: int
+    page_size: int
+
+
+# Parts that ship with an STK500v1 (Optiboot/ATmegaBOOT) bootloader, by signature
+CHIPS: Dict[bytes, AVRChip] = {
+    bytes.fromhex("1e9307"): AVRChip("atmega8", 8 * 1024, 64),
+    bytes.fromhex("1e9406"): AVRChip("atmega168", 16 * 1024, 128),
+    bytes.fromhex("1e940b"): AVRChip("atmega168p", 16 * 1024, 128),
+    bytes.fromhex("1e9514"): AVRChip("atmega328", 32 * 1024, 128),
+    bytes.fromhex("1e950f"): AVRChip("atmega328p", 32 * 1024, 128),
+    bytes.fromhex("1e9705"): AVRChip("atmega1284p", 128 * 1024, 256),
+}
+
+
+def paginate(segments: Sequence[Segment], page_size: int, fill: int = 0xFF) -> Dict[int, bytes]:
+    """
+    Split segments into whole, page-aligned pages.
+
+    Args:
+        segments: (address, data) segments
+        page_size: Flash page size in bytes
+        fill: Value for bytes of a page not covered by any segment
+
+    Returns:
+        Page contents keyed by page start address
+    """
+    ordered = sorted(segments, key=lambda segment: segment[0])
+    return {page: bytes(data) for page, data in iter_pages(ordered, page_size, fill)}
+
+
+class STK500Programmer:
+    """
+    Programs AVR flash through an STK500v1 bootloader.
+
+    The address and page commands of each page are sent in a single write and
+    their replies read together, so every page costs one USB round trip
+    instead of two.
+    """
+
+    def __init__(self, ser, page_size: Optional[int] = None, debug_logger=None):
+        self.ser = ser
+        self.page_size = page_size
+        self.chip: Optional[AVRChip] = None
+        self.debug_logger = debug_logger
+
+    def _log(self, message: str) -> None:
+        if self.debug_logger is not None:
+            self.debug_logger.log(message, level=2)
+
+    def _transact(self, commands: List[Tuple[bytes, int]]) -> List[bytes]:
+        """
+        Send several commands back to back and collect their replies.
+
+        Args:
+            commands: (command bytes without CRC_EOP, reply payload length) pairs
+
+        Returns:
+            Reply payload of each command
+        """
+        self.ser.write(b"".join(command + bytes([CRC_EOP]) for command, _ in commands))
+
+        replies = []
+        for command, length in commands:
+            reply = read_exact(self.ser, length + 2, f"reply to command 0x{command[0]:02X}")
+            if reply[0] != STK_INSYNC:
+                raise FlashError(f"Bootloader out of sync after command 0x{command[0]:02X}")
+            if reply[-1] != STK_OK:
+                raise FlashError(f"Bootloader rejected command 0x{command[0]:02X}")
+            replies.append(reply[1:-1])
+        return replies
+
+    def _command(self, command: bytes, length: int = 0) -> bytes:
+        return self._transact([(command, length)])[0]
+
+    def sync(self, attempts: int = 10) -> None:
+        """
+        Establish sync with the bootloader.
+
+        Raises:
+            FlashError: If the bootloader does not answer
+        """
+        for attempt in range(attempts):
+            self.ser.reset_input_buffer()
+            self.ser.write(bytes([STK_GET_SYNC, CRC_EOP]))
+            reply = self.ser.read(2)
+            if reply == bytes([STK_INSYNC, STK_OK]):
+                self._log(f"STK500 sync after {attempt + 1} attempt(s)")
+                return
+        raise FlashError("No response from bootloader (STK500 sync failed)")
+
+    def read_signature(self) -> bytes:
+        """Return the 3-byte device signature."""
+        return self._command(bytes([STK_READ_SIGN]), 3)
+
+    def identify(self) -> Optional[AVRChip]:
+        """
+        Read the signature and pick the page size of a known part.
+
+        Returns:
+            AVRChip if the signature is known, otherwise None
+        """
+        signature = self.read_signature()
+        self.chip = CHIPS.get(signature)
+        if self.page_size is None:
+            self.page_size = self.chip.page_size if self.chip else 128
+        self._log(f"Device signature {signature.hex()} ({self.chip.name if self.chip else '?'})")
+        return self.chip
+
+    def enter_progmode(self) -> None:
+        """Enter programming mode."""
+        self._command(bytes([STK_ENTER_PROGMODE]))
+
+    def leave_progmode(self) -> None:
+        """Leave programming mode; the bootloader then starts the application."""
+        self._command(bytes([STK_LEAVE_PROGMODE]))
+
+    @staticmethod
+    def _load_address(address: int) -> bytes:
+        # Flash addresses are sent as little-endian word addresses
+        word = address >> 1
+        return bytes([STK_LOAD_ADDRESS, word & 0xFF, (word >> 8) & 0xFF])
+
+    def write_pages(
+        self, pages: Dict[int, bytes], progress: Optional[Callable[[int], None]] = None
+    ) -> None:
+        """
+        Write whole pages, keyed by page start address.
+
+        Args:
+            pages: Page contents keyed by page start address
+            progress: Called with the end address of each acknowledged page
+        """
+        for address, data in pages.items():
+            header = bytes([STK_PROG_PAGE, len(data) >> 8, len(data) & 0xFF, ord("F")])
+            self._transact([(self._load_address(address), 0), (header + data, 0)])
+            if progress is not None:
+                progress(address + len(data))
+
+    def read_flash(self, address: int, length: int) -> bytes:
+        """
+        Read flash memory.
+
+        Args:
+            address: Start byte address (even)
+            length: Number of bytes to read
+
+        Returns:
+            The flash contents
+        """
+        page_size = self.page_size or 128
+        data = bytearray()
+        while len(data) < length:
+            count = min(page_size, length - len(data))
+            header = bytes([STK_READ_PAGE, count >> 8, count & 0xFF, ord("F")])
+            _, chunk = self._transact(
+                [(self._load_address(address + len(data)), 0), (header, count)]
+            )
+            data += chunk
+        return bytes(data)
+
+    def verify(self, segments: Sequence[Segment], max_read: Optional[int] = None) -> VerifyReport:
+        """
+        Read flash back and compare it with an image.
+
+        STK500v1 has no checksum command, so only the written pages are read,
+        or a sample of them if they exceed ``max_read`` bytes.
+
+        Returns:
+            VerifyReport naming the method used
+        """
+        if self.page_size is None:
+            self.identify()
+        report = verify_ranges(
+            sorted(paginate(segments, self.page_size).items()),
+            read=self.read_flash,
+            max_read=max_read,
+            page_size=self.page_size,
+        )
+        for address in report.mismatches:
+            self._log(f"Verify mismatch in page 0x{address:05X}")
+        return report
+
+    def program(
+        self,
+        segments: Sequence[Segment],
+        verify: bool = True,
+        delta: bool = False,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> ProgramResult:
+        """
+        Write an image and optionally read it back, in one bootloader session.
+
+        Args:
+            segments: (address, data) segments to write
+            verify: Read back every written page and compare
+            delta: Read every page first and write only those that differ
+            progress: Called with the end address of each acknowledged page
+
+        Returns:
+            ProgramResult with page counts, timing and verification outcome
+        """
+        start = time.monotonic()
+        if self.page_size is None:
+            self.identify()
+
+        pages = paginate(segments, self.page_size)
+        if self.chip is not None:
+            end = max(pages) + self.page_size if pages else 0
+            if end > self.chip.flash_size:
+                raise FlashError(
+                    f"Image ends at 0x{end:X}, beyond the {self.chip.flash_size} byte flash"
+                )
+
+        self.enter_progmode()
+        unchanged = 0
+        if delta:
+            changes = plan_delta(
+                sorted(pages.items()),
+                fixed_sectors(self.page_size),
+                lambda address, data: self.read_flash(address, len(data)) == data,
+            )
+            self._log(f"{changes.unchanged} of {len(pages)} page(s) unchanged")
+            pages = dict(changes.changed)
+            unchanged = changes.unchanged
+        self.write_pages(pages, progress)
+
+        result = ProgramResult(
+            pages_written=len(pages),
+            bytes_written=len(pages) * self.page_size,
+            elapsed=0.0,
+            sectors_unchanged=unchanged,
+        )
+        if verify:
+            result.record(self.verify(sorted(pages.items())))
+
+        self.leave_progmode()
+        result.elapsed = time.monotonic() - start
+        return result
@@ -0,0 +1,430 @@
+"""
+STM32 system memory bootloader over USART (ST application note AN3155).
+
+The port must be opened with 8 data bits and even parity.
+"""
+
+import time
+import zlib
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..delta import plan_delta
+from ..firmware import Segment, plan_writes
+from ..flasher import FlashError
+from ..verify import VerifyReport, verify_ranges
+from . import ProgramResult, read_exact
+
+ACK = 0x79
+NACK = 0x1F
+AUTOBAUD = 0x7F
+
+CMD_GET = 0x00
+CMD_GET_ID = 0x02
+CMD_READ_MEMORY = 0x11
+CMD_GO = 0x21
+CMD_WRITE_MEMORY = 0x31
+CMD_ERASE = 0x43
+CMD_EXTENDED_ERASE = 0x44
+CMD_GET_CHECKSUM = 0xA1
+
+FLASH_BASE = 0x08000000
+WRITE_SIZE = 256
+
+# Seconds allowed per erased sector; large F4 sectors take up to two seconds
+ERASE_TIMEOUT_PER_SECTOR = 2.0
+
+# Seconds allowed for a mass erase; 2 MB F4 parts take about half of this
+MASS_ERASE_TIMEOUT = 60.0
+
+_K = 1024
+
+# Flash sector layouts as (count, size) runs, by product ID (GET_ID)
+LAYOUTS: Dict[int, List[Tuple[int, int]]] = {
+    0x410: [(128, 1 * _K)],  # F10x medium density
+    0x412: [(32, 1 * _K)],  # F10x low density
+    0x414: [(256, 2 * _K)],  # F10x high density
+    0x418: [(128, 2 * _K)],  # F105/F107
+    0x430: [(512, 2 * _K)],  # F10x XL density
+    0x440: [(64, 1 * _K)],  # F05x
+    0x448: [(64, 2 * _K)],  # F07x
+    0x411: [(4, 16 * _K), (1, 64 * _K), (7, 128 * _K)],  # F2
+    0x413: [(4, 16 * _K), (1, 64 * _K), (7, 128 * _K)],  # F405/F407
+    0x419: [(4, 16 * _K), (1, 64 * _K), (7, 128 * _K)] * 2,  # F42x/F43x, two banks
+    0x421: [(4, 16 * _K), (1, 64 * _K), (3, 128 * _K)],  # F446
+    0x423: [(4, 16 * _K), (1, 64 * _K), (1, 128 * _K)],  # F401xB/C
+    0x431: [(4, 16 * _K), (1, 64 * _K), (3, 128 * _K)],  # F411
+    0x433: [(4, 16 * _K), (1, 64 * _K), (3, 128 * _K)],  # F401xD/E
+    0x441: [(4, 16 * _K), (1, 64 * _K), (7, 128 * _K)],  # F412
+}
+
+
+def xor(data: bytes) -> int:
+    """Return the XOR of all bytes, the bootloader's packet checksum."""
+    value = 0
+    for byte in data:
+        value ^= byte
+    return value
+
+
+def sectors_for_range(
+    layout: Sequence[Tuple[int, int]], start: int, end: int, base: int = FLASH_BASE
+) -> List[int]:
+    """
+    Find the sectors touched by an address range.
+
+    Args:
+        layout: (count, size) runs of sectors from the start of flash
+        start: First address of the range
+        end: Address just past the range
+        base: Address of the first sector
+
+    Returns:
+        Sector numbers overlapping [start, end)
+    """
+    sectors = []
+    address = base
+    number = 0
+    for count, size in layout:
+        for _ in range(count):
+            if address >= end:
+                return sectors
+            if address + size > start:
+                sectors.append(number)
+            address += size
+            number += 1
+    return sectors
+
+
+def sector_bounds(
+    layout: Sequence[Tuple[int, int]], address: int, base: int = FLASH_BASE
+) -> Tuple[int, int]:
+    """
+    Find the sector containing an address.
+
+    Returns:
+        (start, end) addresses of the sector
+
+    Raises:
+        FlashError: If the address is outside the flash described by ``layout``
+    """
+    start = base
+    for count, size in layout:
+        if address < start + count * size:
+            if address < start:
+                break
+            start += (address - start) // size * size
+            return start, start + size
+        start += count * size
+    raise FlashError(f"Address 0x{address:08X} is outside flash")
+
+
+def word_align(segments: Sequence[Segment]) -> List[Segment]:
+    """Sort segments and pad each to a whole number of 32-bit words."""
+    return [
+        (
+            address,
+            data
+            if len(data) % 4 == 0
+            else bytes(data).ljust(len(data) + 4 - len(data) % 4, b"\xff"),
+        )
+        for address, data in sorted(segments, key=lambda segment: segment[0])
+    ]
+
+
+_REVERSED_BITS = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+
+def stm32_crc(data: bytes) -> int:
+    """
+    CRC-32 as computed by the STM32 CRC unit over 32-bit words.
+
+    That is CRC-32/MPEG-2 (polynomial 0x04C11DB7, initial value 0xFFFFFFFF,
+    MSB first, no final XOR) fed with each little-endian word big-end first.
+    It is derived from zlib's reflected CRC-32 so large images hash at C speed.
+
+    Args:
+        data: Bytes to hash; length must be a multiple of 4
+    """
+    # Reverse each 4-byte group, whatever the host's byte order
+    swapped = bytearray(len(data))
+    for index in range(4):
+        swapped[index::4] = data[3 - index :: 4]
+    register = zlib.crc32(swapped.translate(_REVERSED_BITS)) ^ 0xFFFFFFFF
+    return int(f"{register:032b}"[::-1], 2)
+
+
+class STM32Bootloader:
+    """Talks to the STM32 USART system bootloader over an open serial handle."""
+
+    def __init__(self, ser, debug_logger=None):
+        self.ser = ser
+        self.debug_logger = debug_logger
+        self.version: Optional[int] = None
+        self.commands: bytes = b""
+        self.product_id: Optional[int] = None
+
+    def _log(self, message: str) -> None:
+        if self.debug_logger is not None:
+            self.debug_logger.log(message, level=2)
+
+    def _wait_ack(self, what: str, timeout: Optional[float] = None) -> None:
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            reply = self.ser.read(1)
+            if reply:
+                break
+            if time.monotonic() >= deadline:
+                raise FlashError(f"Timeout waiting for ACK to {what}")
+        if reply[0] == NACK:
+            raise FlashError(f"Bootloader refused {what}")
+        if reply[0] != ACK:
+            raise FlashError(f"Unexpected reply 0x{reply[0]:02X} to {what}")
+
+    def _send(self, data: bytes, what: str, timeout: Optional[float] = None) -> None:
+        self.ser.write(data)
+        self._wait_ack(what, timeout)
+
+    def _command(self, command: int) -> None:
+        self._send(bytes([command, command ^ 0xFF]), f"command 0x{command:02X}")
+
+    def _send_address(self, address: int) -> None:
+        data = address.to_bytes(4, "big")
+        self._send(data + bytes([xor(data)]), f"address 0x{address:08X}")
+
+    def connect(self, attempts: int = 5) -> None:
+        """
+        Run the autobaud handshake and read the bootloader's capabilities.
+
+        Raises:
+            FlashError: If the bootloader does not answer
+        """
+        for attempt in range(attempts):
+            self.ser.reset_input_buffer()
+            self.ser.write(bytes([AUTOBAUD]))
+            reply = self.ser.read(1)
+            # NACK means the baud rate was already detected in an earlier session
+            if reply in (bytes([ACK]), bytes([NACK])):
+                self._log(f"STM32 bootloader sync after {attempt + 1} attempt(s)")
+                break
+        else:
+            raise FlashError("No response from STM32 bootloader (autobaud failed)")
+
+        self.get()
+        self.get_id()
+
+    def get(self) -> bytes:
+        """Read the bootloader version and its supported commands."""
+        self._command(CMD_GET)
+        count = read_exact(self.ser, 1, "GET length")[0]
+        data = read_exact(self.ser, count + 1, "GET data")
+        self._wait_ack("GET")
+        self.version = data[0]
+        self.commands = data[1:]
+        return self.commands
+
+    def get_id(self) -> int:
+        """Read the product ID."""
+        self._command(CMD_GET_ID)
+        count = read_exact(self.ser, 1, "GET_ID length")[0]
+        data = read_exact(self.ser, count + 1, "GET_ID data")
+        self._wait_ack("GET_ID")
+        self.product_id = int.from_bytes(data[:2], "big")
+        self._log(f"STM32 product ID 0x{self.product_id:03X}, bootloader v{self.version:#x}")
+        return self.product_id
+
+    def supports(self, command: int) -> bool:
+        """Return True if the bootloader listed the command in GET."""
+        return command in self.commands
+
+    @property
+    def layout(self) -> Optional[List[Tuple[int, int]]]:
+        """Flash sector layout of the connected part, or None if it is not in LAYOUTS."""
+        return LAYOUTS.get(self.product_id)
+
+    def read_memory(self, address: int, length: int) -> bytes:
+        """
+        Read memory in blocks of up to 256 bytes.
+
+        Raises:
+            FlashError: If the chip is read-protected
+        """
+        data = bytearray()
+        while len(data) < length:
+            count = min(WRITE_SIZE, length - len(data))
+            self._command(CMD_READ_MEMORY)
+            self._send_address(address + len(data))
+            self._send(bytes([count - 1, (count - 1) ^ 0xFF]), "read length")
+            data += read_exact(self.ser, count, "memory data")
+        return bytes(data)
+
+    def write_memory(self, address: int, data: bytes) -> None:
+        """Write up to 256 bytes; ``data`` length must be a multiple of 4."""
+        self._command(CMD_WRITE_MEMORY)
+        self._send_address(address)
+        packet = bytes([len(data) - 1]) + data
+        self._send(packet + bytes([xor(packet)]), f"data at 0x{address:08X}")
+
+    def erase(self, sectors: Sequence[int]) -> None:
+        """Erase flash sectors, with extended erase when available."""
+        if not sectors:
+            return
+        timeout = ERASE_TIMEOUT_PER_SECTOR * len(sectors)
+        if self.supports(CMD_EXTENDED_ERASE):
+            self._command(CMD_EXTENDED_ERASE)
+            packet = (len(sectors) - 1).to_bytes(2, "big")
+            packet += b"".join(sector.to_bytes(2, "big") for sector in sectors)
+        else:
+            if max(sectors) > 0xFF or len(sectors) > 0xFF:
+                raise FlashError("Legacy erase command cannot address this many pages")
+            self._command(CMD_ERASE)
+            packet = bytes([len(sectors) - 1]) + bytes(sectors)
+        self._send(packet + bytes([xor(packet)]), "erase", timeout)
+
+    def mass_erase(self) -> None:
+        """Erase all of flash, for parts whose sector layout is not known."""
+        if self.supports(CMD_EXTENDED_ERASE):
+            self._command(CMD_EXTENDED_ERASE)
+            self._send(b"\xff\xff\x00", "mass erase", MASS_ERASE_TIMEOUT)
+        else:
+            self._command(CMD_ERASE)
+            self._send(b"\xff\x00", "mass erase", MASS_ERASE_TIMEOUT)
+
+    def get_checksum(self, address: int, length: int) -> int:
+        """
+        Have the bootloader compute the CRC of a memory area.
+
+        Args:
+            address: Start address
+            length: Number of bytes, a multiple of 4
+
+        Returns:
+            CRC as computed by stm32_crc()
+        """
+        self._command(CMD_GET_CHECKSUM)
+        self._send_address(address)
+        size = length.to_bytes(4, "big")
+        self._send(size + bytes([xor(size)]), "checksum length", timeout=max(1.0, length / 1e6))
+        reply = read_exact(self.ser, 5, "checksum")
+        if xor(reply[:4]) != reply[4]:
+            raise FlashError("Corrupted checksum reply")
+        return int.from_bytes(reply[:4], "big")
+
+    def go(self, address: int = FLASH_BASE) -> None:
+        """Start executing code at ``address``."""
+        self._command(CMD_GO)
+        self._send_address(address)
+
+    def verify(self, segments: Sequence[Segment], max_read: Optional[int] = None) -> VerifyReport:
+        """
+        Check flash against an image.
+
+        Uses GET_CHECKSUM when the bootloader offers it; otherwise the ranges
+        are read back, sampled if they exceed ``max_read`` bytes.
+
+        Returns:
+            VerifyReport naming the method used
+        """
+        segments = word_align(segments)
+        if self.supports(CMD_GET_CHECKSUM):
+            report = verify_ranges(
+                segments,
+                device_hash=lambda address, length: f"{self.get_checksum(address, length):08x}",
+                host_hash=lambda data: f"{stm32_crc(data):08x}",
+            )
+        else:
+            report = verify_ranges(
+                segments, read=self.read_memory, max_read=max_read, page_size=WRITE_SIZE
+            )
+        for address in report.mismatches:
+            self._log(f"Verify mismatch in region at 0x{address:08X}")
+        return report
+
+    def _holds(self, address: int, data: bytes) -> bool:
+        # True if flash at ``address`` already contains ``data``
+        if self.supports(CMD_GET_CHECKSUM):
+            return self.get_checksum(address, len(data)) == stm32_crc(data)
+        return self.read_memory(address, len(data)) == data
+
+    def program(
+        self,
+        segments: Sequence[Segment],
+        verify: bool = True,
+        run: bool = True,
+        skip_blank: bool = True,
+        delta: bool = False,
+    ) -> ProgramResult:
+        """
+        Erase the sectors an image covers, write it and verify it.
+
+        Verification uses GET_CHECKSUM when the bootloader offers it and a
+        read-back of the written ranges otherwise. Either covers the pages
+        skipped for being blank, which the erase has already set to 0xFF.
+        Parts whose sector layout is not in LAYOUTS are mass erased rather
+        than erased by a guessed page size.
+
+        Args:
+            segments: (address, data) segments to write
+            verify: Check the written ranges afterwards
+            run: Jump to the start of flash when done
+            skip_blank: Do not send 256-byte packets that are all 0xFF
+            delta: Compare each sector with the device first (same checksum
+                or read-back as verification) and rewrite only those that differ
+
+        Returns:
+            ProgramResult counting 256-byte packets
+        """
+        start = time.monotonic()
+        segments = word_align(segments)
+
+        layout = self.layout
+
+        unchanged = 0
+        if delta and layout is not None:
+            changes = plan_delta(segments, partial(sector_bounds, layout), self._holds)
+            self._log(f"{changes.unchanged} of {len(changes.sectors)} sector(s) unchanged")
+            segments = changes.segments()
+            unchanged = changes.unchanged
+        elif delta:
+            self._log("Sector layout unknown; writing the whole image")
+
+        if layout is None:
+            self._log(f"No sector layout for product ID 0x{self.product_id:03X}; mass erasing")
+            self.mass_erase()
+        else:
+            sectors = sorted(
+                {
+                    sector
+                    for address, data in segments
+                    for sector in sectors_for_range(layout, address, address + len(data))
+                }
+            )
+            self._log(f"Erasing {len(sectors)} sector(s)")
+            self.erase(sectors)
+
+        result = ProgramResult(
+            pages_written=0, bytes_written=0, elapsed=0.0, sectors_unchanged=unchanged
+        )
+        if skip_blank:
+            plan = plan_writes(segments, WRITE_SIZE)
+            packets = plan.pages
+            result.pages_skipped = len(plan.skipped)
+        else:
+            packets = [
+                (address + offset, data[offset : offset + WRITE_SIZE])
+                for address, data in segments
+                for offset in range(0, len(data), WRITE_SIZE)
+            ]
+
+        for address, data in packets:
+            self.write_memory(address, bytes(data))
+            result.pages_written += 1
+            result.bytes_written += len(data)
+
+        if verify:
+            result.record(self.verify(segments))
+
+        if run:
+            self.go()
+        result.elapsed = time.monotonic() - start
+        return result
@@ -0,0 +1,232 @@
+"""
+Cached inventory of connected USB serial devices.
+
+The registry enumerates all ports once. When it is given a hotplug watcher
+it afterwards applies only the changes the watcher reports, so looking a
+device up by port, serial number or platform does not rescan every port.
+"""
+
+import os
+import sys
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .usb_detector import USBDevice, USBDetector
+from . import hotplug
+from . import sysfs
+
+Identity = Tuple[Optional[int], Optional[int], Optional[str]]
+
+
+class DeviceRegistry:
+    """In-memory device inventory indexed by port, identity and platform."""
+
+    def __init__(
+        self,
+        scan: Callable[[], List[USBDevice]] = USBDetector.detect_devices,
+        watcher: Optional[hotplug.HotplugWatcher] = None,
+    ):
+        self._scan = scan
+        self._watcher = watcher
+        self._lock = threading.RLock()
+        self._by_port: Dict[str, USBDevice] = {}
+        self._by_identity: Dict[Identity, USBDevice] = {}
+        self._by_serial: Dict[str, USBDevice] = {}
+        self._by_platform: Dict[str, Dict[str, USBDevice]] = {}
+        self._platforms: Dict[str, str] = {}
+        self._changed: Set[str] = set()
+        self._loaded = False
+        self._full_rescan = False
+        self.generation = 0
+
+    def _on_event(self, event: hotplug.PortEvent) -> None:
+        with self._lock:
+            self._changed.add(event.port)
+
+    def _ensure_loaded(self) -> None:
+        """Fill the registry on first use, then apply pending hotplug changes."""
+        if not self._loaded:
+            if self._watcher is not None:
+                self._watcher.subscribe(self._on_event)
+            self.refresh(full=True)
+            self._loaded = True
+        elif self._full_rescan:
+            self.refresh(full=True)
+        elif self._changed:
+            self.refresh()
+
+    def refresh(self, full: bool = False) -> Tuple[List[USBDevice], List[str]]:
+        """
+        Bring the registry up to date.
+
+        Args:
+            full: Re-enumerate every port instead of only the ones reported changed
+
+        Returns:
+            Tuple of (added devices, removed ports)
+        """
+        with self._lock:
+            changed, self._changed = self._changed, set()
+
+            if full or self._watcher is None or not sys.platform.startswith("linux"):
+                current = {device.port: device for device in self._scan()}
+                changed = set(self._by_port) | set(current)
+            else:
+                current = {}
+                for port in changed:
+                    device = self._probe(port)
+                    if device is not None:
+                        current[port] = device
+
+            added: List[USBDevice] = []
+            removed: List[str] = []
+            for port in sorted(changed):
+                old = self._by_port.get(port)
+                new = current.get(port)
+                if old is not None and new is not None and self._same(old, new):
+                    continue
+                if old is not None:
+                    self._remove(old)
+                    removed.append(port)
+                if new is not None:
+                    self._add(new)
+                    added.append(new)
+
+            self._full_rescan = False
+            if added or removed:
+                self.generation += 1
+            return added, removed
+
+    @staticmethod
+    def _same(a: USBDevice, b: USBDevice) -> bool:
+        return (a.vid, a.pid, a.serial_number, a.description, a.location) == (
+            b.vid,
+            b.pid,
+            b.serial_number,
+            b.description,
+            b.location,
+        )
+
+    def _probe(self, port: str) -> Optional[USBDevice]:
+        """Build the USBDevice for a single Linux port, or None if it is gone."""
+        directory, name = os.path.split(port)
+        if directory != "/dev" or not sysfs.is_port_name(name):
+            return None
+
+        try:
+            record = sysfs.read_port(name)
+        except OSError:
+            # Fall back to a full rescan if a single port cannot be read
+            self._full_rescan = True
+            return None
+
+        return USBDetector.from_record(record) if record is not None else None
+
+    def _add(self, device: USBDevice) -> None:
+        platform = USBDetector.identify_device_type(device)
+        self._by_port[device.port] = device
+        self._platforms[device.port] = platform
+        self._by_platform.setdefault(platform, {})[device.port] = device
+        if device.serial_number:
+            self._by_identity[(device.vid, device.pid, device.serial_number)] = device
+            self._by_serial[device.serial_number] = device
+
+    def _remove(self, device: USBDevice) -> None:
+        del self._by_port[device.port]
+        platform = self._platforms.pop(device.port)
+        del self._by_platform[platform][device.port]
+        if not self._by_platform[platform]:
+            del self._by_platform[platform]
+        if device.serial_number:
+            identity = (device.vid, device.pid, device.serial_number)
+            if self._by_identity.get(identity) is device:
+                del self._by_identity[identity]
+            if self._by_serial.get(device.serial_number) is device:
+                del self._by_serial[device.serial_number]
+
+    def devices(self) -> List[USBDevice]:
+        """Return all known devices, ordered by port."""
+        with self._lock:
+            self._ensure_loaded()
+            return [self._by_port[port] for port in sorted(self._by_port)]
+
+    def by_port(self, port: str) -> Optional[USBDevice]:
+        """Return the device on a port, if any."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._by_port.get(port)
+
+    def by_serial(self, serial_number: str) -> Optional[USBDevice]:
+        """Return the device with a USB serial number, if any."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._by_serial.get(serial_number)
+
+    def by_identity(
+        self, vid: Optional[int], pid: Optional[int], serial_number: str
+    ) -> Optional[USBDevice]:
+        """Return the device with a VID, PID and serial number, if any."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._by_identity.get((vid, pid, serial_number))
+
+    def by_platform(self, platform: str) -> List[USBDevice]:
+        """Return all devices identified as a platform, ordered by port."""
+        with self._lock:
+            self._ensure_loaded()
+            devices = self._by_platform.get(platform, {})
+            return [devices[port] for port in sorted(devices)]
+
+    def platform_of(self, port: str) -> Optional[str]:
+        """Return the identified platform of the device on a port."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._platforms.get(port)
+
+    def watch(self, watcher: hotplug.HotplugWatcher) -> None:
+        """
+        Start applying hotplug updates from a watcher.
+
+        Args:
+            watcher: Watcher to subscribe to; ignored if one is already attached
+        """
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = watcher
+            if self._loaded:
+                watcher.subscribe(self._on_event)
+                # Ports may have changed before the subscription
+                self._full_rescan = True
+
+    def close(self) -> None:
+        """Stop receiving hotplug updates."""
+        if self._watcher is not None:
+            self._watcher.unsubscribe(self._on_event)
+
+
+_registry: Optional[DeviceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry(watch: bool = False) -> DeviceRegistry:
+    """
+    Return the shared device registry.
+
+    Without a watcher the registry is a snapshot taken on first use, which is
+    all a one-shot command needs; long-running modes ask for hotplug updates.
+
+    Args:
+        watch: Keep the registry current with the hotplug watcher, starting
+            it if needed
+
+    Returns:
+        DeviceRegistry shared by all callers in this process
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DeviceRegistry()
+        if watch:
+            _registry.watch(hotplug.get_watcher())
+        return _registry
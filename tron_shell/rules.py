@@ -0,0 +1,154 @@
+"""
+Compiled USB detection rules.
+
+Rules from ``usb_rules`` in the YAML config are compiled once into hash
+indexes on (vendor_id, product_id) and a single keyword regex, so matching a
+port costs a few dictionary lookups instead of a scan over every rule.
+"""
+
+import re
+import heapq
+import platform
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Pattern, Tuple
+
+Rule = Dict[str, Any]
+
+
+def normalize_id(value: Any) -> Optional[str]:
+    """
+    Normalize a USB vendor or product ID to four lowercase hex digits.
+
+    Args:
+        value: ID as a string (``"2341"``), an int, or None
+
+    Returns:
+        Normalized ID, or None if no ID was given
+    """
+    if value is None:
+        return None
+    return str(value).strip().lower().zfill(4)
+
+
+class CompiledRules:
+    """
+    USB detection rules compiled for fast matching.
+
+    Matching returns the same rule the rules would give when checked one by
+    one in file order: the first rule whose IDs, path and keywords all match.
+    """
+
+    def __init__(self, rules: List[Rule], os_type: Optional[str] = None):
+        self.rules = list(rules)
+        self.os_type = os_type or platform.system().lower()
+
+        self._exact: Dict[Tuple[str, str], List[int]] = {}
+        self._vendor: Dict[str, List[int]] = {}
+        self._product: Dict[str, List[int]] = {}
+        self._wildcard: List[int] = []
+        self._paths: List[Optional[str]] = []
+        self._keywords: List[Optional[FrozenSet[int]]] = []
+        self._ids: Dict[str, int] = {}
+        self._prefixes: Dict[int, FrozenSet[int]] = {}
+        self._keyword_re: Optional[Pattern[str]] = None
+
+        keyword_ids = self._ids
+
+        for index, rule in enumerate(self.rules):
+            vid = normalize_id(rule.get("vendor_id"))
+            pid = normalize_id(rule.get("product_id"))
+            if vid is not None and pid is not None:
+                self._exact.setdefault((vid, pid), []).append(index)
+            elif vid is not None:
+                self._vendor.setdefault(vid, []).append(index)
+            elif pid is not None:
+                self._product.setdefault(pid, []).append(index)
+            else:
+                self._wildcard.append(index)
+
+            # Path rules only ever apply for the OS we are running on
+            path = (rule.get("path_contains") or {}).get(self.os_type)
+            self._paths.append(path.lower() if path is not None else None)
+
+            if "description_keywords" in rule:
+                ids = set()
+                for keyword in rule["description_keywords"] or []:
+                    keyword = str(keyword).lower()
+                    ids.add(keyword_ids.setdefault(keyword, len(keyword_ids)))
+                self._keywords.append(frozenset(ids))
+            else:
+                self._keywords.append(None)
+
+        if keyword_ids:
+            # One lookahead alternation finds the longest keyword starting at
+            # every position; shorter keywords sharing that start are its prefixes
+            keywords = sorted(keyword_ids, key=len, reverse=True)
+            pattern = "|".join(re.escape(keyword) for keyword in keywords if keyword)
+            if pattern:
+                self._keyword_re = re.compile(f"(?=({pattern}))")
+            self._prefixes = {
+                keyword_ids[keyword]: frozenset(
+                    keyword_ids[keyword[:end]]
+                    for end in range(1, len(keyword) + 1)
+                    if keyword[:end] in keyword_ids
+                )
+                for keyword in keyword_ids
+            }
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _candidates(self, vid: Optional[str], pid: Optional[str]) -> Iterator[int]:
+        """Yield indexes of rules whose IDs allow this device, in rule order."""
+        buckets = [self._wildcard]
+        if vid is not None:
+            buckets.append(self._vendor.get(vid, []))
+            if pid is not None:
+                buckets.append(self._exact.get((vid, pid), []))
+        if pid is not None:
+            buckets.append(self._product.get(pid, []))
+        return heapq.merge(*buckets)
+
+    def _found_keywords(self, description: str) -> FrozenSet[int]:
+        """Return ids of every keyword occurring in a lowercased description."""
+        found = set()
+        if self._keyword_re is not None:
+            for match in self._keyword_re.finditer(description):
+                found |= self._prefixes[self._ids[match.group(1)]]
+        if "" in self._ids:
+            # An empty keyword is contained in every description
+            found.add(self._ids[""])
+        return frozenset(found)
+
+    def match(
+        self, vid: Optional[str], pid: Optional[str], port_path: str, description: str
+    ) -> Optional[Rule]:
+        """
+        Find the first rule matching a device.
+
+        Args:
+            vid: Vendor ID as four lowercase hex digits, or None
+            pid: Product ID as four lowercase hex digits, or None
+            port_path: Serial port path
+            description: Port description
+
+        Returns:
+            Matching rule, or None
+        """
+        path_lower = port_path.lower()
+        found = None
+
+        for index in self._candidates(vid, pid):
+            path = self._paths[index]
+            if path is not None and path not in path_lower:
+                continue
+
+            keywords = self._keywords[index]
+            if keywords is not None:
+                if found is None:
+                    found = self._found_keywords(description.lower())
+                if keywords.isdisjoint(found):
+                    continue
+
+            return self.rules[index]
+
+        return None
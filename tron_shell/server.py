@@ -0,0 +1,345 @@
+"""
+Long-running job server behind ``tron serve``.
+
+A ``tron`` process pays interpreter startup, imports, config parsing and a
+USB scan before it touches a board. The server pays them once: it keeps the
+device registry (kept current by hotplug events) and the compiled detection
+rules in memory, and takes jobs over a Unix domain socket.
+
+The protocol is JSON lines. Each request is one object::
+
+    {"id": 1, "op": "flash", "port": "/dev/ttyUSB0", "firmware": "/abs/fw.hex",
+     "platform": "arduino", "verify": true, "reset": true,
+     "options": {"method": "stk500"}}
+
+``op`` is one of ``flash``, ``verify``, ``reset``, ``devices`` or ``ping``;
+``firmware`` should be an absolute path. Jobs are queued per port, so jobs
+for one board run in order while different boards run concurrently. Every
+request gets events back, tagged with its ``id``::
+
+    {"id": 1, "event": "queued", "port": "/dev/ttyUSB0", "position": 0}
+    {"id": 1, "event": "progress", "status": "flashing"}
+    {"id": 1, "event": "done", "ok": true, "elapsed": 1.92, "verify_method": "read-back"}
+
+Progress events sent while resetting may carry a ``message`` (manual boot
+instructions, or why the bootloader did not answer). A request always ends
+with exactly one ``done`` event; failures carry an ``error`` message.
+"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from . import aio
+from .config import cache_dir
+from .flasher import FlashError, get_flasher
+from .identify import BoardIdentifier, get_identifier
+from .registry import DeviceRegistry, get_registry
+
+# Operations queued per port
+JOB_OPERATIONS = ("flash", "verify", "reset")
+
+# Longest request line accepted
+MAX_REQUEST = 64 * 1024
+
+
+def default_socket_path() -> Path:
+    """Return the server's socket path: in $XDG_RUNTIME_DIR, else the cache directory."""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return Path(runtime) / "tron-shell.sock"
+    return cache_dir() / "tron.sock"
+
+
+@dataclass
+class Job:
+    """A queued flash, verify or reset request."""
+
+    id: Any
+    op: str
+    port: str
+    send: Callable[[Dict[str, Any]], None]
+    firmware: Optional[str] = None
+    platform: Optional[str] = None
+    verify: bool = True
+    reset: bool = True
+    options: Dict[str, Any] = field(default_factory=dict)
+
+
+class FlashServer:
+    """Serves flash, verify and reset jobs over a Unix domain socket."""
+
+    def __init__(
+        self,
+        path: Optional[os.PathLike] = None,
+        registry: Optional[DeviceRegistry] = None,
+        identifier: Optional[BoardIdentifier] = None,
+        verbose: bool = False,
+    ):
+        """
+        Args:
+            path: Socket path (default_socket_path() if not given)
+            registry: Device inventory (the shared registry if not given)
+            identifier: Board identifier (the shared one if not given)
+            verbose: Enable verbose flasher output
+        """
+        self.path = Path(path) if path is not None else default_socket_path()
+        self.registry = registry or get_registry(watch=True)
+        self.identifier = identifier or get_identifier()
+        self.verbose = verbose
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._busy: Dict[str, bool] = {}
+
+    async def start(self) -> None:
+        """
+        Warm the inventory and start listening.
+
+        Raises:
+            FlashError: If another server is already listening on the socket
+        """
+        if self.path.exists():
+            probe = socket.socket(socket.AF_UNIX)
+            try:
+                probe.connect(str(self.path))
+            except OSError:
+                # Left behind by a server that did not shut down cleanly
+                self.path.unlink()
+            else:
+                raise FlashError(f"A server is already listening on {self.path}")
+            finally:
+                probe.close()
+
+        # Scan and identify now, not on the first job
+        loop = asyncio.get_running_loop()
+        devices = await loop.run_in_executor(None, self.registry.devices)
+        await loop.run_in_executor(None, self.identifier.identify_many, devices)
+
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        listener = socket.socket(socket.AF_UNIX)
+        # Bound under a tight umask so the socket is never reachable by others,
+        # not even between bind() and a later chmod()
+        umask = os.umask(0o177)
+        try:
+            listener.bind(str(self.path))
+        except OSError:
+            listener.close()
+            raise
+        finally:
+            os.umask(umask)
+        self._server = await asyncio.start_unix_server(
+            self._handle, sock=listener, limit=MAX_REQUEST
+        )
+
+    async def serve_forever(self) -> None:
+        """Serve until cancelled."""
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Stop listening, cancel queued jobs and remove the socket."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for worker in self._workers.values():
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        def send(event: Dict[str, Any]) -> None:
+            if not writer.is_closing():
+                writer.write(json.dumps(event).encode() + b"\n")
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    send({"id": None, "event": "done", "ok": False, "error": "Request too long"})
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    await self._dispatch(line, send)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, line: bytes, send: Callable[[Dict[str, Any]], None]) -> None:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be an object")
+        except ValueError as e:
+            send({"id": None, "event": "done", "ok": False, "error": f"Invalid request: {e}"})
+            return
+
+        request_id = request.get("id")
+        op = request.get("op")
+        if op == "ping":
+            send({"id": request_id, "event": "done", "ok": True})
+        elif op == "devices":
+            # A refresh reads sysfs or rescans; keep it off the loop serving other clients
+            devices = await asyncio.get_running_loop().run_in_executor(None, self._devices)
+            send({"id": request_id, "event": "done", "ok": True, "devices": devices})
+        elif op in JOB_OPERATIONS:
+            error = self._check(request)
+            if error:
+                send({"id": request_id, "event": "done", "ok": False, "error": error})
+                return
+            self._submit(
+                Job(
+                    id=request_id,
+                    op=op,
+                    port=request["port"],
+                    send=send,
+                    firmware=request.get("firmware"),
+                    platform=request.get("platform"),
+                    verify=bool(request.get("verify", True)),
+                    reset=bool(request.get("reset", True)),
+                    options=dict(request.get("options") or {}),
+                )
+            )
+        else:
+            send({"id": request_id, "event": "done", "ok": False, "error": f"Unknown op: {op}"})
+
+    @staticmethod
+    def _check(request: Dict[str, Any]) -> Optional[str]:
+        if not isinstance(request.get("port"), str):
+            return "Missing port"
+        if request["op"] != "reset" and not isinstance(request.get("firmware"), str):
+            return "Missing firmware"
+        if not isinstance(request.get("options") or {}, dict):
+            return "options must be an object"
+        return None
+
+    def _devices(self) -> List[Dict[str, Any]]:
+        devices = self.registry.devices()
+        return [
+            {
+                "port": device.port,
+                "vid_pid": device.vid_pid,
+                "serial_number": device.serial_number,
+                "location": device.location,
+                "description": device.description,
+                "name": info.name,
+                "platform": info.platform,
+            }
+            for device, info in zip(devices, self.identifier.identify_many(devices))
+        ]
+
+    def _submit(self, job: Job) -> None:
+        queue = self._queues.get(job.port)
+        if queue is None:
+            queue = self._queues[job.port] = asyncio.Queue()
+            self._workers[job.port] = asyncio.ensure_future(self._port_worker(job.port, queue))
+        position = queue.qsize() + (1 if self._busy.get(job.port) else 0)
+        job.send({"id": job.id, "event": "queued", "port": job.port, "position": position})
+        queue.put_nowait(job)
+
+    async def _port_worker(self, port: str, queue: asyncio.Queue) -> None:
+        while True:
+            job = await queue.get()
+            self._busy[port] = True
+            start = time.monotonic()
+            try:
+                outcome = await self._run(job)
+            except FlashError as e:
+                outcome = {"ok": False, "error": str(e)}
+            except Exception as e:
+                outcome = {"ok": False, "error": f"Unexpected error: {e}"}
+            finally:
+                self._busy[port] = False
+            job.send(
+                {
+                    "id": job.id,
+                    "event": "done",
+                    "elapsed": round(time.monotonic() - start, 3),
+                    **outcome,
+                }
+            )
+
+    def _platform(self, job: Job) -> str:
+        if job.platform:
+            return job.platform
+        device = self.registry.by_port(job.port)
+        return self.identifier.identify(device).name if device else "generic"
+
+    async def _run(self, job: Job) -> Dict[str, Any]:
+        def status(name: str) -> None:
+            job.send({"id": job.id, "event": "progress", "status": name})
+
+        def log(message: str) -> None:
+            job.send({"id": job.id, "event": "progress", "status": "resetting", "message": message})
+
+        platform = await asyncio.get_running_loop().run_in_executor(None, self._platform, job)
+        if job.op == "reset":
+            status("resetting")
+            if not await aio.enter_bootloader(job.port, platform, log):
+                return {"ok": False, "error": "Reset failed"}
+            return {"ok": True}
+
+        flasher = get_flasher(platform, job.port, self.verbose)
+        async with aio.session(flasher, **job.options):
+            if job.op == "flash":
+                if job.reset:
+                    status("resetting")
+                    if not await aio.enter_bootloader(job.port, platform, log):
+                        return {"ok": False, "error": "Bootloader not responding"}
+                status("flashing")
+                if not await aio.flash(flasher, job.firmware, **job.options):
+                    return {"ok": False, "error": "Flash failed"}
+                if not job.verify:
+                    return {"ok": True}
+
+            status("verifying")
+            if not await aio.verify(flasher, job.firmware, **job.options):
+                return {
+                    "ok": False,
+                    "error": "Verification failed",
+                    "verify_method": flasher.verify_method,
+                }
+        return {"ok": True, "verify_method": flasher.verify_method}
+
+
+def submit(
+    request: Dict[str, Any], path: Optional[os.PathLike] = None, timeout: Optional[float] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Send one request to a running server and yield its events.
+
+    A minimal blocking client for scripts; controllers that keep many jobs in
+    flight should hold one connection and match events by ``id``.
+
+    Yields:
+        Event objects, ending with the request's ``done`` event
+
+    Raises:
+        OSError: If the server cannot be reached
+    """
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(path if path is not None else default_socket_path()))
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("rb") as stream:
+            for line in stream:
+                event = json.loads(line)
+                yield event
+                if event.get("event") == "done":
+                    return
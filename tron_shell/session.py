@@ -0,0 +1,219 @@
+"""
+Pooled serial sessions.
+
+Opening a tty costs tens of milliseconds of setup, and on most USB-serial
+boards every open (and close) pulses DTR and resets the board. The pool keeps
+one ``serial.Serial`` handle per port and hands out leases on it: the reset,
+sync, write and verify steps of one operation all lease the same open handle,
+with baud rate and line settings changed in place and put back when a nested
+lease ends. The handle is closed when the outermost lease ends, so holding a
+lease across a whole operation is what keeps the port open between steps.
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional
+
+import serial
+
+# Settings for a port's first open when a lease does not give them
+DEFAULT_SETTINGS = {"baudrate": 115200, "timeout": 1}
+
+# Owner of the leases taken in this context, if not the thread (see lease_owner())
+_owner: "ContextVar[Optional[object]]" = ContextVar("tron_lease_owner", default=None)
+
+
+@contextmanager
+def lease_owner() -> Iterator[None]:
+    """
+    Make leases taken in this context belong to one owner instead of a thread.
+
+    asyncio code runs one board's steps on the event loop and on worker
+    threads; with the context copied into the workers, those steps nest their
+    leases as they would on one thread. Inside an existing owner, that owner
+    is kept.
+    """
+    if _owner.get() is not None:
+        yield
+        return
+    token = _owner.set(object())
+    try:
+        yield
+    finally:
+        _owner.reset(token)
+
+
+class _OwnerLock:
+    """Reentrant lock held by the current lease owner, or else the thread."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._holder: Optional[object] = None
+        self._depth = 0
+
+    def __enter__(self) -> None:
+        owner = _owner.get()
+        if owner is None:
+            owner = threading.get_ident()
+        with self._condition:
+            while self._holder is not None and self._holder != owner:
+                self._condition.wait()
+            self._holder = owner
+            self._depth += 1
+
+    def __exit__(self, *exc) -> None:
+        # Released by whichever thread ends the lease, not necessarily the one that took it
+        with self._condition:
+            self._depth -= 1
+            if self._depth == 0:
+                self._holder = None
+                self._condition.notify_all()
+
+
+class _Session:
+    """One port's handle and the leases on it."""
+
+    def __init__(self):
+        self.lock = _OwnerLock()
+        self.handle: Optional[serial.Serial] = None
+        self.leases = 0
+        # Probe whose bootloader answered on the open handle and has not been claimed
+        self.bootloader: Optional[str] = None
+
+
+class SerialSessionPool:
+    """
+    One open serial handle per port, shared by leases.
+
+    A lease is exclusive to its owner, the thread unless lease_owner() says
+    otherwise: another owner leasing the same port waits until every lease on
+    it is released. Leases nest within an owner, and nested leases share the
+    handle.
+    """
+
+    def __init__(self, factory: Callable[[], serial.Serial] = serial.Serial):
+        """
+        Args:
+            factory: Creates an unopened handle; replaced in tests
+        """
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, _Session] = {}
+
+    def _session(self, port: str) -> _Session:
+        with self._lock:
+            session = self._sessions.get(port)
+            if session is None:
+                session = self._sessions[port] = _Session()
+            return session
+
+    @contextmanager
+    def lease(self, port: str, **settings) -> Iterator[serial.Serial]:
+        """
+        Lease the open handle for a port, opening it if need be.
+
+        Args:
+            port: Serial port
+            **settings: pyserial attributes to apply (baudrate, timeout,
+                parity, ...); only those that differ are changed, without
+                reopening the port, and restored when a nested lease ends
+
+        Yields:
+            The port's handle
+
+        Raises:
+            serial.SerialException: If the port cannot be opened
+        """
+        session = self._session(port)
+        with session.lock:
+            saved: Dict[str, object] = {}
+            if session.handle is None or not session.handle.is_open:
+                handle = self._factory()
+                handle.port = port
+                for name, value in {**DEFAULT_SETTINGS, **settings}.items():
+                    setattr(handle, name, value)
+                handle.open()
+                session.handle = handle
+            else:
+                handle = session.handle
+                for name, value in settings.items():
+                    current = getattr(handle, name)
+                    if current != value:
+                        saved[name] = current
+                        setattr(handle, name, value)
+
+            session.leases += 1
+            try:
+                yield handle
+            finally:
+                session.leases -= 1
+                if session.leases == 0:
+                    self._close(session)
+                elif saved and session.handle is handle and handle.is_open:
+                    # Hand the enclosing lease back the settings it had
+                    for name, value in saved.items():
+                        setattr(handle, name, value)
+
+    def held(self, port: str) -> bool:
+        """Return True if the port's handle is open."""
+        session = self._sessions.get(port)
+        return session is not None and session.handle is not None and session.handle.is_open
+
+    def note_bootloader(self, port: str, probe: str) -> None:
+        """
+        Record that a probe's bootloader answered on the port's open handle.
+
+        A reset done inside a longer lease notes this so the session that
+        follows on the same handle can claim it rather than reset the board
+        again. Closing the handle forgets it.
+        """
+        with self._lock:
+            session = self._sessions.get(port)
+            if session is not None and session.handle is not None and session.handle.is_open:
+                session.bootloader = probe
+
+    def claim_bootloader(self, port: str, probe: str) -> bool:
+        """Return True, once, if the probe's bootloader was noted on the open handle."""
+        with self._lock:
+            session = self._sessions.get(port)
+            if session is None or session.handle is None or not session.handle.is_open:
+                return False
+            claimed, session.bootloader = session.bootloader == probe, None
+            return claimed
+
+    def close(self, port: str) -> None:
+        """
+        Close a port's handle now, before its leases end.
+
+        For a device about to drop off USB (a 1200 baud touch, a reboot into
+        a different USB bootloader): leases still held see a closed handle,
+        and the next lease opens the port afresh.
+        """
+        session = self._sessions.get(port)
+        if session is not None:
+            with session.lock:
+                self._close(session)
+
+    def _close(self, session: _Session) -> None:
+        handle, session.handle = session.handle, None
+        session.bootloader = None
+        if handle is not None:
+            try:
+                handle.close()
+            except (OSError, serial.SerialException):
+                # The device may already be gone
+                pass
+
+
+_pool: Optional[SerialSessionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SerialSessionPool:
+    """Return the shared SerialSessionPool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SerialSessionPool()
+        return _pool
@@ -0,0 +1,239 @@
+"""
+Hands-free production flashing.
+
+A station watches for boards being plugged in and flashes each one as soon as
+it appears, so the line runs at the speed boards can be plugged rather than
+the speed an operator can start ``tron flash``. New ports come from hotplug
+events; a port qualifies if its device matches the configured detection rules
+(the same rule matching tron_core's USBDetector uses) or an explicit VID:PID.
+"""
+
+import time
+import asyncio
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from . import aio, hotplug
+from .batch import PortResult
+from .flasher import flasher_family
+from .identify import BoardIdentifier, get_identifier
+from .registry import DeviceRegistry, get_registry
+from .usb_detector import USBDevice
+
+# Seconds over which the boards-per-minute rate is measured
+RATE_WINDOW = 300.0
+
+# How long a new port is given to show up in the registry with its USB details
+ARRIVAL_SETTLE = 2.0
+ARRIVAL_POLL = 0.1
+
+# A board re-enumerating after its flash (native USB boards reboot into the
+# application) is not flashed again if it comes back within this many seconds
+REFLASH_GUARD = 30.0
+
+
+class RateMeter:
+    """Rolling boards-per-minute over a time window."""
+
+    def __init__(self, window: float = RATE_WINDOW, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.started = clock()
+        self._finished: deque = deque()
+
+    def record(self) -> None:
+        """Count a finished board."""
+        self._finished.append(self.clock())
+
+    def rate(self) -> float:
+        """Return boards per minute over the window (or since start, if shorter)."""
+        now = self.clock()
+        while self._finished and self._finished[0] < now - self.window:
+            self._finished.popleft()
+        span = min(self.window, now - self.started)
+        if span <= 0:
+            return 0.0
+        return len(self._finished) * 60.0 / span
+
+
+class Station:
+    """Flashes every matching board as it is plugged in."""
+
+    def __init__(
+        self,
+        firmware: str,
+        platform: Optional[str] = None,
+        concurrency: int = 4,
+        verify: bool = True,
+        reset: bool = True,
+        verbose: bool = False,
+        flash_options: Optional[Dict] = None,
+        vid_pids: Iterable[str] = (),
+        flash_present: bool = False,
+        on_update: Optional[Callable[[PortResult], None]] = None,
+        registry: Optional[DeviceRegistry] = None,
+        identifier: Optional[BoardIdentifier] = None,
+        watcher: Optional[hotplug.HotplugWatcher] = None,
+    ):
+        """
+        Args:
+            firmware: Path to the firmware file
+            platform: Platform to flash; boards are matched on the platform
+                of their detection rule or their identified name
+            concurrency: Most boards flashed at the same time
+            verify: Verify each board after flashing
+            reset: Reset each board into its bootloader before flashing
+            verbose: Enable verbose flasher output
+            flash_options: Extra keyword arguments passed to the flasher
+            vid_pids: Also accept devices with these VID:PIDs (``2341:0043``);
+                without a platform, accept only these
+            flash_present: Also flash matching boards already connected at start
+            on_update: Called with a board's PortResult whenever it changes
+            registry: Device inventory (the shared registry if not given)
+            identifier: Rule matching (the shared identifier if not given)
+            watcher: Hotplug watcher (the shared watcher if not given)
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.firmware = firmware
+        self.platform = platform
+        self.verify = verify
+        self.reset = reset
+        self.verbose = verbose
+        self.flash_options = dict(flash_options or {})
+        self.vid_pids = {vid_pid.upper() for vid_pid in vid_pids}
+        self.flash_present = flash_present
+        self.on_update = on_update
+        self.registry = registry or get_registry(watch=True)
+        self.identifier = identifier or get_identifier()
+        self.watcher = watcher or hotplug.get_watcher()
+        self.results: List[PortResult] = []
+        self.meter = RateMeter()
+        self.concurrency = concurrency
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._active: Set[str] = set()
+        self._flashed: Dict[str, float] = {}
+
+    @property
+    def succeeded(self) -> int:
+        """Number of boards flashed successfully."""
+        return sum(1 for result in self.results if result.ok)
+
+    @property
+    def failed(self) -> int:
+        """Number of boards that failed."""
+        return sum(1 for result in self.results if result.status == aio.FAILED)
+
+    def matches(self, device: USBDevice) -> bool:
+        """
+        Return True if a device should be flashed.
+
+        With VID:PIDs but no platform, only those VID:PIDs match; otherwise a
+        device matches on its VID:PID, or on the platform it is identified as
+        (any recognized board when no platform is set).
+        """
+        if device.vid_pid in self.vid_pids:
+            return True
+        if self.platform is None and self.vid_pids:
+            return False
+        info = self.identifier.identify(device)
+        if self.platform is None:
+            return info.known
+        wanted = self.platform.lower()
+        return wanted in (info.platform or "").lower() or wanted in info.name.lower()
+
+    async def run(self) -> None:
+        """Flash boards as they arrive, until cancelled."""
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        tasks: Set[asyncio.Task] = set()
+        # Made here rather than in __init__: before Python 3.10 it binds to the current loop
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+        def on_event(event: hotplug.PortEvent) -> None:
+            if event.action == hotplug.PORT_ADDED:
+                loop.call_soon_threadsafe(events.put_nowait, event.port)
+
+        def start(port: str) -> None:
+            task = asyncio.ensure_future(self._arrived(port))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        self.watcher.subscribe(on_event)
+        try:
+            present = await loop.run_in_executor(None, self.registry.devices)
+            if self.flash_present:
+                for device in present:
+                    start(device.port)
+            while True:
+                start(await events.get())
+        finally:
+            self.watcher.unsubscribe(on_event)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _lookup(self, port: str) -> Optional[USBDevice]:
+        """Wait for a new port's device to be readable and to match."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + ARRIVAL_SETTLE
+        while True:
+            device = await loop.run_in_executor(None, self.registry.by_port, port)
+            if device is not None and self.matches(device):
+                return device
+            if loop.time() >= deadline:
+                return None
+            # USB details can lag the device node by a few milliseconds
+            await asyncio.sleep(ARRIVAL_POLL)
+
+    async def _arrived(self, port: str) -> None:
+        if port in self._active:
+            return
+        self._active.add(port)
+        try:
+            device = await self._lookup(port)
+            if device is None:
+                return
+            flashed = self._flashed.get(device.serial_number) if device.serial_number else None
+            if flashed is not None and time.monotonic() - flashed < REFLASH_GUARD:
+                return
+
+            info = self.identifier.identify(device)
+            if self.platform:
+                platform = self.platform
+            else:
+                # Rules name the chip (atmega328p, esp32); flash it with its family's flasher
+                platform = flasher_family(info.platform or info.name)
+            result = PortResult(
+                port=port, platform=platform or info.platform or info.name, location=device.location
+            )
+            self.results.append(result)
+            if platform is None:
+                # The generic flasher only simulates, so it would report the board flashed
+                result.status = aio.FAILED
+                result.error = f"No flasher for {result.platform}"
+                if self.on_update:
+                    self.on_update(result)
+                return
+            if self.on_update:
+                self.on_update(result)
+
+            async with self._slots:
+                await aio.flash_board(
+                    result,
+                    self.firmware,
+                    self.verify,
+                    self.reset,
+                    self.verbose,
+                    self.flash_options,
+                    self.on_update,
+                )
+            if result.ok:
+                self.meter.record()
+                if device.serial_number:
+                    self._flashed[device.serial_number] = time.monotonic()
+            if self.on_update:
+                self.on_update(result)
+        finally:
+            self._active.discard(port)
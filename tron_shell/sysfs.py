@@ -0,0 +1,191 @@
+"""
+Fast serial port enumeration from Linux sysfs.
+
+Reads only the USB attributes Tron Shell uses, once per USB device, straight
+from /sys/class/tty instead of going through pyserial's comports().
+"""
+
+import os
+import fnmatch
+from typing import Dict, List, NamedTuple, Optional
+
+SYSFS_TTY = "/sys/class/tty"
+
+# Device nodes pyserial considers serial ports on Linux
+PORT_PATTERNS = (
+    "ttyS*",
+    "ttyUSB*",
+    "ttyXRUSB*",
+    "ttyACM*",
+    "ttyAMA*",
+    "rfcomm*",
+    "ttyAP*",
+    "ttyGS*",
+)
+
+# Attributes read from the USB device directory
+_DEVICE_ATTRIBUTES = (
+    "idVendor",
+    "idProduct",
+    "serial",
+    "manufacturer",
+    "product",
+    "bNumInterfaces",
+)
+
+
+class PortRecord(NamedTuple):
+    """Compact description of a serial port."""
+
+    device: str
+    vid: Optional[int]
+    pid: Optional[int]
+    serial_number: Optional[str]
+    manufacturer: Optional[str]
+    product: Optional[str]
+    interface: Optional[str]
+    location: Optional[str]
+
+    @property
+    def description(self) -> str:
+        """Return the description pyserial would report for this port."""
+        if self.interface is not None:
+            return f"{self.product} - {self.interface}"
+        if self.product is not None:
+            return self.product
+        if self.vid is None:
+            return "n/a"
+        return os.path.basename(self.device)
+
+
+def available(root: str = SYSFS_TTY) -> bool:
+    """Return True if sysfs tty enumeration is possible on this system."""
+    return os.path.isdir(root)
+
+
+def is_port_name(name: str) -> bool:
+    """Return True if a /dev entry name looks like a serial port."""
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in PORT_PATTERNS)
+
+
+def _read(directory: str, name: str) -> Optional[str]:
+    """Read a single sysfs attribute, or None if it does not exist."""
+    try:
+        fd = os.open(os.path.join(directory, name), os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        return os.read(fd, 4096).decode("utf-8", "replace").strip()
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+def _read_usb_device(directory: str) -> Dict[str, Optional[str]]:
+    return {name: _read(directory, name) for name in _DEVICE_ATTRIBUTES}
+
+
+def read_port(
+    name: str,
+    root: str = SYSFS_TTY,
+    dev: str = "/dev",
+    cache: Optional[Dict[str, Dict[str, Optional[str]]]] = None,
+) -> Optional[PortRecord]:
+    """
+    Read the record of a single tty.
+
+    Args:
+        name: tty name (e.g. ttyACM0)
+        root: sysfs tty class directory
+        dev: Directory holding the device nodes
+        cache: USB device attributes already read in this pass, by directory;
+            when given, the caller has already checked that the device node exists
+
+    Returns:
+        PortRecord, or None if the tty has no backing device (virtual or
+        platform consoles, which pyserial skips as well)
+    """
+    port = os.path.join(dev, name)
+    if cache is None and not os.path.exists(port):
+        return None
+
+    link = os.path.join(root, name, "device")
+    try:
+        device_path = os.path.realpath(link, strict=True)
+    except (OSError, TypeError):
+        # realpath(strict=) is Python 3.10+; older versions check existence
+        if not os.path.exists(link):
+            return None
+        device_path = os.path.realpath(link)
+
+    subsystem = os.path.basename(os.path.realpath(os.path.join(device_path, "subsystem")))
+    if subsystem == "platform":
+        return None
+
+    if subsystem == "usb-serial":
+        interface_path = os.path.dirname(device_path)
+    elif subsystem == "usb":
+        interface_path = device_path
+    else:
+        return PortRecord(port, None, None, None, None, None, None, None)
+
+    usb_path = os.path.dirname(interface_path)
+    if cache is not None and usb_path in cache:
+        attributes = cache[usb_path]
+    else:
+        attributes = _read_usb_device(usb_path)
+        if cache is not None:
+            cache[usb_path] = attributes
+
+    if attributes["idVendor"] is None or attributes["idProduct"] is None:
+        return PortRecord(port, None, None, None, None, None, None, None)
+
+    try:
+        interfaces = int(attributes["bNumInterfaces"] or 1)
+    except ValueError:
+        interfaces = 1
+
+    return PortRecord(
+        device=port,
+        vid=int(attributes["idVendor"], 16),
+        pid=int(attributes["idProduct"], 16),
+        serial_number=attributes["serial"],
+        manufacturer=attributes["manufacturer"],
+        product=attributes["product"],
+        interface=_read(interface_path, "interface"),
+        location=os.path.basename(interface_path if interfaces > 1 else usb_path),
+    )
+
+
+def enumerate_ports(root: str = SYSFS_TTY, dev: str = "/dev") -> List[PortRecord]:
+    """
+    Enumerate all serial ports in one pass over sysfs.
+
+    Each USB device's attributes are read once even when it exposes several
+    tty interfaces.
+
+    Args:
+        root: sysfs tty class directory
+        dev: Directory holding the device nodes
+
+    Returns:
+        List of PortRecord sorted by port
+    """
+    try:
+        nodes = set(os.listdir(dev))
+        names = sorted(
+            entry.name
+            for entry in os.scandir(root)
+            if entry.name in nodes and is_port_name(entry.name)
+        )
+    except OSError:
+        return []
+
+    cache: Dict[str, Dict[str, Optional[str]]] = {}
+    records = []
+    for name in names:
+        record = read_port(name, root, dev, cache)
+        if record is not None:
+            records.append(record)
+    return records
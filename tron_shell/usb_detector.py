@@ -2,10 +2,12 @@
 USB device detection and management module.
 """
 
-import serial.tools.list_ports
 from typing import List, Optional
 from dataclasses import dataclass
 
+from . import sysfs
+from .identify import get_identifier
+
 
 @dataclass
 class USBDevice:
@@ -18,6 +20,7 @@ class USBDevice:
     manufacturer: Optional[str]
     product: Optional[str]
     description: str
+    location: Optional[str] = None
 
     def __str__(self) -> str:
         return f"{self.port} - {self.description}"
@@ -46,13 +49,22 @@ class USBDetector:
     }
 
     @staticmethod
-    def detect_devices() -> List[USBDevice]:
+    def detect_devices(backend: str = "auto") -> List[USBDevice]:
         """
         Detect all connected USB serial devices.
 
+        Args:
+            backend: Enumeration backend: "sysfs" (Linux only), "pyserial",
+                or "auto" to use sysfs where available
+
         Returns:
             List of USBDevice objects representing connected devices.
         """
+        if backend == "sysfs" or (backend == "auto" and sysfs.available()):
+            return [USBDetector.from_record(record) for record in sysfs.enumerate_ports()]
+
+        import serial.tools.list_ports
+
         devices = []
         ports = serial.tools.list_ports.comports()
 
@@ -65,11 +77,34 @@ class USBDetector:
                 manufacturer=port.manufacturer,
                 product=port.product,
                 description=port.description,
+                location=port.location,
             )
             devices.append(device)
 
         return devices
 
+    @staticmethod
+    def from_record(record: sysfs.PortRecord) -> USBDevice:
+        """
+        Build a USBDevice from a sysfs port record.
+
+        Args:
+            record: PortRecord from the sysfs backend
+
+        Returns:
+            Equivalent USBDevice
+        """
+        return USBDevice(
+            port=record.device,
+            vid=record.vid,
+            pid=record.pid,
+            serial_number=record.serial_number,
+            manufacturer=record.manufacturer,
+            product=record.product,
+            description=record.description,
+            location=record.location,
+        )
+
     @staticmethod
     def identify_device_type(device: USBDevice) -> str:
         """
@@ -81,28 +116,7 @@ class USBDetector:
         Returns:
             String describing the device type
         """
-        # Check exact VID:PID match
-        if device.vid and device.pid:
-            key = (device.vid, device.pid)
-            if key in USBDetector.KNOWN_DEVICES:
-                return USBDetector.KNOWN_DEVICES[key]
-
-        # Check VID-only match
-        if device.vid:
-            key = (device.vid, None)
-            if key in USBDetector.KNOWN_DEVICES:
-                return USBDetector.KNOWN_DEVICES[key]
-
-        # Check description for known patterns
-        desc_lower = device.description.lower()
-        if "arduino" in desc_lower:
-            return "Arduino"
-        elif "esp32" in desc_lower or "esp8266" in desc_lower:
-            return "Espressif"
-        elif "stm32" in desc_lower or "stlink" in desc_lower:
-            return "STM32"
-
-        return "Unknown"
+        return get_identifier().identify(device).name
 
     @staticmethod
     def find_device_by_port(port: str) -> Optional[USBDevice]:
@@ -115,11 +129,9 @@ class USBDetector:
         Returns:
             USBDevice if found, None otherwise
         """
-        devices = USBDetector.detect_devices()
-        for device in devices:
-            if device.port == port:
-                return device
-        return None
+        from .registry import get_registry
+
+        return get_registry().by_port(port)
 
     @staticmethod
     def auto_detect_target() -> Optional[USBDevice]:
@@ -129,12 +141,14 @@ class USBDetector:
         Returns:
             First detected microcontroller device, or None
         """
-        devices = USBDetector.detect_devices()
+        from .registry import get_registry
+
+        registry = get_registry()
+        devices = registry.devices()
 
         # Prefer known microcontroller devices
         for device in devices:
-            device_type = USBDetector.identify_device_type(device)
-            if device_type != "Unknown":
+            if registry.platform_of(device.port) != "Unknown":
                 return device
 
         # Return first device if any
@@ -0,0 +1,143 @@
+"""
+Post-flash verification strategies.
+
+Each backend verifies with the cheapest check that is still meaningful:
+
+- ``device-hash``: the bootloader hashes each written range itself (ESP32
+  MD5, STM32 CRC), so only digests cross the link.
+- ``read-back``: the written ranges, not the whole of flash, are read back
+  and hashed on the host.
+- ``sampled``: only a sample of pages is read back, always including the
+  first and last page of each range. Used as a last resort when a full
+  read-back would exceed a byte budget; it can miss corruption elsewhere.
+"""
+
+import random
+import hashlib
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from .firmware import Segment
+from .flasher import FlashError
+
+DEVICE_HASH = "device-hash"
+READ_BACK = "read-back"
+SAMPLED = "sampled"
+
+# Hashes ``length`` bytes of device memory at ``address`` on the device
+DeviceHash = Callable[[int, int], str]
+
+# Reads ``length`` bytes of device memory at ``address``
+ReadMemory = Callable[[int, int], bytes]
+
+
+def md5_hex(data: bytes) -> str:
+    """Default host-side hash."""
+    return hashlib.md5(data).hexdigest()
+
+
+@dataclass
+class VerifyReport:
+    """Outcome of verifying written ranges, and how it was done."""
+
+    method: str
+    verified: bool = True
+    image_digest: str = ""
+    device_digest: str = ""
+    bytes_read: int = 0
+    mismatches: List[int] = field(default_factory=list)
+
+
+def sample_pages(
+    segments: Sequence[Segment], page_size: int, budget: int, rng: random.Random
+) -> List[Tuple[int, bytes]]:
+    """
+    Pick pages to read back within a byte budget.
+
+    The first and last page of every range are always included, since they
+    hold vector tables and the tail of a truncated write; the rest of the
+    budget is spent on pages chosen at random.
+
+    Returns:
+        (address, expected data) pages in address order
+    """
+    pages = []
+    for address, data in segments:
+        pages.extend(
+            (address + offset, bytes(data[offset : offset + page_size]))
+            for offset in range(0, len(data), page_size)
+        )
+
+    chosen = set()
+    for address, data in segments:
+        last = (len(data) - 1) // page_size * page_size
+        chosen.update((address, address + last))
+    remaining = [page for page in pages if page[0] not in chosen]
+    count = max(0, budget // page_size - len(chosen))
+    chosen.update(page[0] for page in rng.sample(remaining, min(count, len(remaining))))
+    return [page for page in pages if page[0] in chosen]
+
+
+def verify_ranges(
+    segments: Sequence[Segment],
+    device_hash: Optional[DeviceHash] = None,
+    read: Optional[ReadMemory] = None,
+    host_hash: Callable[[bytes], str] = md5_hex,
+    max_read: Optional[int] = None,
+    page_size: int = 256,
+    rng: Optional[random.Random] = None,
+    expected: Optional[Sequence[str]] = None,
+) -> VerifyReport:
+    """
+    Verify written ranges with the cheapest method the device offers.
+
+    Args:
+        segments: (address, data) ranges that were written
+        device_hash: On-device hash of a range, digests comparable to host_hash
+        read: Memory read for read-back when there is no device hash
+        host_hash: Hash applied to image data (and to read-back data)
+        max_read: Most bytes to read back before falling back to sampling
+        page_size: Granularity of sampled reads
+        rng: Random source for sampling
+        expected: host_hash digests of the segments, if already computed
+            while writing; not used when sampling
+
+    Returns:
+        VerifyReport naming the method used
+
+    Raises:
+        FlashError: If neither a device hash nor a memory read is available
+    """
+    total = sum(len(data) for _, data in segments)
+    if device_hash is not None:
+        report = VerifyReport(DEVICE_HASH)
+        checks = list(segments)
+    elif read is None:
+        raise FlashError("Device offers no way to verify flash")
+    elif max_read is not None and total > max_read:
+        report = VerifyReport(SAMPLED)
+        checks = sample_pages(segments, page_size, max_read, rng or random.Random())
+    else:
+        report = VerifyReport(READ_BACK)
+        checks = list(segments)
+
+    if expected is None or report.method == SAMPLED:
+        expected = [host_hash(data) for _, data in checks]
+
+    image = hashlib.md5()
+    device = hashlib.md5()
+    for (address, data), digest in zip(checks, expected):
+        if device_hash is not None:
+            actual = device_hash(address, len(data))
+        else:
+            actual = host_hash(read(address, len(data)))
+            report.bytes_read += len(data)
+        image.update(digest.encode())
+        device.update(actual.encode())
+        if actual != digest:
+            report.mismatches.append(address)
+
+    report.verified = not report.mismatches
+    report.image_digest = image.hexdigest()
+    report.device_digest = device.hexdigest()
+    return report